@@ -0,0 +1,303 @@
+# api_scheduler.py
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+import httpx
+
+from run_waiter import retry_after_from_headers
+
+# Request priorities: lower numbers are sent first
+INTERACTIVE = 0  # a student is waiting on it: chat turns, transcription
+BACKGROUND = 1  # feedback generation, thread pre-warming
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+COMPLETION_TOKEN_ESTIMATE = 800  # tokens charged up front for a run or completion's output
+GENERATION_PATHS = ("/runs", "/chat/completions")
+
+
+class TokenBucket:
+    """
+    Budget refilled continuously at `per_minute` units per minute, holding at most one minute's worth.
+
+    Not thread-safe on its own; ApiScheduler guards it with its lock.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, reserve=0.0):
+        """Seconds until `amount` can be taken while leaving `reserve` in the bucket."""
+        self.refill()
+        missing = amount + reserve - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount):
+        self.level -= amount
+
+    def limit(self, remaining):
+        """Lower the level to what the API reports as remaining (shared with other processes)."""
+        self.level = min(self.level, remaining)
+
+
+def estimate_tokens(request, completion_tokens=COMPLETION_TOKEN_ESTIMATE):
+    """
+    Rough token cost of a request, charged against the tokens-per-minute budget when it is sent.
+
+    Message bodies are counted at about four characters per token; requests that start
+    generation are also charged an estimate of their output. Polls, lists and uploads are free.
+
+    Args:
+        request (httpx.Request): The outgoing request
+        completion_tokens (int): Output tokens assumed per run or completion
+
+    Returns:
+        int: Estimated tokens
+    """
+    if request.method != "POST" or "json" not in request.headers.get("content-type", ""):
+        return 0
+    tokens = len(request.read()) // 4
+    if request.url.path.endswith(GENERATION_PATHS):
+        tokens += completion_tokens
+    return tokens
+
+
+class RunLimiter:
+    """
+    Caps the number of concurrently active background runs (from runs.create until the run finishes).
+
+    Used as a context manager around each run; blocks while the cap is reached.
+    """
+
+    def __init__(self, max_runs=None, metrics=None):
+        """
+        Args:
+            max_runs (int): Maximum number of concurrent runs, or None for no cap
+            metrics (MetricsRegistry): Registry for the active-run gauge and slot wait times
+        """
+        self.max_runs = max_runs
+        self.metrics = metrics
+        self._semaphore = threading.BoundedSemaphore(max_runs) if max_runs else None
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def __enter__(self):
+        started = time.monotonic()
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        with self._lock:
+            self._active += 1
+            active = self._active
+        if self.metrics is not None:
+            self.metrics.observe("vpe_background_run_wait_seconds", time.monotonic() - started,
+                                 help="Time background runs waited for a free run slot")
+            self.metrics.set_gauge("vpe_background_runs_active", active, help="Background runs in progress")
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._active -= 1
+            active = self._active
+        if self._semaphore is not None:
+            self._semaphore.release()
+        if self.metrics is not None:
+            self.metrics.set_gauge("vpe_background_runs_active", active, help="Background runs in progress")
+        return False
+
+
+class ApiScheduler:
+    """
+    Process-wide gate for OpenAI requests.
+
+    Every request waits for the requests-per-minute and tokens-per-minute budgets
+    before it is sent. Waiting requests are released strictly by priority, and
+    background requests may only use `background_share` of each budget, so a
+    cohort's feedback runs cannot starve the chat turns students are waiting on.
+    A 429 pauses all sending until the server's retry-after has passed.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, background_share=0.8,
+                 max_background_runs=None, max_attempts=4, backoff_base=0.5, backoff_max=20.0,
+                 metrics=None):
+        """
+        Args:
+            requests_per_minute (int): Request budget, or None for no limit
+            tokens_per_minute (int): Token budget (see estimate_tokens), or None for no limit
+            background_share (float): Fraction of each budget background requests may use
+            max_background_runs (int): Cap on concurrent background runs, or None for no cap
+            max_attempts (int): Attempts per request, including the first, on 429/5xx
+            backoff_base (float): First retry delay when the server does not send retry-after
+            backoff_max (float): Upper bound for a retry delay
+            metrics (MetricsRegistry): Registry for queue depth, wait time and retry metrics
+        """
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.background_share = background_share
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics
+        self.background_runs = RunLimiter(max_background_runs, metrics)
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence number) tickets
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    def acquire(self, priority, tokens=0):
+        """
+        Block until a request of the given priority may be sent, and charge it to the budgets.
+
+        Args:
+            priority (int): INTERACTIVE or BACKGROUND
+            tokens (int): Estimated tokens of the request
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        started = time.monotonic()
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._report_queue_depth()
+            try:
+                while True:
+                    wait = self._wait_time(ticket, tokens)
+                    if wait == 0:
+                        break
+                    # None: another request is ahead; it notifies us when it leaves the queue
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            for bucket, amount, _ in self._charges(priority, tokens):
+                bucket.take(amount)
+            self._report_queue_depth()
+            self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        if self.metrics is not None:
+            self.metrics.observe("vpe_api_queue_wait_seconds", waited, priority=PRIORITY_NAMES[priority],
+                                 help="Time API requests waited for rate-limit budget")
+        return waited
+
+    def _charges(self, priority, tokens):
+        """(bucket, amount, reserve) for every active budget."""
+        charges = []
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket is None or amount <= 0:
+                continue
+            reserve = 0.0 if priority == INTERACTIVE else bucket.capacity * (1 - self.background_share)
+            # A single request larger than the whole budget must still be able to go out
+            charges.append((bucket, min(amount, bucket.capacity - reserve), reserve))
+        return charges
+
+    def _wait_time(self, ticket, tokens):
+        if self._waiting[0] != ticket:
+            return None
+        wait = max(self._paused_until - time.monotonic(), 0.0)
+        for bucket, amount, reserve in self._charges(ticket[0], tokens):
+            wait = max(wait, bucket.wait_time(amount, reserve))
+        return wait
+
+    def _report_queue_depth(self):
+        if self.metrics is None:
+            return
+        for priority, name in PRIORITY_NAMES.items():
+            depth = sum(1 for ticket in self._waiting if ticket[0] == priority)
+            self.metrics.set_gauge("vpe_api_queue_depth", depth, priority=name,
+                                   help="API requests waiting for rate-limit budget")
+
+    def pause(self, seconds):
+        """Hold back all requests for the given time (after the API answered 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def observe_headers(self, headers):
+        """Adopt the remaining budgets the API reports, which also count other processes' usage."""
+        for bucket, header in ((self.request_bucket, "x-ratelimit-remaining-requests"),
+                               (self.token_bucket, "x-ratelimit-remaining-tokens")):
+            value = headers.get(header)
+            if bucket is None or value is None:
+                continue
+            try:
+                remaining = float(value)
+            except ValueError:
+                continue
+            with self._cond:
+                bucket.refill()
+                bucket.limit(remaining)
+
+    def backoff(self, attempt):
+        """Retry delay after the given failed attempt: exponential with jitter."""
+        delay = min(self.backoff_base * (2 ** (attempt - 1)), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def record_retry(self, priority, reason):
+        if self.metrics is not None:
+            self.metrics.inc("vpe_api_retries_total", priority=PRIORITY_NAMES[priority], reason=reason,
+                             help="API requests retried after a rate limit, server or connection error")
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """
+    httpx transport that sends every request through an ApiScheduler.
+
+    Requests wait for budget in priority order and are retried on 429/5xx and
+    connection failures, honouring the server's retry-after.
+    """
+
+    def __init__(self, transport, scheduler, priority):
+        """
+        Args:
+            transport (httpx.BaseTransport): The transport that actually sends requests
+            scheduler (ApiScheduler): The process-wide scheduler
+            priority (int): Priority of every request sent through this transport
+        """
+        self.transport = transport
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def handle_request(self, request):
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.scheduler.acquire(self.priority, tokens)
+            try:
+                response = self.transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # The request never reached the server, so it is safe to send again
+                if attempt >= self.scheduler.max_attempts:
+                    raise
+                reason = "connect"
+                delay = self.scheduler.backoff(attempt)
+            else:
+                self.scheduler.observe_headers(response.headers)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.scheduler.max_attempts:
+                    return response
+                reason = str(response.status_code)
+                delay = retry_after_from_headers(response.headers) or self.scheduler.backoff(attempt)
+                response.close()
+                if response.status_code == 429:
+                    self.scheduler.pause(delay)
+            self.scheduler.record_retry(self.priority, reason)
+            time.sleep(delay)
+
+    def close(self):
+        self.transport.close()
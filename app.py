@@ -1,16 +1,321 @@
 import streamlit as st
 import openai
-from assistants import ASSISTANT_MAP
-from feedback_assistants import FEEDBACK_ASSISTANTS
-from patient_prompts import get_patient_prompt
+from assistants import SUMMARY_MODEL, PatientProfiles
+from case_registry import CaseRegistry
+from openai_client import create_client
+from api_scheduler import BACKGROUND, INTERACTIVE, ApiScheduler
+from reaper import ResourceReaper
+from run_waiter import PollSchedule, RunWaiter
+from thread_reserve import ThreadReserve
+from transcript import Transcript
+from context_summary import SUMMARY_INSTRUCTIONS, RollingSummary
+from audio_pipeline import audio_digest, prepare_audio
+from speech import DEFAULT_VOICE, OpenAISpeechBackend, SpeechCache, SpeechSynthesizer, SpokenReply, StubSpeechBackend
+from feedback import (
+    DOMAIN_PROMPT_TEMPLATE, FEEDBACK_DOMAIN_COUNT, FEEDBACK_PROMPT_TEMPLATE,
+    build_feedback_prompt, extract_scores, request_domain_feedback, request_feedback,
+)
+from feedback_cache import FeedbackCache, feedback_cache_key
+from concurrent.futures import ThreadPoolExecutor
+from feedback_jobs import DONE, QUEUED, FeedbackJobQueue
+from metrics import MetricsRegistry
+from session_store import SQLiteSessionStore
+from score_store import ScoreStore
+import pandas as pd
 import time
 import io
+import json
+import base64
+import uuid
+import re
+import os
 
 # Configuration
+CASES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cases")  # one JSON file per case
+CASE_RELOAD_INTERVAL = 5  # seconds between checks for added, removed or edited case files
+ALL_SPECIALTIES = "All specialties"
 MIN_MESSAGES_FOR_FEEDBACK = 5
-POLLING_INTERVAL = 2  # seconds - increased to reduce API calls
 FEEDBACK_TIMEOUT = 180  # 3 minutes for feedback generation
 CHAT_TIMEOUT = 90  # 90 seconds for regular chat
+TRANSCRIPTION_TIMEOUT = 30  # per-call timeout for transcription uploads
+TRANSCRIPTION_MODEL = "gpt-4o-mini-transcribe"  # "whisper-1" also works, but only without streaming
+STREAM_TRANSCRIPTION = True  # show the student's words while they are transcribed (gpt-4o*-transcribe models)
+# Voice turns: while a recording is transcribed, the conversation's thread is allocated (or
+# checked for an unfinished run) and a connection warmed in the background, so the patient's
+# run starts the moment the final text arrives
+PIPELINE_VOICE_TURNS = True
+VOICE_PREPARE_WORKERS = 8  # voice turns prepared in parallel per process
+# Spoken patient replies (opt-in per student, sidebar toggle): the reply is cut into sentences as it
+# streams, sentences are synthesized concurrently and playback starts with the first one
+SPEECH_BACKEND = None  # "openai", or "stub" (local tones, no API calls); None turns spoken replies off
+SPEECH_WORKERS = 8  # sentences synthesized in parallel per process
+SPEECH_CACHE_MAX_BYTES = 100_000_000  # synthesized audio kept in memory, keyed on (voice, text)
+SPEECH_TIMEOUT = 30  # seconds to wait for the rest of a reply's audio
+STREAM_RESPONSES = True  # stream patient replies token by token instead of polling the run
+# "assistants": Assistants API threads/runs. "chat_completions": local history + one streamed
+# completion per turn, with the patient assistant's own instructions and model (fetched once;
+# an assistant that cannot be fetched or has no instructions stays on the Assistants API)
+CONVERSATION_BACKEND = "assistants"
+# Adaptive run polling: fast first checks, then exponential backoff with jitter
+CHAT_POLL_SCHEDULE = PollSchedule(fast_delays=(0.25, 0.5, 0.75), base_delay=1.0, backoff=1.5, max_delay=3.0)
+FEEDBACK_POLL_SCHEDULE = PollSchedule(fast_delays=(1.0, 2.0), base_delay=2.0, backoff=1.5, max_delay=10.0)
+THREAD_RESERVE_SIZE = 3  # pre-created threads kept ready per process (0 disables the reserve)
+# Check the local transcript against the thread before feedback:
+# "off", "auto" (only after a turn that may have diverged) or "always"
+TRANSCRIPT_VERIFICATION = "auto"
+FEEDBACK_WORKERS = 8  # feedback runs executed in parallel per process
+FEEDBACK_STATUS_INTERVAL = 2  # seconds between feedback status checks in the UI
+# "single": one run scores all five domains. "per_domain": one concurrent run per domain,
+# shown as each finishes and merged into the combined report
+FEEDBACK_MODE = "single"
+# Feedback cache keyed on (rater, prompt template, transcript); identical requests reuse the result
+FEEDBACK_CACHE_SIZE = 256  # entries kept in memory
+FEEDBACK_CACHE_DIR = None  # e.g. ".feedback_cache" to also keep feedback on disk across restarts
+FEEDBACK_CACHE_MAX_BYTES = 50_000_000
+FEEDBACK_CACHE_MAX_AGE = 7 * 24 * 3600  # seconds
+# Per-domain scores of every feedback run, appended to a columnar (Parquet) store that the
+# instructor analytics page (pages/) reads; shared by all app processes and grade_cohort.py
+SCORE_STORE_DIR = None  # e.g. "feedback_scores"; None does not keep scores
+# Latency instrumentation: every external call is timed as a span in an in-process registry
+METRICS_TRACE_FILE = None  # e.g. "vpe_trace.jsonl" to append every finished span as a JSON line
+METRICS_PROMETHEUS_FILE = None  # e.g. "/var/lib/node_exporter/vpe.prom" (textfile collector)
+METRICS_PROMETHEUS_INTERVAL = 15  # seconds between Prometheus file writes
+SHOW_DEBUG_PANEL = False  # sidebar latency breakdown for every session (or add ?debug=1 to the URL)
+# Every API call goes through one process-wide scheduler: chat and transcription go first,
+# feedback uses at most BACKGROUND_BUDGET_SHARE of each budget. Set the budgets a little
+# below the organization's limits (divided by the number of app processes).
+API_REQUESTS_PER_MINUTE = 5000
+API_TOKENS_PER_MINUTE = 2_000_000
+BACKGROUND_BUDGET_SHARE = 0.8
+MAX_CONCURRENT_FEEDBACK_RUNS = 10  # feedback runs active at once per process
+API_MAX_ATTEMPTS = 4  # attempts per request on 429, 5xx and connection errors
+# Abandoned runs (timeouts, interrupted streams, patient switches) are cancelled and the threads
+# of ended conversations deleted in the background
+SESSION_IDLE_TIMEOUT = 3 * 3600  # seconds without activity after which a session's thread is deleted
+THREAD_CREATE_MESSAGES = 32  # messages sent with threads.create when a deleted thread is rebuilt (the rest one by one)
+RUN_CANCEL_TIMEOUT = 10  # seconds to wait for an abandoned run to stop before posting the next message
+# Long encounters: only the latest messages are drawn as chat bubbles; earlier ones are loaded
+# on demand, a page at a time, each page drawn as a single block
+CHAT_HISTORY_WINDOW = 20  # most recent messages always shown
+CHAT_HISTORY_PAGE = 40  # earlier messages per page; "Show earlier messages" adds at most one page
+# Bounded context (opt-in): each reply is generated from the last CONTEXT_WINDOW_TURNS turns plus
+# a rolling summary of everything before them, kept up to date in the background, so the
+# context per run (and time to first token) stays flat over long interviews
+CONTEXT_WINDOW_TURNS = None  # e.g. 8; None sends the whole conversation with every run
+CONTEXT_SUMMARY_BATCH_TURNS = 4  # turns folded into the summary per background update
+CONTEXT_SUMMARY_WORKERS = 4  # summary updates run in parallel per process
+# Encounter state (patient, thread, messages, transcript) can be mirrored to a session store, so a
+# refreshed tab, a restarted worker or another worker behind the load balancer can resume it.
+# The session ID travels in the page URL (?session=...).
+SESSION_STORE_PATH = None  # e.g. ".vpe_sessions.sqlite3"; None keeps encounters in process memory only
+SESSION_STORE_FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes
+SESSION_STORE_HEARTBEAT = 300  # seconds after which an unchanged session is saved again, to mark it active
+SESSION_STORE_RETENTION = 30 * 24 * 3600  # seconds ended encounters stay in the store for grade_cohort.py
+CHAT_BUSY_MESSAGE = "⏳ The virtual patient service is very busy right now. Please wait a few seconds and send your message again."
+# Queues a reply's clips in the page that hosts the player frames and plays them back to
+# back, so the server never waits for a clip to finish. The player lives in the host page's
+# realm: it keeps playing after the frame that queued a clip is redrawn away.
+SPEECH_PLAYER_SCRIPT = """<script>
+const host = window.parent;
+if (!host.vpeSpeechQueue) {
+    host.vpeSpeechQueue = new host.Function(`
+        const player = {reply: null, queued: new Set(), clips: [], audio: null};
+        function next() {
+            player.audio = null;
+            const src = player.clips.shift();
+            if (src === undefined) return;
+            const audio = player.audio = new Audio(src);
+            audio.addEventListener("ended", next);
+            audio.addEventListener("error", next);
+            audio.play().catch(next);
+        }
+        return function (reply, index, src) {
+            if (reply !== player.reply) {
+                // A new reply cuts off what is left of the previous one
+                if (player.audio) player.audio.pause();
+                Object.assign(player, {reply: reply, queued: new Set(), clips: [], audio: null});
+            }
+            if (player.queued.has(index)) return;  // the same frame drawn again
+            player.queued.add(index);
+            player.clips.push(src);
+            if (!player.audio) next();
+        };
+    `)();
+}
+host.vpeSpeechQueue(%(reply)s, %(index)d, %(src)s);
+</script>"""
+CASE_UNAVAILABLE_MESSAGE = "This virtual patient is no longer available. Please reload the page and choose a virtual patient from the sidebar."
+
+@st.cache_resource
+def get_case_registry():
+    """Process-wide case registry, validated and indexed once; reloaded when case files change."""
+    return CaseRegistry(CASES_DIR, reload_interval=CASE_RELOAD_INTERVAL)
+
+@st.cache_resource
+def get_api_scheduler():
+    """Process-wide rate-limit budgets, priorities and retries for all API calls."""
+    return ApiScheduler(
+        requests_per_minute=API_REQUESTS_PER_MINUTE,
+        tokens_per_minute=API_TOKENS_PER_MINUTE,
+        background_share=BACKGROUND_BUDGET_SHARE,
+        max_background_runs=MAX_CONCURRENT_FEEDBACK_RUNS,
+        max_attempts=API_MAX_ATTEMPTS,
+        metrics=get_metrics(),
+    )
+
+@st.cache_resource
+def get_openai_client():
+    """Create the pooled OpenAI client once per process; reruns and sessions reuse it."""
+    return create_client(
+        api_key=st.secrets["OPENAI_API_KEY"],
+        base_url=st.secrets.get("OPENAI_BASE_URL"),
+        scheduler=get_api_scheduler(),
+        priority=INTERACTIVE,
+    )
+
+@st.cache_resource
+def get_background_client():
+    """Client for work nobody is waiting on (feedback, thread pre-warming); yields to chat turns."""
+    return create_client(
+        api_key=st.secrets["OPENAI_API_KEY"],
+        base_url=st.secrets.get("OPENAI_BASE_URL"),
+        scheduler=get_api_scheduler(),
+        priority=BACKGROUND,
+    )
+
+@st.cache_resource
+def get_reaper():
+    """Process-wide tracker that cancels abandoned runs and deletes threads of ended conversations."""
+    return ResourceReaper(get_background_client(), idle_timeout=SESSION_IDLE_TIMEOUT, metrics=get_metrics(),
+                          session_store=get_session_store())
+
+@st.cache_resource
+def get_session_store():
+    """Process-wide session store (None unless SESSION_STORE_PATH is set)."""
+    if not SESSION_STORE_PATH:
+        return None
+    # Encounters expire from the store when the reaper deletes their threads: with a store, every
+    # process's reaper goes by the session's last save here, wherever the session is served now
+    return SQLiteSessionStore(SESSION_STORE_PATH, flush_interval=SESSION_STORE_FLUSH_INTERVAL,
+                              max_age=SESSION_IDLE_TIMEOUT, retention=SESSION_STORE_RETENTION,
+                              metrics=get_metrics())
+
+@st.cache_resource
+def get_summary_executor():
+    """Process-wide worker pool for rolling-summary updates (bounded-context mode)."""
+    return ThreadPoolExecutor(max_workers=CONTEXT_SUMMARY_WORKERS, thread_name_prefix="summary")
+
+@st.cache_resource
+def get_voice_executor():
+    """Process-wide worker pool that gets patient turns ready while recordings are transcribed."""
+    return ThreadPoolExecutor(max_workers=VOICE_PREPARE_WORKERS, thread_name_prefix="voice")
+
+@st.cache_resource
+def get_speech_synthesizer():
+    """Process-wide speech synthesizer with its worker pool and (voice, text) cache."""
+    if SPEECH_BACKEND == "stub":
+        backend = StubSpeechBackend()
+    else:
+        backend = OpenAISpeechBackend(get_openai_client())  # the student is waiting: interactive priority
+    executor = ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech")
+    return SpeechSynthesizer(backend, SpeechCache(SPEECH_CACHE_MAX_BYTES), executor, metrics=get_metrics())
+
+@st.cache_resource
+def get_patient_profiles():
+    """Process-wide cache of the patient assistants' instructions and models (chat-completions backend)."""
+    return PatientProfiles(get_openai_client())
+
+@st.cache_resource
+def get_thread_reserve():
+    """Process-wide reserve of pre-created threads, refilled in the background."""
+    return ThreadReserve(get_background_client(), size=THREAD_RESERVE_SIZE)
+
+@st.cache_resource
+def get_feedback_jobs():
+    """Process-wide feedback worker pool; jobs survive reruns and reconnects."""
+    return FeedbackJobQueue(max_workers=FEEDBACK_WORKERS)
+
+@st.cache_resource
+def get_feedback_cache():
+    """Process-wide feedback cache (memory LRU plus optional disk tier)."""
+    return FeedbackCache(
+        max_entries=FEEDBACK_CACHE_SIZE,
+        disk_dir=FEEDBACK_CACHE_DIR,
+        disk_max_bytes=FEEDBACK_CACHE_MAX_BYTES,
+        disk_max_age=FEEDBACK_CACHE_MAX_AGE,
+    )
+
+@st.cache_resource
+def get_score_store():
+    """Process-wide writer for feedback scores (None unless SCORE_STORE_DIR is set)."""
+    return ScoreStore(SCORE_STORE_DIR) if SCORE_STORE_DIR else None
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide metrics registry shared by all sessions and background workers."""
+    metrics = MetricsRegistry(trace_path=METRICS_TRACE_FILE)
+    if METRICS_PROMETHEUS_FILE:
+        metrics.start_prometheus_file_writer(METRICS_PROMETHEUS_FILE, METRICS_PROMETHEUS_INTERVAL)
+    return metrics
+
+def run_feedback_job(job, client, cache, cache_key, case, transcript, metrics, session_id, encounter_id,
+                     run_limiter, reaper, score_store):
+    """Generate feedback on a worker thread, reporting progress on the job and recording its scores."""
+    assistant_id, patient_name = case.feedback_assistant_id, case.patient_name
+    
+    def on_progress(status, elapsed, polls):
+        job.progress = status
+        span.set(polls=polls, run_status=status)
+    
+    def on_section(domain_number, text):
+        job.sections[domain_number] = extract_scores(text)[0]
+        job.progress = f"{len(job.sections)} of {FEEDBACK_DOMAIN_COUNT} domains rated"
+    
+    def compute():
+        span.set(cache_hit=False)
+        if FEEDBACK_MODE == "per_domain":
+            return request_domain_feedback(client, assistant_id, patient_name, transcript,
+                                           timeout=FEEDBACK_TIMEOUT, schedule=FEEDBACK_POLL_SCHEDULE,
+                                           on_section=on_section, run_limiter=run_limiter, reaper=reaper)
+        feedback_prompt = build_feedback_prompt(patient_name, transcript)
+        return request_feedback(client, assistant_id, feedback_prompt, timeout=FEEDBACK_TIMEOUT,
+                                schedule=FEEDBACK_POLL_SCHEDULE, callbacks=[on_progress],
+                                run_limiter=run_limiter, reaper=reaper)
+    
+    # Context variables do not follow work onto the pool thread, so the session is passed in
+    with metrics.span("feedback.job", session_id=session_id, mode=FEEDBACK_MODE, cache_hit=True) as span:
+        # The cache keeps the raw reply, so a cache hit still has its scores. A report with missing
+        # domains raises PartialFeedbackError: it is not cached or scored, and the job fails so a
+        # later click runs it again
+        feedback, scores = extract_scores(cache.get_or_compute(cache_key, compute))
+        span.set(scored_domains=len(scores))
+    job.scores = scores
+    if score_store is not None and scores:
+        score_store.record(scores, session_id, case.key, case.specialty, patient_name, mode=FEEDBACK_MODE,
+                           encounter_id=encounter_id)
+    return feedback
+
+def prepare_patient_turn(client, thread_id, reserve, reaper, metrics, session_id):
+    """
+    Get a conversation ready for its next run on a worker thread, while the student's recording is transcribed.
+    
+    Returns:
+        str: The conversation's thread
+    """
+    with metrics.span("voice.prepare_turn", session_id=session_id, source="existing") as span:
+        if thread_id is None and reserve is not None:
+            thread_id = reserve.take()
+            span.set(source="reserve")
+        if thread_id is None:
+            span.set(source="created")
+            thread_id = client.beta.threads.create().id  # also opens a connection
+        else:
+            # A turn interrupted earlier may still have a run on the thread; stop it now rather than
+            # after the transcription. Otherwise this is a cheap request that leaves a connection open
+            # in the pool for runs.create (the upload may have the only other one)
+            span.set(idle=reaper.wait_until_idle(thread_id, RUN_CANCEL_TIMEOUT, client=client))
+            client.beta.threads.retrieve(thread_id)
+    return thread_id
 
 class VPEApp:
     def __init__(self):
@@ -18,9 +323,11 @@ class VPEApp:
         self.init_session_state()
     
     def setup_openai(self):
-        """Initialize OpenAI client with API key from secrets."""
+        """Get the process-wide OpenAI client (created once, shared by all sessions)."""
         try:
-            openai.api_key = st.secrets["OPENAI_API_KEY"]
+            self.client = get_openai_client()
+            if THREAD_RESERVE_SIZE:
+                get_thread_reserve()  # starts pre-warming threads in the background
         except KeyError:
             st.error("OpenAI API key not found in secrets. Please configure OPENAI_API_KEY.")
             st.stop()
@@ -30,23 +337,143 @@ class VPEApp:
     
     def init_session_state(self):
         """Initialize session state variables."""
+        if "session_id" not in st.session_state and get_session_store() is not None:
+            self.restore_session()
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        if "transcript" not in st.session_state:
+            st.session_state.transcript = Transcript()
         if "thread_id" not in st.session_state:
-            st.session_state.thread_id = self.create_thread()
-        if "last_audio_bytes" not in st.session_state:
-            st.session_state.last_audio_bytes = None
+            st.session_state.thread_id = None  # created lazily on the first message
+        if "last_audio_digest" not in st.session_state:
+            st.session_state.last_audio_digest = None
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = uuid.uuid4().hex
+        if "history_start" not in st.session_state:
+            st.session_state.history_start = None  # first earlier message the student expanded, or None
+        if "history_blocks" not in st.session_state:
+            st.session_state.history_blocks = {}  # (first, last message ID) of a page -> its markdown
+        if "context_summary" not in st.session_state:
+            st.session_state.context_summary = RollingSummary()
+        if "encounter_id" not in st.session_state:
+            st.session_state.encounter_id = uuid.uuid4().hex  # one conversation with one case
+        if "conversation_backend" not in st.session_state:
+            st.session_state.conversation_backend = None  # chosen on the encounter's first turn
         # Don't set selected_actor to None - let it be unset initially
     
+    def restore_session(self):
+        """Resume the encounter named in the URL from the session store, or start a new stored session."""
+        session_id = st.query_params.get("session", "")
+        state = get_session_store().load(session_id) if re.fullmatch(r"[0-9a-f]{32}", session_id) else None
+        if state is None or state.get("selected_actor") not in get_case_registry():
+            st.query_params["session"] = st.session_state.session_id = uuid.uuid4().hex
+            return
+        
+        transcript = Transcript()
+        for role, content in state["transcript"]:
+            transcript.append(role, content)
+        transcript.needs_verification = state["transcript_unverified"]
+        summary = RollingSummary()
+        summary.text, summary.covered = state["context_summary"]
+        
+        st.session_state.session_id = session_id
+        st.session_state.selected_actor = st.session_state.actor_selector = state["selected_actor"]
+        st.session_state.thread_id = state["thread_id"]
+        st.session_state.messages = state["messages"]
+        st.session_state.transcript = transcript
+        st.session_state.context_summary = summary
+        st.session_state.last_audio_digest = state["last_audio_digest"]
+        st.session_state.conversation_backend = state.get("conversation_backend")  # absent in older saves
+        st.session_state.encounter_id = state.get("encounter_id") or uuid.uuid4().hex
+        st.session_state.saved_state_version = self.session_state_version()
+    
+    def session_state_version(self):
+        """Cheap fingerprint of the stored encounter state; it changes whenever the state does."""
+        transcript = st.session_state.transcript
+        return (
+            st.session_state.get("selected_actor"), st.session_state.thread_id,
+            len(st.session_state.messages), len(transcript), transcript.needs_verification,
+            st.session_state.context_summary.covered, st.session_state.last_audio_digest,
+        )
+    
+    def save_session(self):
+        """Hand the encounter state to the session store (written in the background) if it changed."""
+        store = get_session_store()
+        version = self.session_state_version()
+        if store is None:
+            return
+        # An unchanged state is saved again now and then: the last save is the session's
+        # last activity, which decides when its thread is deleted
+        if (st.session_state.get("saved_state_version") == version
+                and time.time() - st.session_state.get("saved_at", 0) < SESSION_STORE_HEARTBEAT):
+            return
+        transcript = st.session_state.transcript
+        summary = st.session_state.context_summary
+        store.save(st.session_state.session_id, {
+            "selected_actor": st.session_state.get("selected_actor"),
+            "thread_id": st.session_state.thread_id,
+            "messages": st.session_state.messages,
+            "transcript": transcript.entries,
+            "transcript_unverified": transcript.needs_verification,
+            "context_summary": [summary.text, summary.covered],
+            "last_audio_digest": st.session_state.last_audio_digest,
+            "conversation_backend": st.session_state.conversation_backend,
+            "encounter_id": st.session_state.encounter_id,
+        })
+        st.session_state.saved_state_version = version
+        st.session_state.saved_at = time.time()
+    
+    def span(self, name, **attrs):
+        """Time an operation of this session in the process-wide metrics registry."""
+        return get_metrics().span(name, session_id=st.session_state.session_id, **attrs)
+    
     def create_thread(self):
         """Create a new OpenAI thread and return its ID."""
         try:
-            thread = openai.beta.threads.create()
+            with self.span("threads.create"):
+                thread = self.client.beta.threads.create()
             return thread.id
         except Exception as e:
             st.error(f"Failed to create thread: {e}")
             st.stop()
     
+    def ensure_thread(self):
+        """Return the conversation's thread, allocating one on first use."""
+        if st.session_state.thread_id is None:
+            with self.span("ensure_thread") as span:
+                thread_id = get_thread_reserve().take() if THREAD_RESERVE_SIZE else None
+                span.set(source="reserve" if thread_id else "created")
+                self.use_thread(thread_id or self.create_thread())
+        return st.session_state.thread_id
+    
+    def use_thread(self, thread_id):
+        """Make a newly allocated thread the conversation's, and let the reaper know it belongs to this session."""
+        st.session_state.thread_id = thread_id
+        # Tracked right away: if the tab closes before the next rerun, the idle sweep still deletes it
+        get_reaper().touch(st.session_state.session_id, thread_id)
+    
+    def thread_is_gone(self, thread_id):
+        """Check whether the conversation's thread was deleted (a 404 can also mean a missing assistant)."""
+        try:
+            with self.span("threads.retrieve"):
+                self.client.beta.threads.retrieve(thread_id)
+        except openai.NotFoundError:
+            return True
+        except Exception:
+            return False
+        return False
+    
+    def replace_lost_thread(self):
+        """Continue on a new thread holding the conversation so far (the old one was deleted, e.g. as idle)."""
+        # The turn being sent is already in the transcript; it goes to the new thread with its run
+        messages = [{"role": role, "content": content}
+                    for role, content in st.session_state.transcript.entries[:-1]]
+        with self.span("thread.replace", messages=len(messages)):
+            thread = self.client.beta.threads.create(messages=messages[:THREAD_CREATE_MESSAGES])
+            for message in messages[THREAD_CREATE_MESSAGES:]:
+                self.client.beta.threads.messages.create(thread_id=thread.id, **message)
+        self.use_thread(thread.id)
+    
     def reset_conversation_if_needed(self, current_actor):
         """Reset conversation if actor has changed."""
         # Get the previously selected actor (None if not set)
@@ -54,10 +481,19 @@ class VPEApp:
         
         # If this is a new selection, reset everything
         if previous_actor != current_actor:
+            # The old conversation is over: stop its run (if any) and delete its thread
+            get_reaper().retire_thread(st.session_state.get("thread_id"))
             st.session_state.selected_actor = current_actor
             st.session_state.messages = []
-            st.session_state.thread_id = self.create_thread()
-            st.session_state.last_audio_bytes = None
+            st.session_state.transcript = Transcript()
+            st.session_state.thread_id = None  # created lazily on the first message
+            st.session_state.feedback_job_id = None
+            st.session_state.last_audio_digest = None
+            st.session_state.history_start = None
+            st.session_state.history_blocks = {}
+            st.session_state.context_summary = RollingSummary()
+            st.session_state.conversation_backend = None
+            st.session_state.encounter_id = uuid.uuid4().hex
             
             # Optional: Show confirmation message
             if previous_actor is not None:  # Not the first load
@@ -65,170 +501,227 @@ class VPEApp:
                 st.sidebar.info(f"🔄 Switched to {patient_name}")
                 st.rerun()
     
+    def uses_chat_completions(self, actor_name):
+        """Check whether the encounter runs on the direct chat-completions backend (chosen once, on its first turn)."""
+        if st.session_state.conversation_backend is None:
+            # The two backends keep separate histories, so an encounter never switches between them
+            use_chat = CONVERSATION_BACKEND == "chat_completions" and self.get_patient_profile(actor_name) is not None
+            st.session_state.conversation_backend = "chat_completions" if use_chat else "assistants"
+        return st.session_state.conversation_backend == "chat_completions"
+    
+    def get_patient_profile(self, actor_name):
+        """Instructions and model of the case's patient assistant, or None if they are not available."""
+        try:
+            return get_patient_profiles().get(self.get_case(actor_name).assistant_id)
+        except Exception:
+            return None
+    
+    def get_case(self, actor_name):
+        """Look up the selected case in the registry; stops the run with a message if it was removed."""
+        case = get_case_registry().get(actor_name)
+        if case is None:
+            st.error(CASE_UNAVAILABLE_MESSAGE)
+            st.stop()
+        return case
+    
     def get_patient_name(self, actor_name):
-        """Extract patient name from actor selection."""
-        # Split by '(' and take the first part, then strip whitespace
-        return actor_name.split('(')[0].strip()
-    
-    def get_feedback_assistant_key(self, actor_name):
-        """Generate feedback assistant key from actor name."""
-        patient_name = self.get_patient_name(actor_name)
-        feedback_key = f"{patient_name} Feedback"
-        
-        # Fallback to a default if the specific feedback assistant doesn't exist
-        if feedback_key not in FEEDBACK_ASSISTANTS:
-            # Use the first available feedback assistant as fallback
-            available_keys = list(FEEDBACK_ASSISTANTS.keys())
-            if available_keys:
-                st.warning(f"Feedback assistant for '{patient_name}' not found. Using default feedback assistant.")
-                return available_keys[0]
-            else:
-                st.error("No feedback assistants available.")
-                st.stop()
-        
-        return feedback_key
+        """Patient name of the selected case."""
+        return self.get_case(actor_name).patient_name
     
-    def transcribe_audio(self, audio_bytes):
-        """Transcribe audio using OpenAI Whisper API."""
+    def transcribe_audio(self, audio_bytes, on_partial=None):
+        """Transcribe audio with the OpenAI transcription API, passing the text so far to on_partial while it streams."""
         try:
             # Create a file-like object from the audio bytes
             audio_file = io.BytesIO(audio_bytes)
-            audio_file.name = "audio.wav"  # Whisper needs a filename
+            audio_file.name = "audio.wav"  # the API needs a filename
             
-            # Call Whisper API
-            transcript = openai.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en"  # Optional: specify language for better accuracy
-            )
-            
-            return transcript.text
+            # Call the transcription API
+            with self.span("transcribe_audio", audio_bytes=len(audio_bytes), stream=STREAM_TRANSCRIPTION) as span:
+                transcript = self.client.audio.transcriptions.create(
+                    model=TRANSCRIPTION_MODEL,
+                    file=audio_file,
+                    language="en",  # Optional: specify language for better accuracy
+                    timeout=TRANSCRIPTION_TIMEOUT,
+                    **({"stream": True} if STREAM_TRANSCRIPTION else {}),
+                )
+                if not STREAM_TRANSCRIPTION:
+                    return transcript.text
+                
+                start_time = time.time()
+                chunks = []
+                text = None
+                with transcript:
+                    for event in transcript:
+                        if event.type == "transcript.text.delta":
+                            if not chunks:
+                                span.set(first_text_seconds=round(time.time() - start_time, 3))
+                            chunks.append(event.delta)
+                            if on_partial is not None:
+                                on_partial("".join(chunks))
+                        elif event.type == "transcript.text.done":
+                            text = event.text
+                return text if text is not None else "".join(chunks)
+        except openai.RateLimitError:
+            st.error(CHAT_BUSY_MESSAGE)
+            return None
         except Exception as e:
             st.error(f"Transcription failed: {e}")
             return None
     
-    def get_transcript(self, thread_id):
-        """Retrieve and format conversation transcript."""
+    def transcribe_voice_turn(self, audio_bytes):
+        """Transcribe a recording, showing the words as they arrive, while the patient turn is prepared."""
+        turn = self.start_preparing_turn()
+        said = st.empty()
+        with st.spinner("🎙️ Transcribing your audio..."):
+            text = self.transcribe_audio(audio_bytes, on_partial=lambda partial: said.info(f"**You said:** {partial}▌"))
+        self.finish_preparing_turn(turn)
+        if text:
+            said.info(f"**You said:** {text}")
+        else:
+            said.empty()
+        return text
+    
+    def start_preparing_turn(self):
+        """Start getting the thread ready for the next run in the background (see prepare_patient_turn)."""
+        if not PIPELINE_VOICE_TURNS or self.uses_chat_completions(st.session_state.selected_actor):
+            return None
+        reserve = get_thread_reserve() if THREAD_RESERVE_SIZE else None
+        return get_voice_executor().submit(
+            prepare_patient_turn, self.client, st.session_state.thread_id, reserve, get_reaper(),
+            get_metrics(), st.session_state.session_id,
+        )
+    
+    def finish_preparing_turn(self, turn):
+        """Adopt the thread prepared in the background; if preparing failed, the turn does it inline."""
+        if turn is None:
+            return
         try:
-            messages = openai.beta.threads.messages.list(
-                thread_id=thread_id,
-                limit=100
-            )
-            
-            transcript = ""
-            # Reverse to get chronological order (oldest first)
-            for msg in reversed(messages.data):
-                role_label = "STUDENT" if msg.role == "user" else "PATIENT"
-                content = msg.content[0].text.value
-                transcript += f"{role_label}: {content}\n\n"
-            
-            return transcript
-        except Exception as e:
-            st.error(f"Failed to retrieve transcript: {e}")
-            return ""
+            thread_id = turn.result()
+        except Exception:
+            return
+        if st.session_state.thread_id is None:
+            self.use_thread(thread_id)
     
-    def wait_for_run_completion(self, thread_id, run_id, timeout=60, operation="operation"):
-        """Wait for OpenAI run to complete with timeout (simple version)."""
-        start_time = time.time()
+    def get_transcript(self, thread_id):
+        """Render the locally maintained transcript, reconciling it with the thread if needed."""
+        transcript = st.session_state.transcript
         
-        while time.time() - start_time < timeout:
-            try:
-                run_status = openai.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run_id
-                )
-                
-                if run_status.status == "completed":
-                    return True
-                elif run_status.status in ("failed", "cancelled", "expired"):
-                    st.error(f"{operation.title()} failed with status: {run_status.status}")
-                    if hasattr(run_status, 'last_error') and run_status.last_error:
-                        st.error(f"Error details: {run_status.last_error}")
-                    return False
-                elif run_status.status == "requires_action":
-                    st.error(f"{operation.title()} requires action. This shouldn't happen with these assistants.")
-                    return False
-                
-                time.sleep(POLLING_INTERVAL)
-            except Exception as e:
-                st.error(f"Error checking {operation} status: {e}")
-                return False
+        verify = TRANSCRIPT_VERIFICATION == "always" or (
+            TRANSCRIPT_VERIFICATION == "auto" and transcript.needs_verification
+        )
+        with self.span("get_transcript", entries=len(transcript)) as span:
+            if verify and thread_id is not None:
+                try:
+                    span.set(reconciled=transcript.reconcile(self.client, thread_id))
+                except Exception as e:
+                    st.error(f"Failed to retrieve transcript: {e}")
+                    return ""
+            
+            return transcript.render()
+    
+    def add_message(self, role, content):
+        """Record a turn in both the displayed history and the transcript."""
+        st.session_state.messages.append({"id": uuid.uuid4().hex[:12], "role": role, "content": content})
+        st.session_state.transcript.append(role, content)
+    
+    def context_window(self):
+        """
+        Bounded-context mode: where the verbatim context starts and the summary sent with it.
         
-        st.error(f"{operation.title()} timed out after {timeout} seconds. Please try again.")
-        return False
-
-    def wait_for_run_completion_with_progress(self, thread_id, run_id, timeout=60, operation="operation"):
-        """Wait for OpenAI run to complete with progress updates."""
-        start_time = time.time()
-        progress_placeholder = st.empty()
+        Returns None when the whole conversation is sent, otherwise (start, summary instructions).
+        """
+        if not CONTEXT_WINDOW_TURNS:
+            return None
+        messages = st.session_state.messages
+        summary = st.session_state.context_summary
+        start = summary.context_start(len(messages), 2 * CONTEXT_WINDOW_TURNS)
+        if start == 0:
+            return None
+        return start, SUMMARY_INSTRUCTIONS.format(summary=summary.text)
+    
+    def run_context_options(self):
+        """Extra runs.create arguments that limit the context a run sees (bounded-context mode)."""
+        window = self.context_window()
+        if window is None:
+            return {}
+        start, instructions = window
+        return {
+            "truncation_strategy": {"type": "last_messages",
+                                    "last_messages": len(st.session_state.messages) - start},
+            "additional_instructions": instructions,
+        }
+    
+    def update_context_summary(self):
+        """After a turn, fold turns that fell behind the context window into the summary (in the background)."""
+        if not CONTEXT_WINDOW_TURNS:
+            return
+        st.session_state.context_summary.schedule_update(
+            get_summary_executor(), get_background_client(), SUMMARY_MODEL,
+            self.get_patient_name(st.session_state.selected_actor), st.session_state.messages,
+            window=2 * CONTEXT_WINDOW_TURNS, batch=2 * CONTEXT_SUMMARY_BATCH_TURNS,
+            metrics=get_metrics(), session_id=st.session_state.session_id,
+        )
+    
+    def wait_for_run_completion(self, thread_id, run_id, timeout=60, operation="operation",
+                                schedule=CHAT_POLL_SCHEDULE):
+        """Wait for OpenAI run to complete with timeout."""
+        waiter = RunWaiter(self.client, schedule=schedule)
+        with self.span("chat_run.wait", operation=operation) as span:
+            result = waiter.wait(thread_id, run_id, timeout)
+            span.set(polls=result.polls, run_status=result.status)
+        # A run we stop waiting for would keep generating and block the thread
+        get_reaper().release_run(thread_id, run_id, result.status)
         
-        while time.time() - start_time < timeout:
-            elapsed = int(time.time() - start_time)
-            progress_placeholder.info(f"⏱️ {operation.title()} in progress... {elapsed}s elapsed")
-            
-            try:
-                run_status = openai.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run_id
-                )
-                
-                if run_status.status == "completed":
-                    progress_placeholder.empty()
-                    return True
-                elif run_status.status in ("failed", "cancelled", "expired"):
-                    progress_placeholder.empty()
-                    st.error(f"{operation.title()} failed with status: {run_status.status}")
-                    if hasattr(run_status, 'last_error') and run_status.last_error:
-                        st.error(f"Error details: {run_status.last_error}")
-                    return False
-                elif run_status.status == "requires_action":
-                    progress_placeholder.empty()
-                    st.error(f"{operation.title()} requires action. This shouldn't happen with these assistants.")
-                    return False
-                
-                time.sleep(POLLING_INTERVAL)
-            except Exception as e:
-                progress_placeholder.empty()
-                st.error(f"Error checking {operation} status: {e}")
-                return False
+        if result.completed:
+            return True
         
-        progress_placeholder.empty()
-        st.error(f"⏰ {operation.title()} timed out after {timeout} seconds.")
-        st.info("""
-        **What you can try:**
-        - Click the 'Generate Feedback!' button again to retry
-        - Check your internet connection
-        - If this persists, the OpenAI servers may be experiencing high load
-        """)
+        if result.status == "error":
+            st.error(f"Error checking {operation} status: {result.error}")
+        elif result.status == "requires_action":
+            st.error(f"{operation.title()} requires action. This shouldn't happen with these assistants.")
+        elif result.status == "timeout":
+            st.error(f"{operation.title()} timed out after {timeout} seconds. Please try again.")
+        else:
+            st.error(f"{operation.title()} failed with status: {result.status}")
+            if result.last_error:
+                st.error(f"Error details: {result.last_error}")
+        return False
+    
+    def wait_for_idle_thread(self, thread_id):
+        """Make sure no abandoned run (e.g. from an interrupted turn) still blocks the thread."""
+        if get_reaper().wait_until_idle(thread_id, RUN_CANCEL_TIMEOUT, client=self.client):
+            return True
+        st.error("The previous response is still being stopped. Please send your message again in a moment.")
         return False
     
     def send_message_to_patient(self, prompt, assistant_id):
         """Send message to virtual patient and get response."""
+        thread_id = self.ensure_thread()
+        if not self.wait_for_idle_thread(thread_id):
+            return None
         try:
-            # Add user message to thread
-            openai.beta.threads.messages.create(
-                thread_id=st.session_state.thread_id,
-                role="user",
-                content=prompt,
-            )
-            
-            # Start run
-            run = openai.beta.threads.runs.create(
-                thread_id=st.session_state.thread_id,
-                assistant_id=assistant_id,
-            )
+            # Post the user message and start the run in one request
+            with self.span("runs.create"):
+                run = self.client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=assistant_id,
+                    additional_messages=[{"role": "user", "content": prompt}],
+                    **self.run_context_options(),
+                )
+            get_reaper().run_started(thread_id, run.id)
             
             # Wait for completion
             with st.spinner("Waiting for response..."):
-                if not self.wait_for_run_completion(st.session_state.thread_id, run.id, 
+                if not self.wait_for_run_completion(thread_id, run.id, 
                                                   timeout=CHAT_TIMEOUT, operation="chat response"):
                     return None
             
             # Get latest response
-            messages = openai.beta.threads.messages.list(
-                thread_id=st.session_state.thread_id,
-                limit=1
-            )
+            with self.span("messages.list"):
+                messages = self.client.beta.threads.messages.list(
+                    thread_id=thread_id,
+                    limit=1
+                )
             
             if messages.data:
                 return messages.data[0].content[0].text.value
@@ -236,15 +729,213 @@ class VPEApp:
                 st.error("No response received from virtual patient.")
                 return None
                 
+        except openai.NotFoundError as e:
+            if self.thread_is_gone(thread_id):
+                self.replace_lost_thread()
+                return self.send_message_to_patient(prompt, assistant_id)
+            st.error(f"Failed to send message: {e}")
+            return None
+        except openai.RateLimitError:
+            st.error(CHAT_BUSY_MESSAGE)
+            return None
+        except Exception as e:
+            st.error(f"Failed to send message: {e}")
+            return None
+    
+    def stream_message_to_patient(self, prompt, assistant_id, on_text=None):
+        """Send message to virtual patient and stream the response as it is generated (each piece also to on_text)."""
+        thread_id = self.ensure_thread()
+        if not self.wait_for_idle_thread(thread_id):
+            return None
+        response_placeholder = st.empty()
+        chunks = []
+        run_id = None
+        run_status = None
+        thread_lost = False
+        
+        try:
+            # Post the user message, start the run and consume its event stream in one request -
+            # no separate messages.create and no retrieve/list round trips
+            start_time = time.time()
+            response_placeholder.markdown("_Waiting for response..._")
+            with self.span("runs.stream") as span:
+                stream = self.client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=assistant_id,
+                    additional_messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    timeout=CHAT_TIMEOUT,
+                    **self.run_context_options(),
+                )
+                
+                with stream:
+                    for event in stream:
+                        if time.time() - start_time > CHAT_TIMEOUT:
+                            span.set(run_status="timeout")
+                            response_placeholder.empty()
+                            st.error(f"Chat response timed out after {CHAT_TIMEOUT} seconds. Please try again.")
+                            return None
+                        
+                        if event.event == "thread.run.created":
+                            run_id = event.data.id
+                            get_reaper().run_started(thread_id, run_id)
+                        elif event.event == "thread.message.delta":
+                            if not chunks:
+                                span.set(first_token_seconds=round(time.time() - start_time, 3))
+                            for part in event.data.delta.content or []:
+                                if part.type == "text" and part.text and part.text.value:
+                                    chunks.append(part.text.value)
+                                    if on_text is not None:
+                                        on_text(part.text.value)
+                            response_placeholder.markdown("".join(chunks) + "▌")
+                        elif event.event == "thread.run.completed":
+                            run_status = "completed"
+                            span.set(run_status=run_status)
+                            break
+                        elif event.event in ("thread.run.failed", "thread.run.cancelled",
+                                             "thread.run.expired", "thread.run.incomplete"):
+                            run_status = event.data.status
+                            span.set(run_status=run_status)
+                            response_placeholder.empty()
+                            st.error(f"Chat response failed with status: {event.data.status}")
+                            if event.data.last_error:
+                                st.error(f"Error details: {event.data.last_error}")
+                            return None
+                        elif event.event == "thread.run.requires_action":
+                            span.set(run_status="requires_action")
+                            response_placeholder.empty()
+                            st.error("Chat response requires action. This shouldn't happen with these assistants.")
+                            return None
+                        elif event.event == "error":
+                            span.set(run_status="error")
+                            response_placeholder.empty()
+                            st.error(f"Error details: {event.data}")
+                            return None
+        
+        except openai.APITimeoutError:
+            response_placeholder.empty()
+            st.error(f"Chat response timed out after {CHAT_TIMEOUT} seconds. Please try again.")
+            return None
+        except openai.NotFoundError as e:
+            response_placeholder.empty()
+            thread_lost = run_id is None and self.thread_is_gone(thread_id)
+            if not thread_lost:
+                st.error(f"Failed to send message: {e}")
+                return None
+        except openai.RateLimitError:
+            response_placeholder.empty()
+            st.error(CHAT_BUSY_MESSAGE)
+            return None
+        except Exception as e:
+            response_placeholder.empty()
+            st.error(f"Failed to send message: {e}")
+            return None
+        finally:
+            if run_id is not None:
+                # Cancels the run if we stopped listening early (timeout, error, or a rerun
+                # interrupted this script run because the student sent another message)
+                get_reaper().release_run(thread_id, run_id, run_status)
+            if run_status != "completed" and not thread_lost:
+                # A cancelled run can leave a partial reply on the thread
+                st.session_state.transcript.mark_unverified()
+        
+        if thread_lost:
+            self.replace_lost_thread()
+            return self.stream_message_to_patient(prompt, assistant_id, on_text)
+        
+        response = "".join(chunks)
+        if not response:
+            response_placeholder.empty()
+            st.error("No response received from virtual patient.")
+            return None
+        
+        response_placeholder.markdown(response)
+        return response
+    
+    def stream_chat_completion(self, actor_name, on_text=None):
+        """Get the patient's reply with a single streamed chat completion over the local history (each piece also to on_text)."""
+        response_placeholder = st.empty()
+        chunks = []
+        
+        # The latest user message is already part of st.session_state.messages
+        profile = self.get_patient_profile(actor_name)
+        if profile is None:
+            # Only possible if the profile was never fetched in this process (e.g. a resumed session)
+            response_placeholder.empty()
+            st.error("The virtual patient is not available right now. Please send your message again in a moment.")
+            return None
+        messages = [{"role": "system", "content": profile.instructions}]
+        window = self.context_window()
+        start = 0
+        if window is not None:
+            start, instructions = window
+            messages.append({"role": "system", "content": instructions})
+        messages.extend(
+            {"role": msg["role"], "content": msg["content"]} for msg in st.session_state.messages[start:]
+        )
+        
+        try:
+            start_time = time.time()
+            response_placeholder.markdown("_Waiting for response..._")
+            with self.span("chat.completions.stream", messages=len(messages)) as span:
+                stream = self.client.chat.completions.create(
+                    model=profile.model,
+                    messages=messages,
+                    stream=True,
+                    timeout=CHAT_TIMEOUT,
+                )
+                
+                with stream:
+                    for chunk in stream:
+                        if time.time() - start_time > CHAT_TIMEOUT:
+                            span.set(run_status="timeout")
+                            response_placeholder.empty()
+                            st.error(f"Chat response timed out after {CHAT_TIMEOUT} seconds. Please try again.")
+                            return None
+                        if not chunk.choices:
+                            continue
+                        
+                        choice = chunk.choices[0]
+                        if choice.delta.content:
+                            if not chunks:
+                                span.set(first_token_seconds=round(time.time() - start_time, 3))
+                            chunks.append(choice.delta.content)
+                            if on_text is not None:
+                                on_text(choice.delta.content)
+                            response_placeholder.markdown("".join(chunks) + "▌")
+                        if choice.finish_reason == "content_filter":
+                            span.set(run_status="content_filter")
+                            response_placeholder.empty()
+                            st.error("Chat response failed with status: content_filter")
+                            return None
+        
+        except openai.APITimeoutError:
+            response_placeholder.empty()
+            st.error(f"Chat response timed out after {CHAT_TIMEOUT} seconds. Please try again.")
+            return None
+        except openai.RateLimitError:
+            response_placeholder.empty()
+            st.error(CHAT_BUSY_MESSAGE)
+            return None
         except Exception as e:
+            response_placeholder.empty()
             st.error(f"Failed to send message: {e}")
             return None
+        
+        response = "".join(chunks)
+        if not response:
+            response_placeholder.empty()
+            st.error("No response received from virtual patient.")
+            return None
+        
+        response_placeholder.markdown(response)
+        return response
     
     def generate_feedback(self, selected_actor):
-        """Generate feedback for the conversation."""
-        feedback_assistant_key = self.get_feedback_assistant_key(selected_actor)
-        patient_name = self.get_patient_name(selected_actor)
-        assistant_id = FEEDBACK_ASSISTANTS[feedback_assistant_key]
+        """Queue feedback generation for the conversation as a background job."""
+        case = self.get_case(selected_actor)
+        patient_name = case.patient_name
+        assistant_id = case.feedback_assistant_id
         
         # Get transcript
         transcript = self.get_transcript(st.session_state.thread_id)
@@ -252,180 +943,385 @@ class VPEApp:
             st.error("Failed to retrieve conversation transcript.")
             return
         
-        try:
-            # Create new thread for feedback
-            feedback_thread = openai.beta.threads.create()
-            
-            # Prepare feedback prompt
-            feedback_prompt = f"""
-You are an expert clinical skills rater. Use the five-domain assessment framework.
-
-Transcript of the student's chat with virtual standardized patient {patient_name}:
-
-{transcript}
-"""
-            
-            # Send transcript to feedback assistant
-            openai.beta.threads.messages.create(
-                thread_id=feedback_thread.id,
-                role="user",
-                content=feedback_prompt
-            )
-            
-            # Start feedback generation
-            feedback_run = openai.beta.threads.runs.create(
-                thread_id=feedback_thread.id,
-                assistant_id=assistant_id,
-            )
-            
-            # Wait for feedback completion
-            if not self.wait_for_run_completion_with_progress(feedback_thread.id, feedback_run.id, 
-                                                            timeout=FEEDBACK_TIMEOUT, 
-                                                            operation="feedback generation"):
-                return
-            
-            # Get feedback
-            feedback_messages = openai.beta.threads.messages.list(
-                thread_id=feedback_thread.id,
-                limit=1
-            )
-            
-            if feedback_messages.data and feedback_messages.data[0].role == "assistant":
-                feedback_text = feedback_messages.data[0].content[0].text.value
-                
-                # Display feedback
-                st.subheader("📋 Comprehensive Feedback")
-                st.markdown(f"*Feedback from {patient_name} encounter*")
-                st.markdown(feedback_text)
+        prompt_template = DOMAIN_PROMPT_TEMPLATE if FEEDBACK_MODE == "per_domain" else FEEDBACK_PROMPT_TEMPLATE
+        cache_key = feedback_cache_key(assistant_id, prompt_template, transcript, patient_name)
+        # Identical requests (same rater and transcript) share one job and one run
+        st.session_state.feedback_job_id = get_feedback_jobs().submit(
+            run_feedback_job, get_background_client(), get_feedback_cache(), cache_key, case,
+            transcript, get_metrics(), st.session_state.session_id, st.session_state.encounter_id,
+            get_api_scheduler().background_runs, get_reaper(), get_score_store(), job_key=cache_key,
+        )
+        st.session_state.feedback_patient = patient_name
+    
+    @st.fragment
+    def display_feedback_panel(self, selected_actor):
+        """Show the feedback button, the status of a running job, or its result."""
+        st.markdown("---")
+        st.subheader("🧠 Ready to end the interview and get feedback?")
+        
+        job_id = st.session_state.get("feedback_job_id")
+        job = get_feedback_jobs().get(job_id) if job_id else None
+        if job_id and job is None:
+            st.warning("The previous feedback request has expired. Please generate feedback again.")
+            st.session_state.feedback_job_id = None
+        
+        job_pending = job is not None and not job.finished
+        if st.button("Generate Feedback!", type="primary", disabled=job_pending):
+            with st.spinner("Preparing feedback generation..."):
+                self.generate_feedback(selected_actor)
+            job_id = st.session_state.get("feedback_job_id")
+            job = get_feedback_jobs().get(job_id) if job_id else None
+            job_pending = job is not None and not job.finished
+        
+        if job is None:
+            return
+        if job_pending:
+            self.display_feedback_progress()
+        elif job.status == DONE:
+            # Display feedback
+            st.subheader("📋 Comprehensive Feedback")
+            st.markdown(f"*Feedback from {st.session_state.feedback_patient} encounter*")
+            st.markdown(job.result)
+        else:
+            if job.sections:
+                # Per-domain mode: the domains that were rated are still worth reading
+                st.subheader("📋 Partial Feedback")
+                for domain_number in sorted(job.sections):
+                    st.markdown(job.sections[domain_number])
+            st.error(job.error)
+            st.info("""
+            **What you can try:**
+            - Click the 'Generate Feedback!' button again to retry
+            - Check your internet connection
+            - If this persists, the OpenAI servers may be experiencing high load
+            """)
+    
+    @st.fragment(run_every=FEEDBACK_STATUS_INTERVAL)
+    def display_feedback_progress(self):
+        """Poll the running feedback job without rerunning the whole page."""
+        job = get_feedback_jobs().get(st.session_state.get("feedback_job_id"))
+        if job is None or job.finished:
+            # A full rerun renders the result (or error) and stops this polling fragment
+            st.rerun()
+        if job.status == QUEUED:
+            st.info("⏳ Waiting for a free feedback worker...")
+            return
+        st.info(f"⏱️ Feedback generation in progress... {int(job.elapsed())}s elapsed")
+        if job.progress:
+            st.caption(f"Run status: {job.progress}")
+        # Per-domain mode: show each domain's section as soon as it is rated
+        sections = dict(job.sections)  # the worker keeps adding to it
+        for domain_number in sorted(sections):
+            st.markdown(sections[domain_number])
+    
+    def display_debug_panel(self):
+        """Sidebar breakdown of where this session's time went, plus metric downloads."""
+        metrics = get_metrics()
+        spans = metrics.session_spans(st.session_state.session_id)
+        with st.sidebar.expander("🛠️ Latency debug", expanded=False):
+            if not spans:
+                st.caption("No timed operations yet.")
             else:
-                st.error("No feedback generated. Please try again.")
-                
-        except Exception as e:
-            st.error(f"Failed to generate feedback: {e}")
+                # Newest operations first; child spans share their turn's trace ID
+                rows = [{
+                    "trace": span.trace_id[:6],
+                    "operation": span.name,
+                    "ms": round(span.duration * 1000),
+                    "polls": span.attrs.get("polls"),
+                    "status": span.attrs.get("run_status", span.status),
+                    "first token ms": (round(span.attrs["first_token_seconds"] * 1000)
+                                       if "first_token_seconds" in span.attrs else None),
+                } for span in reversed(spans)]
+                st.dataframe(pd.DataFrame(rows), hide_index=True)
+            st.download_button("Prometheus metrics", metrics.prometheus_text(),
+                               file_name="vpe_metrics.prom", mime="text/plain")
+            st.download_button("Session trace (JSONL)",
+                               "\n".join(json.dumps(span.to_dict(), default=str) for span in spans),
+                               file_name="vpe_trace.jsonl", mime="application/jsonl")
     
     def display_chat_history(self):
-        """Display existing chat messages."""
-        for msg in st.session_state.messages:
+        """Display the latest messages as chat bubbles and any expanded earlier pages above them."""
+        messages = st.session_state.messages
+        window_start = max(len(messages) - CHAT_HISTORY_WINDOW, 0)
+        shown_start = self.history_shown_start(window_start)
+        
+        if shown_start > 0:
+            st.button(f"⬆️ Show earlier messages ({shown_start} hidden)", key="show_earlier_messages",
+                      on_click=self.show_earlier_messages, args=(shown_start,))
+        
+        # Pages sit at fixed positions (messages[k * PAGE:(k + 1) * PAGE]), so a new turn leaves every
+        # expanded page as it was, except a last one the window is still moving through
+        blocks = {}
+        for page_start in range(shown_start, window_start, CHAT_HISTORY_PAGE):
+            page = messages[page_start:min(page_start + CHAT_HISTORY_PAGE, window_start)]
+            key = (page[0]["id"], page[-1]["id"])
+            block = blocks[key] = st.session_state.history_blocks.get(key) or self.history_block(page)
+            with st.container(border=True):
+                st.markdown(block)
+        st.session_state.history_blocks = blocks  # only the pages on screen are kept
+        
+        for msg in messages[window_start:]:
             st.chat_message(msg["role"]).markdown(msg["content"])
     
+    def history_shown_start(self, window_start):
+        """Index of the first message shown: the start of the earliest expanded page, or the window."""
+        history_start = st.session_state.history_start
+        return window_start if history_start is None else min(history_start, window_start)
+    
+    def show_earlier_messages(self, shown_start):
+        """Button callback: expand the earlier messages back to the start of the previous page."""
+        st.session_state.history_start = (shown_start - 1) // CHAT_HISTORY_PAGE * CHAT_HISTORY_PAGE
+    
+    def history_block(self, page):
+        """Markdown for one page of earlier messages."""
+        patient_name = self.get_patient_name(st.session_state.selected_actor)
+        return "\n\n".join(
+            f"**{'You' if msg['role'] == 'user' else patient_name}:** {msg['content']}" for msg in page
+        )
+    
     def get_user_message_count(self):
         """Count user messages in the current conversation."""
         return sum(1 for msg in st.session_state.messages if msg["role"] == "user")
     
     def handle_user_input(self, prompt, assistant_id):
         """Process user input (text or transcribed speech) and get response."""
+        with self.span("turn", turn=self.get_user_message_count() + 1) as span:
+            response = self.get_patient_response(prompt, assistant_id)
+            span.set(run_status="completed" if response else "failed")
+        
+        if response:
+            self.add_message("assistant", response)
+            self.update_context_summary()
+        elif st.session_state.thread_id is not None:
+            # The run may still finish on the server, so the thread can now differ from our copy
+            st.session_state.transcript.mark_unverified()
+    
+    def get_patient_response(self, prompt, assistant_id):
+        """Show the user's message and get the patient's reply through the configured backend."""
         # Add user message to display
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        self.add_message("user", prompt)
         
         # Display the message immediately
         with st.chat_message("user"):
             st.markdown(prompt)
         
         # Get response from virtual patient
-        response = self.send_message_to_patient(prompt, assistant_id)
-        
-        if response:
-            st.session_state.messages.append({"role": "assistant", "content": response})
+        spoken = self.start_spoken_reply()
+        audio_slot = None
+        if self.uses_chat_completions(st.session_state.selected_actor):
             with st.chat_message("assistant"):
-                st.markdown(response)
-            st.rerun()
-    
-    def run(self):
-        """Main application loop."""
-        st.title("Virtual Patient Encounters (VPE)")
-        
-        # Sidebar: Actor selection
-        if not ASSISTANT_MAP:
-            st.error("No virtual patients available. Please check your assistant configuration.")
-            st.stop()
-        
-        selected_actor = st.sidebar.selectbox(
-            "Choose a Virtual Patient Encounter",
-            list(ASSISTANT_MAP.keys()),
-            key="actor_selector"
-        )
-        
-        assistant_id = ASSISTANT_MAP[selected_actor]
-        
-        # Reset conversation if actor changed
-        self.reset_conversation_if_needed(selected_actor)
-        
-        # Show which patient we're talking to
-        patient_name = self.get_patient_name(selected_actor)
-        st.subheader(f"💬 Conversation with {patient_name}")
-        
-        # Display patient intro prompt - FIXED FOR DARK MODE
-        patient_prompt = get_patient_prompt(patient_name)
-        if patient_prompt:
-            with st.expander("📋 Case Introduction - Click to read", expanded=True):
-                st.markdown(f"""
-                <div style='
-                    padding: 15px; 
-                    border-radius: 10px; 
-                    border-left: 4px solid #1f77b4;
-                    background-color: var(--secondary-background-color);
-                    color: var(--text-color);
-                '>
-                    {patient_prompt}
-                </div>
-                """, unsafe_allow_html=True)
+                reply_area, audio_slot = st.container(), st.container()
+                with reply_area:
+                    response = self.stream_chat_completion(st.session_state.selected_actor,
+                                                           on_text=self.speech_feeder(spoken, audio_slot))
+        elif STREAM_RESPONSES:
+            with st.chat_message("assistant"):
+                reply_area, audio_slot = st.container(), st.container()
+                with reply_area:
+                    response = self.stream_message_to_patient(prompt, assistant_id,
+                                                              on_text=self.speech_feeder(spoken, audio_slot))
         else:
-            st.info(f"Starting conversation with {patient_name}")
-        
-        # Add some spacing
-        st.markdown("---")
-        
-        # Display chat history
-        self.display_chat_history()
+            response = self.send_message_to_patient(prompt, assistant_id)
+            if response:
+                with st.chat_message("assistant"):
+                    st.markdown(response)
+                    audio_slot = st.container()
+                if spoken is not None:
+                    spoken.feed(response)
         
-        # Input section with both text and voice options
-        st.markdown("### 💬 Your Input")
-        
-        # Create two columns for text and voice input
-        col1, col2 = st.columns([3, 1])
-        
-        with col1:
-            text_input = st.chat_input("Type your message or use the voice button →")
-        
-        with col2:
-            st.markdown("<div style='margin-top: -10px;'>", unsafe_allow_html=True)
-            audio_input = st.audio_input("🎤 Voice", key="voice_input")
-            st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Handle text input
-        if text_input:
-            self.handle_user_input(text_input, assistant_id)
+        if spoken is not None and response:
+            self.finish_spoken_reply(spoken, audio_slot)
+        return response
+    
+    def start_spoken_reply(self):
+        """Spoken version of the next patient reply, or None if spoken replies are off."""
+        if not SPEECH_BACKEND or not st.session_state.get("spoken_replies"):
+            return None
+        voice = self.get_case(st.session_state.selected_actor).voice or DEFAULT_VOICE
+        return SpokenReply(get_speech_synthesizer(), voice, st.session_state.session_id)
+    
+    def speech_feeder(self, spoken, audio_slot):
+        """Callback for streamed reply text: synthesize each finished sentence and play clips as they are ready."""
+        if spoken is None:
+            return None
         
-        # Handle voice input
-        elif audio_input is not None:
-            # Check if this is new audio (different from last processed)
-            audio_bytes = audio_input.getvalue()
+        def on_text(text):
+            spoken.feed(text)
+            self.play_next_clip(spoken, audio_slot)
+        return on_text
+    
+    def play_next_clip(self, spoken, audio_slot, timeout=0):
+        """Queue the reply's next clip for playback if it is ready."""
+        index = spoken.played
+        clip = spoken.next_clip(timeout)
+        if clip is not None:
+            self.queue_clip(spoken, audio_slot, index, clip)
+    
+    def queue_clip(self, spoken, audio_slot, index, clip):
+        """Hand a clip to the browser's player, which plays the reply's clips back to back."""
+        src = "data:audio/wav;base64," + base64.b64encode(clip).decode("ascii")
+        audio_slot.iframe(SPEECH_PLAYER_SCRIPT % {
+            "reply": json.dumps(spoken.reply_id), "index": index, "src": json.dumps(src),
+        }, height="content")  # no visible content: the frame collapses
+    
+    def finish_spoken_reply(self, spoken, audio_slot):
+        """Queue the rest of a complete reply: its first clip as soon as it is ready, then everything after it."""
+        spoken.finish()
+        with self.span("speech.reply", chunks=len(spoken.clips)):
+            self.play_next_clip(spoken, audio_slot, timeout=SPEECH_TIMEOUT)
+            index = spoken.played
+            clip = spoken.rest(SPEECH_TIMEOUT)
+        if clip is not None:
+            self.queue_clip(spoken, audio_slot, index, clip)
+    
+    @st.fragment
+    def display_case_header(self, patient_name, patient_prompt):
+        """Patient name and case introduction; only redrawn on full reruns (patient switches)."""
+        with self.span("page.header"):
+            # Show which patient we're talking to
+            st.subheader(f"💬 Conversation with {patient_name}")
             
-            if audio_bytes != st.session_state.last_audio_bytes:
-                st.session_state.last_audio_bytes = audio_bytes
-                
-                with st.spinner("🎙️ Transcribing your audio..."):
-                    transcribed_text = self.transcribe_audio(audio_bytes)
+            # Display patient intro prompt - FIXED FOR DARK MODE
+            if patient_prompt:
+                with st.expander("📋 Case Introduction - Click to read", expanded=True):
+                    st.markdown(f"""
+                    <div style='
+                        padding: 15px; 
+                        border-radius: 10px; 
+                        border-left: 4px solid #1f77b4;
+                        background-color: var(--secondary-background-color);
+                        color: var(--text-color);
+                    '>
+                        {patient_prompt}
+                    </div>
+                    """, unsafe_allow_html=True)
+            else:
+                st.info(f"Starting conversation with {patient_name}")
+    
+    @st.fragment
+    def display_conversation(self, assistant_id):
+        """Chat log and input bar; a new message reruns only this fragment, not the whole page."""
+        with self.span("page.conversation"):
+            # Fragment reruns do not pass through run(), so session activity is recorded here
+            get_reaper().touch(st.session_state.session_id, st.session_state.thread_id)
+            
+            # Display chat history; the new turn is appended to the same container below
+            chat_log = st.container()
+            with chat_log:
+                self.display_chat_history()
+            
+            # Input section with both text and voice options
+            st.markdown("### 💬 Your Input")
+            
+            # Create two columns for text and voice input
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                text_input = st.chat_input("Type your message or use the voice button →")
+            
+            with col2:
+                st.markdown("<div style='margin-top: -10px;'>", unsafe_allow_html=True)
+                audio_input = st.audio_input("🎤 Voice", key="voice_input")
+                st.markdown("</div>", unsafe_allow_html=True)
+            
+            prompt = None
+            
+            # Handle text input
+            if text_input:
+                prompt = text_input
+            
+            # Handle voice input
+            elif audio_input is not None:
+                # Check if this is new audio (different from last processed)
+                audio_bytes = audio_input.getvalue()
+                digest = audio_digest(audio_bytes)
                 
-                if transcribed_text:
-                    # Show what was transcribed
-                    st.info(f"**You said:** {transcribed_text}")
+                if digest != st.session_state.last_audio_digest:
+                    st.session_state.last_audio_digest = digest
                     
-                    # Process the transcribed text
-                    self.handle_user_input(transcribed_text, assistant_id)
-                else:
-                    st.error("Could not transcribe audio. Please try again.")
-        
-        # Feedback section
-        user_count = self.get_user_message_count()
-        
-        if user_count >= MIN_MESSAGES_FOR_FEEDBACK:
+                    # Mono 16 kHz with leading/trailing silence trimmed: smaller, faster upload
+                    with self.span("prepare_audio", audio_bytes=len(audio_bytes)) as span:
+                        prepared = prepare_audio(audio_bytes)
+                        span.set(speech_seconds=round(prepared.duration, 2), silent=prepared.is_silent)
+                    
+                    if prepared.is_silent:
+                        # Nothing to transcribe - skip the API call
+                        st.warning("No speech detected in the recording. Please try again.")
+                    else:
+                        transcribed_text = self.transcribe_voice_turn(prepared.wav_bytes)
+                        
+                        if transcribed_text:
+                            prompt = transcribed_text
+                        else:
+                            st.error("Could not transcribe audio. Please try again.")
+            
+            if prompt:
+                feedback_was_shown = self.get_user_message_count() >= MIN_MESSAGES_FOR_FEEDBACK
+                with chat_log:
+                    self.handle_user_input(prompt, assistant_id)
+                self.save_session()
+                if not feedback_was_shown and self.get_user_message_count() >= MIN_MESSAGES_FOR_FEEDBACK:
+                    # The feedback panel lives outside this fragment
+                    st.rerun()
+    
+    def run(self):
+        """Main application loop."""
+        with self.span("page.run"):
+            st.title("Virtual Patient Encounters (VPE)")
+            
+            # Sidebar: Actor selection
+            cases = get_case_registry()
+            cases.refresh()  # picks up edited case files; a no-op between reload checks
+            if not len(cases):
+                st.error("No virtual patients available. Please check the case files.")
+                st.stop()
+            
+            specialty = st.sidebar.selectbox(
+                "Specialty", [ALL_SPECIALTIES] + cases.specialties(), key="specialty_filter"
+            )
+            actor_options = cases.keys(None if specialty == ALL_SPECIALTIES else specialty)
+            current_actor = st.session_state.get("actor_selector")
+            if current_actor in cases and current_actor not in actor_options:
+                # The filter only narrows the list: the encounter in progress stays selected (and
+                # listed first) until the student picks another case
+                actor_options = [current_actor] + actor_options
+            elif current_actor not in actor_options:
+                # Removed by a case reload: fall back to the first listed case
+                st.session_state.pop("actor_selector", None)
+            selected_actor = st.sidebar.selectbox(
+                "Choose a Virtual Patient Encounter",
+                actor_options,
+                key="actor_selector"
+            )
+            
+            if SPEECH_BACKEND:
+                st.sidebar.toggle("🔊 Speak patient replies", key="spoken_replies")
+            
+            case = self.get_case(selected_actor)
+            assistant_id = case.assistant_id
+            
+            # Reset conversation if actor changed
+            self.reset_conversation_if_needed(selected_actor)
+            
+            # Each region below is a fragment: its own widgets only rerun that region
+            self.display_case_header(case.patient_name, case.intro)
+            
+            # Add some spacing
             st.markdown("---")
-            st.subheader("🧠 Ready to end the interview and get feedback?")
             
-            if st.button("Generate Feedback!", type="primary"):
-                with st.spinner("Preparing feedback generation..."):
-                    self.generate_feedback(selected_actor)
+            self.display_conversation(assistant_id)
+            
+            # Feedback section
+            user_count = self.get_user_message_count()
+            
+            if user_count >= MIN_MESSAGES_FOR_FEEDBACK:
+                self.display_feedback_panel(selected_actor)
+            
+            if SHOW_DEBUG_PANEL or st.query_params.get("debug") == "1":
+                self.display_debug_panel()
+            
+            # Covers changes made outside the conversation fragment (e.g. a patient switch)
+            self.save_session()
 
 # Run the application
 if __name__ == "__main__":
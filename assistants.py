@@ -1,47 +1,71 @@
 # assistants.py
 
-ASSISTANT_MAP = {
-   
-    # Geriatrics
-    "Mr. Aiken (Geriatrics 15)": "asst_QvmAr0EQSkJbTz1egONsWRBy",
-    "Albert Smitherman (Geriatrics 16)": "asst_kAbDyyAv4noyXhEUTIVultmv",
-    
-    # Pediatrics
-    "Mrs. Kelly (Pediatrics 12)": "asst_YFt8DwxTNaNIb167RidYEvQR",
-    "Jessica Morales (Pediatrics 09)": "asst_KJHLtj7XmArrsaiNOUA225i3",
-    
-    # Family Medicine
-    "Amanda Waters (Family Medicine 05)": "asst_HsHZ5S1NHLJiEgyMV5cCakiX",
-    
-    # Internal Medicine
-    "Barbara Turner (Internal Medicine 09)": "asst_rULWJq6yptdIKcdZ0jc4Toxt",
-    
-    # Neurology
-    "Anna Pine (Neurology 11)": "asst_fJKBggzYCVeAkVdw1pxLq20c",
-    
-    # Gynecology
-    "Lori Johnson (Gynecology 02)": "asst_AACL3cOVfAs5q6FLrGbNhhii",
-    "Dolores Russell (Gynecology 03)": "asst_VKdsqSCQ20QUGZvRvIqjEYZQ",
-    
-    # Psychiatry
-    "Allison Killpatrick (Psychiatry 05)": "asst_pXcWTnltp76KLKw6KyaAGCjw",
-    
-    # Palliative Care
-    "Erica Patterson (Palliative Care 06)": "asst_jKKOCPvspxa9g2qo8GCVvswu",
-
-    # High Value Care
-    "Mrs. Miller (High Value Care 04)": "asst_pWDA8oyZfpvRGWyYDoWhakj1",
-}
-
-# Helper function to get assistant by name or ID
-def get_assistant_id(actor_name):
+import threading
+import time
+from dataclasses import dataclass
+
+# Patient and rater assistant IDs and case introductions live in the case definition
+# files (see case_registry.py). A patient's persona - history, exam and lab facts - lives
+# only in its assistant's instructions, which the chat-completions backend reuses.
+
+SUMMARY_MODEL = "gpt-4o-mini"  # model for the rolling context summary (bounded-context mode)
+PROFILE_MAX_AGE = 3600  # seconds before an assistant's instructions are fetched again
+PROFILE_RETRY_DELAY = 60  # seconds a stale profile is served after a failed refetch before trying again
+
+
+@dataclass(frozen=True)
+class PatientProfile:
+    """What the chat-completions backend needs to play a patient assistant."""
+    instructions: str  # the assistant's system prompt
+    model: str  # the assistant's model
+
+
+class PatientProfiles:
     """
-    Get assistant ID by actor name.
-    
-    Args:
-        actor_name (str): The name of the virtual patient actor
-        
-    Returns:
-        str: The assistant ID, or None if not found
+    Instructions and models of the patient assistants, fetched once per assistant and cached.
+
+    Keeps the chat-completions backend in step with the Assistants API: both play
+    the patient from the same instructions on the same model, so the rater grades
+    against facts the patient actually had.
     """
-    return ASSISTANT_MAP.get(actor_name)
+
+    def __init__(self, client, max_age=PROFILE_MAX_AGE):
+        """
+        Args:
+            client (openai.OpenAI): Client for assistants.retrieve
+            max_age (float): Seconds a fetched profile is used before it is fetched again
+        """
+        self.client = client
+        self.max_age = max_age
+        self._profiles = {}  # assistant_id -> (PatientProfile or None, fetched at)
+        self._lock = threading.Lock()
+
+    def get(self, assistant_id):
+        """
+        Look up (or fetch) a patient assistant's profile.
+
+        Returns:
+            PatientProfile: The profile, or None if the assistant has no instructions
+
+        Raises:
+            openai.OpenAIError: If the assistant could not be fetched and was never fetched before
+                (a failed refetch serves the previous profile instead)
+        """
+        with self._lock:
+            cached = self._profiles.get(assistant_id)
+        if cached is not None and time.monotonic() - cached[1] < self.max_age:
+            return cached[0]
+
+        try:
+            assistant = self.client.beta.assistants.retrieve(assistant_id)
+        except Exception:
+            if cached is None:
+                raise
+            with self._lock:
+                # Keep the stale profile for a while rather than failing every turn until the API is back
+                self._profiles[assistant_id] = (cached[0], time.monotonic() - self.max_age + PROFILE_RETRY_DELAY)
+            return cached[0]
+        profile = PatientProfile(assistant.instructions, assistant.model) if assistant.instructions else None
+        with self._lock:
+            self._profiles[assistant_id] = (profile, time.monotonic())
+        return profile
@@ -0,0 +1,192 @@
+# audio_pipeline.py
+
+import hashlib
+import io
+import wave
+from dataclasses import dataclass
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000  # Whisper resamples to 16 kHz mono internally anyway
+FRAME_SECONDS = 0.03  # analysis frame for voice-activity detection
+SILENCE_THRESHOLD_DB = -45.0  # frames quieter than this (dBFS) never count as speech
+NOISE_MARGIN_DB = 12.0  # speech must be this much louder than the estimated noise floor
+PEAK_MARGIN_DB = 25.0  # ...but frames within this much of the loudest frame always count
+SPEECH_PADDING_SECONDS = 0.2  # kept around detected speech so word edges are not clipped
+MIN_SPEECH_SECONDS = 0.15  # less detected speech than this counts as a silent clip
+
+
+@dataclass
+class PreparedAudio:
+    """A recording ready for upload to the transcription API."""
+    wav_bytes: bytes
+    duration: float  # seconds of audio left after trimming
+    original_size: int  # bytes of the recording as captured
+    is_silent: bool
+
+
+def audio_digest(audio_bytes):
+    """
+    Short fingerprint of a recording, used to recognise a recording that was already processed.
+
+    Args:
+        audio_bytes (bytes): The recording as captured
+
+    Returns:
+        str: 32-character hex digest
+    """
+    return hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
+
+
+def decode_wav(audio_bytes):
+    """
+    Decode PCM WAV bytes.
+
+    Args:
+        audio_bytes (bytes): WAV file contents
+
+    Returns:
+        tuple: (samples as float32 array of shape (frames, channels) in [-1, 1], sample rate)
+    """
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif sample_width == 3:
+        # Sign-extend little-endian 24-bit samples into int32
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = packed[:, 0] | (packed[:, 1] << 8) | (packed[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width} bytes")
+
+    return samples.reshape(-1, channels), sample_rate
+
+
+def to_mono(samples):
+    """Average all channels into one."""
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def resample(samples, sample_rate, target_rate=TARGET_SAMPLE_RATE):
+    """
+    Resample mono audio with a box low-pass filter followed by linear interpolation.
+
+    Args:
+        samples (np.ndarray): Mono samples
+        sample_rate (int): Rate of the input
+        target_rate (int): Rate of the output
+
+    Returns:
+        np.ndarray: Resampled float32 samples
+    """
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32)
+
+    if sample_rate > target_rate:
+        # Average over one output period to suppress content above the new Nyquist rate
+        width = int(round(sample_rate / target_rate))
+        if width > 1:
+            samples = np.convolve(samples, np.full(width, 1.0 / width, dtype=np.float32), mode="same")
+
+    duration = len(samples) / sample_rate
+    target_length = max(int(round(duration * target_rate)), 1)
+    source_times = np.arange(len(samples)) / sample_rate
+    target_times = np.arange(target_length) / target_rate
+    return np.interp(target_times, source_times, samples).astype(np.float32)
+
+
+def speech_bounds(samples, sample_rate):
+    """
+    Find the span that contains speech using frame energy.
+
+    Args:
+        samples (np.ndarray): Mono samples
+        sample_rate (int): Sample rate
+
+    Returns:
+        tuple: (start, end) sample indices of the speech, or None if no speech was found
+    """
+    frame_length = max(int(sample_rate * FRAME_SECONDS), 1)
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return None
+
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    energy_db = 20 * np.log10(np.maximum(rms, 1e-10))
+
+    # Above the noise floor, but never so high that a clip of continuous speech
+    # (whose "floor" is speech itself) loses its quieter syllables
+    noise_floor_db = np.percentile(energy_db, 10)
+    threshold_db = max(
+        SILENCE_THRESHOLD_DB,
+        min(noise_floor_db + NOISE_MARGIN_DB, energy_db.max() - PEAK_MARGIN_DB),
+    )
+    speech_frames = np.flatnonzero(energy_db > threshold_db)
+    if len(speech_frames) * FRAME_SECONDS < MIN_SPEECH_SECONDS:
+        return None
+
+    padding = int(SPEECH_PADDING_SECONDS * sample_rate)
+    start = max(speech_frames[0] * frame_length - padding, 0)
+    end = min((speech_frames[-1] + 1) * frame_length + padding, len(samples))
+    return start, end
+
+
+def encode_wav(samples, sample_rate):
+    """
+    Encode mono float samples as 16-bit PCM WAV.
+
+    Returns:
+        bytes: WAV file contents
+    """
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def prepare_audio(audio_bytes):
+    """
+    Turn a browser recording into a compact 16 kHz mono upload with silence trimmed.
+
+    Recordings that cannot be decoded are passed through unchanged so the API can
+    still try them.
+
+    Args:
+        audio_bytes (bytes): The recording as captured (WAV)
+
+    Returns:
+        PreparedAudio: The upload, or is_silent=True if there is nothing to transcribe
+    """
+    try:
+        samples, sample_rate = decode_wav(audio_bytes)
+    except (wave.Error, ValueError, EOFError):
+        return PreparedAudio(audio_bytes, 0.0, len(audio_bytes), is_silent=False)
+
+    mono = resample(to_mono(samples), sample_rate)
+    bounds = speech_bounds(mono, TARGET_SAMPLE_RATE)
+    if bounds is None:
+        return PreparedAudio(b"", 0.0, len(audio_bytes), is_silent=True)
+
+    start, end = bounds
+    speech = mono[start:end]
+    return PreparedAudio(
+        wav_bytes=encode_wav(speech, TARGET_SAMPLE_RATE),
+        duration=len(speech) / TARGET_SAMPLE_RATE,
+        original_size=len(audio_bytes),
+        is_silent=False,
+    )
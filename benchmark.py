@@ -0,0 +1,485 @@
+# benchmark.py
+"""
+Repeatable benchmarks for the encounter hot path.
+
+VPEApp methods are called directly (Streamlit "bare mode", no browser or server)
+against fake_openai.py running with a fixed, jitter-free latency model, so
+results only move when our code does: wall time and API calls per chat turn,
+thread creation, transcript building, audio handling, spoken turns, speech
+synthesis and end-to-end feedback.
+
+Results are written as JSON and compared against a stored baseline; any
+benchmark that got slower than the tolerance allows, or that makes more API
+calls than before, is reported and makes the run exit with status 1.
+
+Usage:
+    python benchmark.py                          # run, compare with benchmark_baseline.json
+    python benchmark.py --only transcript audio  # benchmarks whose name starts with these
+    python benchmark.py --save-baseline          # accept the current numbers as the new baseline
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+import wave
+from dataclasses import asdict
+
+import numpy as np
+
+from api_scheduler import BACKGROUND, INTERACTIVE
+from fake_openai import FakeConfig, start_in_background
+from openai_client import create_client
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25  # a median this much above the baseline median is a regression...
+MIN_REGRESSION_SECONDS = 0.01  # ...unless the absolute difference is below timer/scheduler noise
+
+# Fixed latencies without random spread: every run of the suite sees the same API
+BENCHMARK_API = FakeConfig(
+    request_latency=0.002,
+    latency_sigma=0.0,
+    queue_seconds=0.05,
+    generation_seconds=0.2,
+    token_seconds=0.002,
+    transcription_seconds=0.05,
+    transcription_per_audio_second=0.002,
+    seed=0,
+)
+TRANSCRIPT_SIZES = (10, 100, 1000)  # messages per encounter
+AUDIO_SECONDS = (5, 30, 120)  # clip lengths
+BENCHMARK_ACTOR = "Mr. Aiken (Geriatrics 15)"
+
+
+def synthetic_recording(seconds, sample_rate=44100, seed=0):
+    """
+    A browser-like recording: 44.1 kHz stereo 16-bit WAV, speech-like bursts with silence around them.
+
+    Args:
+        seconds (float): Length of the clip
+        sample_rate (int): Sample rate of the clip
+        seed (int): Seed for the background noise
+
+    Returns:
+        bytes: WAV file contents
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    # Voiced "syllables": a 140 Hz harmonic stack gated on and off about four times a second
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6))
+    gate = (np.sin(2 * np.pi * 4 * t) > -0.3).astype(np.float32)
+    signal = 0.2 * voice * gate + rng.normal(0, 0.002, len(t))
+    lead = int(min(1.0, seconds / 10) * sample_rate)
+    signal[:lead] = rng.normal(0, 0.002, lead)
+    signal[-lead:] = rng.normal(0, 0.002, lead)
+
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.repeat(pcm, 2).tobytes())
+    return buffer.getvalue()
+
+
+class BenchmarkSession:
+    """A VPEApp wired to the fake API, with helpers to reset its session between measurements."""
+
+    def __init__(self, state, base_url):
+        import streamlit as st
+        import app
+
+        # Calling app code outside `streamlit run` logs a context warning for every st.* call
+        # (a filter, because Streamlit resets logger levels when it loads its config)
+        logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+            lambda record: record.levelno >= logging.ERROR
+        )
+        self.st = st
+        self.app_module = app
+        self.state = state  # the fake server's state, for API call accounting
+        # The app reads its clients' settings from st.secrets; point the process-wide getters at the fake
+        self.client = create_client(api_key="sk-benchmark", base_url=base_url,
+                                    scheduler=app.get_api_scheduler(), priority=INTERACTIVE)
+        background_client = create_client(api_key="sk-benchmark", base_url=base_url,
+                                          scheduler=app.get_api_scheduler(), priority=BACKGROUND)
+        app.get_openai_client = lambda: self.client
+        app.get_background_client = lambda: background_client
+        app.THREAD_RESERVE_SIZE = 0  # background refills would be counted as turn API calls
+        self.app = app.VPEApp()
+        self.assistant_id = app.get_case_registry().get(BENCHMARK_ACTOR).assistant_id
+
+    def new_conversation(self, thread_id=None):
+        """Start a fresh conversation (as an actor switch would)."""
+        session = self.st.session_state
+        session.selected_actor = BENCHMARK_ACTOR
+        session.messages = []
+        session.transcript = self.app_module.Transcript()
+        session.thread_id = thread_id
+        session.feedback_job_id = None
+
+    def api_calls(self):
+        return self.state.stats()["total_requests"]
+
+    def fill_thread(self, message_count, label=""):
+        """Create a thread holding message_count alternating turns, mirrored in the local transcript."""
+        thread_id = self.client.beta.threads.create().id
+        self.new_conversation(thread_id)
+        for number in range(message_count):
+            role = "user" if number % 2 == 0 else "assistant"
+            content = f"{label}Turn {number}: " + "the pain started two days ago and gets worse at night. " * 3
+            self.client.beta.threads.messages.create(thread_id=thread_id, role=role, content=content)
+            self.app.add_message(role, content)
+        return thread_id
+
+
+def measure(session, run, repeat, setup=None):
+    """
+    Time a benchmark body several times.
+
+    Args:
+        session (BenchmarkSession): Session the body runs in
+        run (callable): The measured code; may return a dict of extra per-run values
+        repeat (int): Number of measured runs
+        setup (callable): Unmeasured preparation before every run
+
+    Returns:
+        dict: Median/min/max seconds, API calls per run and the medians of the extra values
+    """
+    seconds, calls, extras = [], [], {}
+    for _ in range(repeat):
+        if setup:
+            setup()
+        calls_before = session.api_calls()
+        started = time.perf_counter()
+        extra = run()
+        seconds.append(time.perf_counter() - started)
+        calls.append(session.api_calls() - calls_before)
+        for key, value in (extra if isinstance(extra, dict) else {}).items():
+            extras.setdefault(key, []).append(value)
+
+    result = {
+        "median": round(statistics.median(seconds), 4),
+        "min": round(min(seconds), 4),
+        "max": round(max(seconds), 4),
+        "api_calls": statistics.median(calls),
+        "runs": repeat,
+    }
+    result.update({key: round(statistics.median(values), 4) for key, values in extras.items()})
+    return result
+
+
+def bench_chat_turns(session, repeat):
+    """One patient reply through each conversation backend."""
+    app = session.app
+    results = {}
+
+    def reply(method):
+        def run():
+            prompt = "Can you describe what it feels like?"
+            session.app.add_message("user", prompt)
+            if method == "stream_chat_completion":
+                response = app.stream_chat_completion(BENCHMARK_ACTOR)
+            else:
+                response = getattr(app, method)(prompt, session.assistant_id)
+            if not response:
+                raise RuntimeError(f"{method} returned no response")
+            app.add_message("assistant", response)
+        return run
+
+    for method in ("send_message_to_patient", "stream_message_to_patient", "stream_chat_completion"):
+        # A fresh conversation on an existing thread, as for any turn after the first
+        session.new_conversation(session.client.beta.threads.create().id)
+        results[f"chat_turn.{method}"] = measure(session, reply(method), repeat)
+    return results
+
+
+def bench_threads(session, repeat):
+    """Cost of the first message's thread: created on demand, or taken from a warm reserve."""
+    app_module = session.app_module
+    results = {"thread.create": measure(session, session.app.create_thread, repeat)}
+
+    app_module.THREAD_RESERVE_SIZE = repeat
+    reserve = app_module.get_thread_reserve()
+    deadline = time.time() + 30
+    while reserve.available() < repeat and time.time() < deadline:
+        time.sleep(0.05)
+    results["thread.ensure_from_reserve"] = measure(
+        session, session.app.ensure_thread, repeat, setup=session.new_conversation
+    )
+    # Refills of the reserve run concurrently, so its API call count means nothing here
+    results["thread.ensure_from_reserve"]["api_calls"] = None
+    app_module.THREAD_RESERVE_SIZE = 0
+    return results
+
+
+def bench_transcripts(session, repeat):
+    """Building the feedback transcript from the local copy, and after a turn that forces a check."""
+    results = {}
+    for size in TRANSCRIPT_SIZES:
+        thread_id = session.fill_thread(size)
+        entries = list(session.st.session_state.transcript.entries)
+
+        def fresh_transcript(verify):
+            transcript = session.app_module.Transcript()
+            for role, content in entries:
+                transcript.append(role, content)
+            if verify:
+                transcript.mark_unverified()
+            session.st.session_state.transcript = transcript
+
+        results[f"transcript.{size}.local"] = measure(
+            session, lambda: session.app.get_transcript(thread_id), repeat,
+            setup=lambda: fresh_transcript(False),
+        )
+        results[f"transcript.{size}.verified"] = measure(
+            session, lambda: session.app.get_transcript(thread_id), repeat,
+            setup=lambda: fresh_transcript(True),
+        )
+    return results
+
+
+def bench_audio(session, repeat):
+    """Preprocessing and transcription of voice input of different lengths."""
+    from audio_pipeline import prepare_audio
+
+    results = {}
+    for seconds in AUDIO_SECONDS:
+        recording = synthetic_recording(seconds)
+        prepared = prepare_audio(recording)
+        results[f"audio.{seconds}s.prepare"] = measure(session, lambda: prepare_audio(recording), repeat)
+        results[f"audio.{seconds}s.prepare"].update(
+            recording_bytes=len(recording), upload_bytes=len(prepared.wav_bytes)
+        )
+
+        def transcribe():
+            if not session.app.transcribe_audio(prepared.wav_bytes):
+                raise RuntimeError("transcription failed")
+        results[f"audio.{seconds}s.transcribe"] = measure(session, transcribe, repeat)
+    return results
+
+
+def bench_voice_turns(session, repeat):
+    """A spoken first turn, from the end of the recording to the patient's first token: serial and pipelined."""
+    from audio_pipeline import prepare_audio
+
+    app_module = session.app_module
+    app = session.app
+    prepared = prepare_audio(synthetic_recording(AUDIO_SECONDS[0]))
+    results = {}
+
+    def run():
+        started = time.time()
+        prompt = app.transcribe_voice_turn(prepared.wav_bytes)
+        if not prompt:
+            raise RuntimeError("transcription failed")
+        app.handle_user_input(prompt, session.assistant_id)
+        spans = app_module.get_metrics().session_spans(session.st.session_state.session_id)
+        stream = next(span for span in reversed(spans) if span.name == "runs.stream")
+        first_token = stream.start_time + stream.attrs["first_token_seconds"]
+        return {"first_token_seconds": first_token - started}
+
+    pipelined = app_module.PIPELINE_VOICE_TURNS
+    for mode in ("serial", "pipelined"):
+        # Each run is the first turn of a new conversation, so its thread is still to be created
+        app_module.PIPELINE_VOICE_TURNS = mode == "pipelined"
+        results[f"voice_turn.{mode}"] = measure(session, run, repeat, setup=session.new_conversation)
+    app_module.PIPELINE_VOICE_TURNS = pipelined
+    return results
+
+
+def bench_speech(session, repeat):
+    """A spoken patient reply: synthesized in one piece, sentence by sentence (cold cache) and from the cache."""
+    from concurrent.futures import ThreadPoolExecutor
+    from fake_openai import PATIENT_REPLIES
+    from speech import DEFAULT_VOICE, OpenAISpeechBackend, SpeechCache, SpeechSynthesizer, SpokenReply
+
+    text = " ".join(PATIENT_REPLIES[:4])
+    backend = OpenAISpeechBackend(session.client)
+    executor = ThreadPoolExecutor(max_workers=8)
+    synthesizer = SpeechSynthesizer(backend, SpeechCache(), executor)
+
+    def whole():
+        backend.synthesize(text, DEFAULT_VOICE)
+
+    def chunked():
+        started = time.perf_counter()
+        reply = SpokenReply(synthesizer, DEFAULT_VOICE)
+        reply.feed(text)
+        reply.finish()
+        if reply.next_clip(timeout=30) is None:
+            raise RuntimeError("no speech")
+        first_clip = time.perf_counter() - started
+        reply.rest(30)
+        return {"first_clip_seconds": first_clip}
+
+    def clear_cache():
+        synthesizer.cache = SpeechCache()
+
+    results = {
+        "speech.whole_reply": measure(session, whole, repeat),
+        "speech.chunked": measure(session, chunked, repeat, setup=clear_cache),
+        "speech.cached": measure(session, chunked, repeat),
+    }
+    executor.shutdown()
+    return results
+
+
+def bench_feedback(session, repeat):
+    """Feedback from button press to finished job, through the job queue and (cold) cache."""
+    app_module = session.app_module
+    jobs = app_module.get_feedback_jobs()
+    iteration = [0]
+
+    def setup():
+        # A different conversation every time, so the feedback cache never answers
+        iteration[0] += 1
+        session.fill_thread(10, label=f"[{iteration[0]}] ")
+
+    def run():
+        session.app.generate_feedback(BENCHMARK_ACTOR)
+        job_id = session.st.session_state.feedback_job_id
+        while not jobs.get(job_id).finished:
+            time.sleep(0.01)
+        job = jobs.get(job_id)
+        if job.status != app_module.DONE:
+            raise RuntimeError(f"feedback failed: {job.error}")
+
+    return {f"feedback.{app_module.FEEDBACK_MODE}": measure(session, run, repeat, setup=setup)}
+
+
+BENCHMARKS = {
+    "chat_turn": bench_chat_turns,
+    "thread": bench_threads,
+    "transcript": bench_transcripts,
+    "audio": bench_audio,
+    "voice_turn": bench_voice_turns,
+    "speech": bench_speech,
+    "feedback": bench_feedback,
+}
+
+
+def run_benchmarks(repeat=DEFAULT_REPEAT, only=None):
+    """
+    Run the suite against a freshly started fake API.
+
+    Args:
+        repeat (int): Measured runs per benchmark
+        only (list): Prefixes of the benchmark groups to run (None runs all)
+
+    Returns:
+        dict: {"meta": {...}, "benchmarks": {name: result}}
+    """
+    server, base_url = start_in_background(BENCHMARK_API)
+    try:
+        session = BenchmarkSession(server.RequestHandlerClass.state, base_url)
+        results = {}
+        for group, bench in BENCHMARKS.items():
+            if only and not any(group.startswith(prefix.split(".")[0]) for prefix in only):
+                continue
+            print(f"running {group} benchmarks...", flush=True)
+            results.update(bench(session, repeat))
+    finally:
+        server.shutdown()
+
+    if only:
+        results = {name: result for name, result in results.items()
+                   if any(name.startswith(prefix) for prefix in only)}
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "api": asdict(BENCHMARK_API),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results with a baseline.
+
+    Args:
+        results (dict): Output of run_benchmarks()
+        baseline (dict): An earlier output of run_benchmarks()
+        tolerance (float): Allowed relative slowdown of the median
+
+    Returns:
+        tuple: (regressions, improvements) as lists of human-readable lines
+    """
+    regressions, improvements = [], []
+    for name, result in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        change = result["median"] - before["median"]
+        if change > max(before["median"] * tolerance, MIN_REGRESSION_SECONDS):
+            regressions.append(f"{name}: median {before['median']}s -> {result['median']}s")
+        elif -change > max(before["median"] * tolerance, MIN_REGRESSION_SECONDS):
+            improvements.append(f"{name}: median {before['median']}s -> {result['median']}s")
+        if before.get("api_calls") is not None and result.get("api_calls") is not None:
+            if result["api_calls"] > before["api_calls"]:
+                regressions.append(f"{name}: API calls {before['api_calls']} -> {result['api_calls']}")
+            elif result["api_calls"] < before["api_calls"]:
+                improvements.append(f"{name}: API calls {before['api_calls']} -> {result['api_calls']}")
+    return regressions, improvements
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'benchmark':<42} {'median':>9} {'min':>9} {'baseline':>9} {'API calls':>10}")
+    for name, result in results["benchmarks"].items():
+        before = (baseline or {}).get("benchmarks", {}).get(name, {}).get("median", "")
+        calls = "" if result["api_calls"] is None else result["api_calls"]
+        print(f"{name:<42} {result['median']:>9} {result['min']:>9} {before:>9} {calls:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the encounter hot path against the fake API.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="measured runs per benchmark")
+    parser.add_argument("--only", nargs="+", help="run only benchmarks whose name starts with these prefixes")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown of a median before it counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(repeat=args.repeat, only=args.only)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print_results(results)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+
+    regressions, improvements = compare(results, baseline, args.tolerance)
+    for line in improvements:
+        print(f"  improved: {line}")
+    for line in regressions:
+        print(f"  REGRESSION: {line}")
+    if regressions:
+        raise SystemExit(1)
+    print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# case_registry.py
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+RELOAD_INTERVAL = 5.0  # seconds between checks of the case directory for changed files
+REQUIRED_FIELDS = ("patient_name", "specialty", "number", "assistant_id", "feedback_assistant_id")
+OPTIONAL_FIELDS = ("intro", "voice")
+
+logger = logging.getLogger(__name__)
+
+
+class CaseError(ValueError):
+    """Raised when a case definition file is invalid."""
+
+
+@dataclass(frozen=True)
+class Case:
+    """One virtual patient encounter: the patient assistant, its rater, and what the student sees."""
+    key: str  # "Name (Specialty NN)", shown in the sidebar and stored with the session
+    patient_name: str
+    specialty: str
+    number: int
+    assistant_id: str  # Assistants API patient
+    feedback_assistant_id: str  # Assistants API rater
+    intro: str = None  # case introduction shown above the chat, or None
+    voice: str = None  # speech voice for spoken replies, or None for the default
+    path: str = None
+
+
+def load_case(path):
+    """
+    Read and validate one case definition file.
+
+    A case file is a JSON object with the REQUIRED_FIELDS and any of the OPTIONAL_FIELDS.
+
+    Args:
+        path (str): The case file
+
+    Returns:
+        Case: The case
+
+    Raises:
+        CaseError: If the file cannot be parsed or a field is missing or invalid
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CaseError(f"{path}: {e}") from e
+    if not isinstance(data, dict):
+        raise CaseError(f"{path}: expected a JSON object")
+
+    missing = [name for name in REQUIRED_FIELDS if not data.get(name)]
+    if missing:
+        raise CaseError(f"{path}: missing {', '.join(missing)}")
+    if not isinstance(data["number"], int):
+        raise CaseError(f"{path}: number must be an integer")
+    for name in ("assistant_id", "feedback_assistant_id"):
+        if not str(data[name]).startswith("asst_"):
+            raise CaseError(f"{path}: {name} is not an assistant ID")
+    unknown = set(data) - set(REQUIRED_FIELDS) - set(OPTIONAL_FIELDS)
+    if unknown:
+        raise CaseError(f"{path}: unknown fields {', '.join(sorted(unknown))}")
+
+    return Case(
+        key=f"{data['patient_name']} ({data['specialty']} {data['number']:02d})",
+        patient_name=data["patient_name"],
+        specialty=data["specialty"],
+        number=data["number"],
+        assistant_id=data["assistant_id"],
+        feedback_assistant_id=data["feedback_assistant_id"],
+        intro=data.get("intro") or None,
+        voice=data.get("voice") or None,
+        path=path,
+    )
+
+
+class _CaseIndex:
+    """Immutable lookup tables over one set of cases; replaced as a whole on reload."""
+
+    def __init__(self, cases):
+        self.by_key = {case.key: case for case in cases}
+        self.keys = list(self.by_key)
+        self.by_specialty = {}
+        for case in cases:
+            self.by_specialty.setdefault(case.specialty, []).append(case.key)
+        self.specialties = sorted(self.by_specialty)
+
+
+class CaseRegistry:
+    """
+    All cases of the app, loaded from a directory of case definition files.
+
+    Files are parsed, validated and indexed once; refresh() re-reads only files whose
+    modification time or size changed, and at most every `reload_interval` seconds.
+    An invalid file is logged and its last valid version stays in service, so one bad
+    edit does not take a case offline (a file that was never valid is skipped).
+    Lookups go through prebuilt dicts and lists and never touch the disk.
+    """
+
+    def __init__(self, directory, reload_interval=RELOAD_INTERVAL):
+        """
+        Args:
+            directory (str): Directory with one *.json file per case
+            reload_interval (float): Minimum seconds between directory scans
+        """
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.errors = []  # messages for the files that failed validation in the latest load
+        self._lock = threading.Lock()
+        self._files = {}  # file name -> ((mtime_ns, size), last valid Case or None, CaseError or None)
+        self._index = _CaseIndex([])
+        self._checked_at = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Reload the registry if case files were added, removed or changed since the last scan.
+
+        Returns:
+            bool: True if the registry was rebuilt
+        """
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stats = {}
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        stat = entry.stat()
+                        stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+            if stats == {name: entry[0] for name, entry in self._files.items()}:
+                return False
+
+            files = {}
+            for name, signature in sorted(stats.items()):
+                previous = self._files.get(name)
+                if previous is not None and previous[0] == signature:
+                    files[name] = previous
+                    continue
+                try:
+                    files[name] = (signature, load_case(os.path.join(self.directory, name)), None)
+                except CaseError as e:
+                    # Keep serving the last valid version of the file until it is fixed
+                    files[name] = (signature, previous[1] if previous is not None else None, e)
+
+            cases, errors, seen = [], [], {}
+            for name, (_, case, error) in files.items():
+                if error is not None:
+                    errors.append(str(error) if case is None else f"{error} (still serving the previous version)")
+                if case is None:
+                    continue
+                if case.key in seen:
+                    errors.append(f"{case.path}: duplicate case {case.key!r} (also in {seen[case.key]})")
+                else:
+                    seen[case.key] = case.path
+                    cases.append(case)
+            cases.sort(key=lambda case: (case.specialty, case.number, case.patient_name))
+
+            for error in errors:
+                logger.warning("Invalid case file: %s", error)
+            self._files = files
+            self.errors = errors
+            self._index = _CaseIndex(cases)
+            return True
+
+    def get(self, key):
+        """
+        Look up a case by its key.
+
+        Returns:
+            Case: The case, or None if there is no such (valid) case
+        """
+        return self._index.by_key.get(key)
+
+    def keys(self, specialty=None):
+        """
+        Case keys in sidebar order.
+
+        Args:
+            specialty (str): Only the cases of this specialty, or None for all cases
+
+        Returns:
+            list: Case keys (do not modify)
+        """
+        index = self._index
+        return index.keys if specialty is None else index.by_specialty.get(specialty, [])
+
+    def specialties(self):
+        """Specialties that have at least one case, sorted."""
+        return self._index.specialties
+
+    def __len__(self):
+        return len(self._index.keys)
+
+    def __contains__(self, key):
+        return key in self._index.by_key
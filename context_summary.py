@@ -0,0 +1,128 @@
+# context_summary.py
+
+import threading
+
+from transcript import format_entry
+
+SUMMARY_PROMPT = """You keep notes on a medical student's interview with a standardized patient, {patient_name}.
+Update the notes with the new part of the conversation. Record every fact the patient has stated
+(symptoms, timing, history, medications, family and social history) and any details the patient
+has refused or not yet been asked about, so later answers stay consistent. Use short bullet points
+and the patient's own wording for facts; do not add anything that was not said.
+
+Current notes:
+{summary}
+
+New part of the conversation:
+{turns}"""
+
+# Given to the patient with every bounded-context run
+SUMMARY_INSTRUCTIONS = """Earlier parts of this interview are no longer shown to you. These notes
+summarize what was said; stay consistent with them and do not repeat information as if it were new:
+{summary}"""
+
+
+def summarize_turns(client, model, patient_name, summary, messages, timeout=None):
+    """
+    Fold new conversation turns into the running summary.
+
+    Args:
+        client (openai.OpenAI): The OpenAI client
+        model (str): Chat model that writes the summary
+        patient_name (str): The name of the patient
+        summary (str): The current summary ("" for the first update)
+        messages (list): {"role", "content"} dicts of the turns to fold in, oldest first
+        timeout (float): Request timeout in seconds, or None for the client default
+
+    Returns:
+        str: The updated summary
+    """
+    prompt = SUMMARY_PROMPT.format(
+        patient_name=patient_name,
+        summary=summary or "(none yet)",
+        turns="".join(format_entry(msg["role"], msg["content"]) for msg in messages).strip(),
+    )
+    options = {"timeout": timeout} if timeout else {}
+    completion = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        **options,
+    )
+    return completion.choices[0].message.content.strip()
+
+
+class RollingSummary:
+    """
+    Summary of the turns that fell out of a bounded context window, updated in the background.
+
+    The summary covers the first `covered` messages of the conversation; runs are sent the
+    summary plus every message after that, so a turn is never dropped before it has been
+    summarized. Once enough uncovered turns have piled up behind the window, they are folded
+    in by one background request, which keeps the context each run sees roughly constant.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.covered = 0  # leading messages the summary accounts for
+        self._updating = False
+        self._lock = threading.Lock()
+
+    def context_start(self, message_count, window):
+        """
+        Index of the first message to send verbatim.
+
+        Args:
+            message_count (int): Messages in the conversation so far
+            window (int): Messages always sent verbatim
+
+        Returns:
+            int: The window's start, moved back to cover turns not yet summarized
+        """
+        with self._lock:
+            return min(max(message_count - window, 0), self.covered)
+
+    def schedule_update(self, executor, client, model, patient_name, messages, window, batch,
+                        metrics=None, session_id=None):
+        """
+        Fold the turns behind the window into the summary on `executor`, if enough have piled up.
+
+        Does nothing while an update is already running; the next turn checks again.
+
+        Args:
+            executor (concurrent.futures.Executor): Pool the update runs on
+            client (openai.OpenAI): The OpenAI client (a background-priority client)
+            model (str): Chat model that writes the summary
+            patient_name (str): The name of the patient
+            messages (list): The whole conversation as {"role", "content"} dicts
+            window (int): Messages always sent verbatim
+            batch (int): Minimum number of messages folded in per update
+            metrics (MetricsRegistry): Registry the update is timed in, or None
+            session_id (str): Session the update's span belongs to
+
+        Returns:
+            bool: True if an update was started
+        """
+        end = len(messages) - window
+        with self._lock:
+            if self._updating or end - self.covered < batch:
+                return False
+            self._updating = True
+            turns = [{"role": msg["role"], "content": msg["content"]} for msg in messages[self.covered:end]]
+            summary = self.text
+        executor.submit(self._update, client, model, patient_name, summary, turns, end, metrics, session_id)
+        return True
+
+    def _update(self, client, model, patient_name, summary, turns, end, metrics, session_id):
+        try:
+            if metrics is None:
+                text = summarize_turns(client, model, patient_name, summary, turns)
+            else:
+                with metrics.span("context.summary", session_id=session_id, messages=len(turns)):
+                    text = summarize_turns(client, model, patient_name, summary, turns)
+        except Exception:
+            text = None  # the turns stay in the verbatim context; the next turn retries
+        with self._lock:
+            if text:
+                self.text = text
+                self.covered = end
+            self._updating = False
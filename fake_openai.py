@@ -0,0 +1,657 @@
+# fake_openai.py
+"""
+Offline stand-in for the OpenAI endpoints used by the app.
+
+Serves assistants, threads, messages, runs (polled and streamed), chat completions (streamed),
+audio transcriptions (plain or streamed) and speech from memory, with configurable
+latency, failure and rate-limit (429) distributions. Point the app at it with
+OPENAI_BASE_URL = "http://127.0.0.1:<port>/v1" in .streamlit/secrets.toml.
+
+Usage:
+    python fake_openai.py --port 8765 --generation-seconds 2 --rate-limit-rate 0.02
+"""
+
+import argparse
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import wave
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PATIENT_REPLIES = [
+    "It started a couple of days ago and it's been getting worse since.",
+    "No, nothing like this has ever happened to me before.",
+    "It's mostly right here. Sometimes it moves a little, but mostly here.",
+    "I'd say about a seven out of ten right now. Last night it was worse.",
+    "I take a pill for my blood pressure, but I can't remember the name.",
+    "I don't smoke. I have a glass of wine with dinner now and then.",
+    "My mother had something similar, I think, but she never talked about it much.",
+    "I haven't really been sleeping well because of it.",
+]
+
+TRANSCRIPTION_TEXT = "Can you tell me more about what brought you in today?"
+
+FEEDBACK_REPLY = (
+    "### Domain assessment\n\n"
+    "**Strengths:** The student opened with an open-ended question and clarified the chief complaint.\n\n"
+    "**Areas for improvement:** Explore associated symptoms and summarize back to the patient.\n\n"
+    "**Score:** {score}/5"
+)
+
+
+@dataclass
+class FakeConfig:
+    """Latency and failure model of the fake API (all times in seconds)."""
+    request_latency: float = 0.05  # median overhead of every request
+    latency_sigma: float = 0.5  # log-normal spread applied to every sampled duration
+    queue_seconds: float = 0.3  # median time a run spends queued
+    generation_seconds: float = 2.0  # median time a run spends generating
+    token_seconds: float = 0.03  # delay between streamed tokens
+    prompt_token_seconds: float = 0.0  # extra queue time per token of context a run or completion reads
+    transcription_seconds: float = 0.4  # fixed part of a transcription
+    transcription_per_audio_second: float = 0.05  # variable part, per second of uploaded audio
+    speech_seconds: float = 0.3  # fixed part of a speech synthesis
+    speech_per_char: float = 0.002  # variable part, per character of input
+    failure_rate: float = 0.0  # probability of a 500 response
+    rate_limit_rate: float = 0.0  # probability of a 429 response
+    retry_after: float = 1.0  # Retry-After sent with 429 responses
+    run_failure_rate: float = 0.0  # probability that a run ends as "failed"
+    seed: int = None
+
+
+class FakeOpenAIState:
+    """In-memory threads, messages and runs, plus per-endpoint request counters."""
+
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.threads = {}  # thread_id -> list of messages
+        self.runs = {}  # run_id -> run dict (with private timing keys)
+        self.requests = Counter()
+        self.responses = Counter()
+
+    def sample(self, median):
+        """Sample a log-normal duration around the given median."""
+        if median <= 0:
+            return 0.0
+        with self.lock:
+            return median * math.exp(self.random.gauss(0, self.config.latency_sigma))
+
+    def chance(self, probability):
+        with self.lock:
+            return self.random.random() < probability
+
+    def reply_text(self):
+        with self.lock:
+            return self.random.choice(PATIENT_REPLIES)
+
+    def feedback_text(self, prompt):
+        """A rater reply for a feedback prompt, ending with the JSON scores block it asks for."""
+        match = re.search(r"Assess ONLY domain (\d+)", prompt)
+        domains = [int(match.group(1))] if match else range(1, 6)
+        with self.lock:
+            scores = {str(domain): self.random.randint(2, 5) for domain in domains}
+        reply = FEEDBACK_REPLY.format(score=round(sum(scores.values()) / len(scores)))
+        return f"{reply}\n\n```json\n{json.dumps({'scores': scores})}\n```"
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "responses": dict(self.responses),
+                "total_requests": sum(self.requests.values()),
+                "threads": len(self.threads),
+                "runs": len(self.runs),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.responses.clear()
+
+
+def new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def make_message(thread_id, role, text, run_id=None, assistant_id=None):
+    return {
+        "id": new_id("msg"),
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "status": "completed",
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": assistant_id,
+        "run_id": run_id,
+        "attachments": [],
+        "metadata": {},
+    }
+
+
+def public_run(run):
+    return {key: value for key, value in run.items() if not key.startswith("_")}
+
+
+def tokens(text):
+    """Split text into word-sized chunks that keep their trailing whitespace."""
+    return re.findall(r"\S+\s*", text)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out separately; don't add delayed-ACK stalls
+    state = None  # set by make_server
+
+    # Routes: (method, pattern, handler name)
+    ROUTES = [
+        ("GET", r"/v1/assistants/(?P<assistant_id>[^/]+)", "retrieve_assistant"),
+        ("POST", r"/v1/threads", "create_thread"),
+        ("GET", r"/v1/threads/(?P<thread_id>[^/]+)", "retrieve_thread"),
+        ("DELETE", r"/v1/threads/(?P<thread_id>[^/]+)", "delete_thread"),
+        ("POST", r"/v1/threads/(?P<thread_id>[^/]+)/messages", "create_message"),
+        ("GET", r"/v1/threads/(?P<thread_id>[^/]+)/messages", "list_messages"),
+        ("POST", r"/v1/threads/(?P<thread_id>[^/]+)/runs", "create_run"),
+        ("GET", r"/v1/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)", "retrieve_run"),
+        ("POST", r"/v1/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)/cancel", "cancel_run"),
+        ("POST", r"/v1/chat/completions", "chat_completion"),
+        ("POST", r"/v1/audio/transcriptions", "transcription"),
+        ("POST", r"/v1/audio/speech", "speech"),
+        ("GET", r"/__stats", "get_stats"),
+        ("POST", r"/__stats/reset", "reset_stats"),
+    ]
+
+    def log_message(self, format, *args):
+        pass  # keep load tests quiet
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.raw_body = self.rfile.read(length) if length else b""
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                break
+        else:
+            self.send_json(404, {"error": {"message": f"No route for {method} {url.path}", "type": "invalid_request_error"}})
+            return
+
+        if not name.endswith("_stats"):
+            with self.state.lock:
+                self.state.requests[name] += 1
+            time.sleep(self.state.sample(self.state.config.request_latency))
+            if self.state.chance(self.state.config.rate_limit_rate):
+                self.send_json(429, {"error": {"message": "Rate limit reached (fake)", "type": "requests"}},
+                               headers={"retry-after": str(self.state.config.retry_after)})
+                return
+            if self.state.chance(self.state.config.failure_rate):
+                self.send_json(500, {"error": {"message": "Internal error (fake)", "type": "server_error"}})
+                return
+
+        try:
+            getattr(self, name)(**match.groupdict())
+        except KeyError as e:
+            self.send_json(404, {"error": {"message": f"Not found: {e}", "type": "invalid_request_error"}})
+
+    def json_body(self):
+        if not self.raw_body:
+            return {}
+        return json.loads(self.raw_body)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.state.lock:
+            self.state.responses[status] += 1
+
+    def send_bytes(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.state.lock:
+            self.state.responses[status] += 1
+
+    def start_event_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        with self.state.lock:
+            self.state.responses[200] += 1
+
+    def send_event(self, data, event=None):
+        text = f"event: {event}\n" if event else ""
+        text += f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+        chunk = text.encode("utf-8")
+        self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def end_event_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # Assistants
+
+    def retrieve_assistant(self, assistant_id):
+        self.send_json(200, {
+            "id": assistant_id,
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": None,
+            "description": None,
+            "model": "fake-model",
+            "instructions": "You are a standardized patient in a history-taking exercise (fake).",
+            "tools": [],
+            "metadata": {},
+        })
+
+    # Threads and messages
+
+    def create_thread(self):
+        thread_id = new_id("thread")
+        messages = [make_message(thread_id, message.get("role", "user"), message.get("content", ""))
+                    for message in self.json_body().get("messages") or []]
+        with self.state.lock:
+            self.state.threads[thread_id] = messages
+        self.send_json(200, {"id": thread_id, "object": "thread", "created_at": int(time.time()),
+                             "metadata": {}, "tool_resources": None})
+
+    def retrieve_thread(self, thread_id):
+        with self.state.lock:
+            if thread_id not in self.state.threads:
+                raise KeyError(thread_id)
+        self.send_json(200, {"id": thread_id, "object": "thread", "created_at": int(time.time()),
+                             "metadata": {}, "tool_resources": None})
+
+    def delete_thread(self, thread_id):
+        with self.state.lock:
+            deleted = self.state.threads.pop(thread_id, None) is not None
+        self.send_json(200, {"id": thread_id, "object": "thread.deleted", "deleted": deleted})
+
+    def create_message(self, thread_id):
+        body = self.json_body()
+        active = self.active_run(thread_id)
+        if active:
+            self.send_json(400, {"error": {
+                "message": f"Can't add messages to {thread_id} while a run {active['id']} is active.",
+                "type": "invalid_request_error",
+            }})
+            return
+        message = make_message(thread_id, body.get("role", "user"), body.get("content", ""))
+        with self.state.lock:
+            self.state.threads[thread_id].append(message)
+        self.send_json(200, message)
+
+    def list_messages(self, thread_id):
+        limit = int(self.query.get("limit", ["20"])[0])
+        order = self.query.get("order", ["desc"])[0]
+        after = self.query.get("after", [None])[0]
+        with self.state.lock:
+            messages = list(self.state.threads[thread_id])
+        if order == "desc":
+            messages.reverse()
+        if after:
+            ids = [message["id"] for message in messages]
+            messages = messages[ids.index(after) + 1:] if after in ids else []
+        page = messages[:limit]
+        self.send_json(200, {
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(messages) > limit,
+        })
+
+    # Runs
+
+    def create_run(self, thread_id):
+        body = self.json_body()
+        with self.state.lock:
+            if thread_id not in self.state.threads:
+                raise KeyError(thread_id)
+        active = self.active_run(thread_id)
+        if active:
+            self.send_json(400, {"error": {
+                "message": f"Thread {thread_id} already has an active run {active['id']}.",
+                "type": "invalid_request_error",
+            }})
+            return
+
+        for extra in body.get("additional_messages") or []:
+            content = extra["content"]
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content)
+            with self.state.lock:
+                self.state.threads[thread_id].append(make_message(thread_id, extra["role"], content))
+
+        now = time.time()
+        text = self.thread_text(thread_id)
+        run = {
+            "id": new_id("run"),
+            "object": "thread.run",
+            "created_at": int(now),
+            "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id"),
+            "status": "queued",
+            "model": "fake-model",
+            "instructions": "",
+            "tools": [],
+            "last_error": None,
+            "metadata": {},
+            "_created": now,
+            "_queue_until": now + self.state.sample(self.state.config.queue_seconds)
+                            + self.run_context_tokens(thread_id, body) * self.state.config.prompt_token_seconds,
+            "_fails": self.state.chance(self.state.config.run_failure_rate),
+            "_reply": self.state.feedback_text(text) if "rater" in text else self.state.reply_text(),
+        }
+        run["_done_at"] = run["_queue_until"] + self.state.sample(self.state.config.generation_seconds)
+        with self.state.lock:
+            self.state.runs[run["id"]] = run
+
+        if body.get("stream"):
+            run["_streaming"] = True
+            try:
+                self.stream_run(run)
+            except (ConnectionError, TimeoutError):
+                # The client went away; like the real API, the run carries on without it
+                with self.state.lock:
+                    run["_streaming"] = False
+                raise
+        else:
+            self.send_json(200, public_run(run))
+
+    def active_run(self, thread_id):
+        """The thread's run that is still queued, in progress or being cancelled, if any."""
+        with self.state.lock:
+            runs = [run for run in self.state.runs.values() if run["thread_id"] == thread_id]
+        for run in runs:
+            self.advance_run(run)
+            if run["status"] in ("queued", "in_progress", "cancelling"):
+                return run
+        return None
+
+    def run_context_tokens(self, thread_id, body):
+        """Tokens a run reads: the thread (or its last messages, with truncation) plus extra instructions."""
+        with self.state.lock:
+            messages = list(self.state.threads.get(thread_id, []))
+        truncation = body.get("truncation_strategy") or {}
+        if truncation.get("type") == "last_messages" and truncation.get("last_messages"):
+            messages = messages[-truncation["last_messages"]:]
+        text = " ".join(part["text"]["value"] for message in messages for part in message["content"])
+        return len(tokens(text)) + len(tokens(body.get("additional_instructions") or ""))
+
+    def thread_text(self, thread_id):
+        with self.state.lock:
+            messages = list(self.state.threads.get(thread_id, []))
+        return " ".join(part["text"]["value"] for message in messages for part in message["content"])
+
+    def advance_run(self, run):
+        """Move a polled run along its timeline; finishing a run appends the reply."""
+        now = time.time()
+        with self.state.lock:
+            if run["status"] in ("completed", "failed", "cancelled", "expired"):
+                return
+            if run["status"] == "cancelling":
+                run["status"] = "cancelled"
+                return
+            if run.get("_streaming"):
+                return  # the open event stream moves the run along
+            if now < run["_queue_until"]:
+                return
+            if now < run["_done_at"]:
+                run["status"] = "in_progress"
+                return
+            if run["_fails"]:
+                run["status"] = "failed"
+                run["last_error"] = {"code": "server_error", "message": "The run failed (fake)."}
+                return
+            run["status"] = "completed"
+            self.state.threads.setdefault(run["thread_id"], []).append(
+                make_message(run["thread_id"], "assistant", run["_reply"], run["id"], run["assistant_id"])
+            )
+
+    def retrieve_run(self, thread_id, run_id):
+        with self.state.lock:
+            run = self.state.runs[run_id]
+        self.advance_run(run)
+        self.send_json(200, public_run(run))
+
+    def cancel_run(self, thread_id, run_id):
+        with self.state.lock:
+            run = self.state.runs[run_id]
+            if run["status"] in ("queued", "in_progress"):
+                run["status"] = "cancelling"
+        self.send_json(200, public_run(run))
+
+    def stream_run(self, run):
+        self.start_event_stream()
+        self.send_event(public_run(run), "thread.run.created")
+        time.sleep(max(run["_queue_until"] - time.time(), 0))
+        with self.state.lock:
+            run["status"] = "in_progress"
+        self.send_event(public_run(run), "thread.run.in_progress")
+
+        message_id = new_id("msg")
+        for token in tokens(run["_reply"]):
+            with self.state.lock:
+                cancelled = run["status"] in ("cancelling", "cancelled")
+            if cancelled:
+                break
+            time.sleep(self.state.sample(self.state.config.token_seconds))
+            self.send_event({
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": token}}]},
+            }, "thread.message.delta")
+
+        with self.state.lock:
+            if run["status"] in ("cancelling", "cancelled"):
+                run["status"] = "cancelled"
+            elif run["_fails"]:
+                run["status"] = "failed"
+                run["last_error"] = {"code": "server_error", "message": "The run failed (fake)."}
+            else:
+                run["status"] = "completed"
+                message = make_message(run["thread_id"], "assistant", run["_reply"], run["id"], run["assistant_id"])
+                message["id"] = message_id
+                self.state.threads.setdefault(run["thread_id"], []).append(message)
+        self.send_event(public_run(run), f"thread.run.{run['status']}")
+        self.send_event("[DONE]", "done")
+        self.end_event_stream()
+
+    # Chat completions and audio
+
+    def chat_completion(self):
+        body = self.json_body()
+        completion_id = new_id("chatcmpl")
+        reply = self.state.reply_text()
+        if body.get("stream"):
+            self.start_event_stream()
+            prompt_tokens = sum(len(tokens(message.get("content") or "")) for message in body.get("messages", []))
+            time.sleep(self.state.sample(self.state.config.queue_seconds)
+                       + prompt_tokens * self.state.config.prompt_token_seconds)
+            for token in tokens(reply):
+                time.sleep(self.state.sample(self.state.config.token_seconds))
+                self.send_event(self.chat_chunk(completion_id, body, {"content": token}, None))
+            self.send_event(self.chat_chunk(completion_id, body, {}, "stop"))
+            self.send_event("[DONE]")
+            self.end_event_stream()
+            return
+
+        time.sleep(self.state.sample(self.state.config.generation_seconds))
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens(reply)), "total_tokens": 0},
+        })
+
+    @staticmethod
+    def chat_chunk(completion_id, body, delta, finish_reason):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def transcription(self):
+        # Approximate the audio length from the upload size (16 kHz, 16-bit mono)
+        audio_seconds = len(self.raw_body) / 32000
+        config = self.state.config
+        seconds = self.state.sample(config.transcription_seconds) + audio_seconds * config.transcription_per_audio_second
+        text = TRANSCRIPTION_TEXT
+        if not re.search(rb'name="stream"\r\n\r\ntrue', self.raw_body):
+            time.sleep(seconds)
+            self.send_json(200, {"text": text})
+            return
+
+        # Streamed: the words arrive spread over the transcription time, the full text at the end
+        words = tokens(text)
+        self.start_event_stream()
+        for word in words:
+            time.sleep(seconds / (len(words) + 1))
+            self.send_event({"type": "transcript.text.delta", "delta": word})
+        time.sleep(seconds / (len(words) + 1))
+        self.send_event({"type": "transcript.text.done", "text": text})
+        self.end_event_stream()
+
+    def speech(self):
+        body = self.json_body()
+        text = body.get("input", "")
+        config = self.state.config
+        time.sleep(self.state.sample(config.speech_seconds) + len(text) * config.speech_per_char)
+        # Silence as long as the text would take to say (about 0.35 s per word), 24 kHz 16-bit mono
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(24000)
+            wav.writeframes(b"\0\0" * int(24000 * 0.35 * max(len(text.split()), 1)))
+        self.send_bytes(200, buffer.getvalue(), "audio/wav")
+
+    # Introspection for the load driver
+
+    def get_stats(self):
+        self.send_json(200, self.state.stats())
+
+    def reset_stats(self):
+        self.state.reset_stats()
+        self.send_json(200, {"reset": True})
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default of 5 resets connections when many clients connect at once
+
+    def handle_error(self, request, client_address):
+        # Clients that go away mid-stream (timeouts, finished load-test workers) are expected
+        if isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(config=None, host="127.0.0.1", port=0):
+    """
+    Create (but do not start) a fake API server.
+
+    Args:
+        config (FakeConfig): Latency and failure model
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free one)
+
+    Returns:
+        FakeOpenAIServer: The server; its API base URL is f"http://{host}:{server.server_port}/v1"
+    """
+    handler = type("BoundFakeOpenAIHandler", (FakeOpenAIHandler,), {"state": FakeOpenAIState(config or FakeConfig())})
+    return FakeOpenAIServer((host, port), handler)
+
+
+def start_in_background(config=None, host="127.0.0.1", port=0):
+    """
+    Start a fake API server on a daemon thread.
+
+    Returns:
+        tuple: (server, base_url)
+    """
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the OpenAI API endpoints used by VPE.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--request-latency", type=float, default=FakeConfig.request_latency)
+    parser.add_argument("--latency-sigma", type=float, default=FakeConfig.latency_sigma)
+    parser.add_argument("--queue-seconds", type=float, default=FakeConfig.queue_seconds)
+    parser.add_argument("--generation-seconds", type=float, default=FakeConfig.generation_seconds)
+    parser.add_argument("--token-seconds", type=float, default=FakeConfig.token_seconds)
+    parser.add_argument("--prompt-token-seconds", type=float, default=FakeConfig.prompt_token_seconds)
+    parser.add_argument("--transcription-seconds", type=float, default=FakeConfig.transcription_seconds)
+    parser.add_argument("--speech-seconds", type=float, default=FakeConfig.speech_seconds)
+    parser.add_argument("--failure-rate", type=float, default=FakeConfig.failure_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=FakeConfig.rate_limit_rate)
+    parser.add_argument("--run-failure-rate", type=float, default=FakeConfig.run_failure_rate)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        request_latency=args.request_latency,
+        latency_sigma=args.latency_sigma,
+        queue_seconds=args.queue_seconds,
+        generation_seconds=args.generation_seconds,
+        token_seconds=args.token_seconds,
+        prompt_token_seconds=args.prompt_token_seconds,
+        transcription_seconds=args.transcription_seconds,
+        speech_seconds=args.speech_seconds,
+        failure_rate=args.failure_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        run_failure_rate=args.run_failure_rate,
+        seed=args.seed,
+    )
+    server = make_server(config, args.host, args.port)
+    print(f"Fake OpenAI API listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# feedback.py
+
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from run_waiter import PollSchedule, RunWaiter
+from transcript import message_text
+
+# Appended to every rater prompt so the feedback can be aggregated as well as read
+SCORES_INSTRUCTIONS = """
+After your feedback, add a fenced ```json code block containing only your score (1-5) for each
+domain you assessed, keyed by domain number, for example: {{"scores": {{"1": 4, "2": 3}}}}
+"""
+
+FEEDBACK_PROMPT_TEMPLATE = """
+You are an expert clinical skills rater. Use the five-domain assessment framework.
+
+Transcript of the student's chat with virtual standardized patient {patient_name}:
+
+{transcript}
+""" + SCORES_INSTRUCTIONS
+
+# Number of domains in the raters' assessment framework
+FEEDBACK_DOMAIN_COUNT = 5
+
+# Per-domain rater prompt; the domain is referred to by number so each feedback
+# assistant keeps using the names and criteria from its own instructions
+DOMAIN_PROMPT_TEMPLATE = """
+You are an expert clinical skills rater. Use the five-domain assessment framework.
+
+Assess ONLY domain {domain_number} of the five domains in this response; other raters cover the
+remaining domains. Start your answer with a level-3 markdown heading naming the domain.
+
+Transcript of the student's chat with virtual standardized patient {patient_name}:
+
+{transcript}
+""" + SCORES_INSTRUCTIONS
+
+SCORE_BLOCK_PATTERN = re.compile(r"\n*```json\s*(\{.*?\})\s*```\s*", re.DOTALL)
+MIN_SCORE, MAX_SCORE = 1, 5
+
+
+class FeedbackError(Exception):
+    """Raised when a feedback run does not produce feedback."""
+
+
+class PartialFeedbackError(FeedbackError):
+    """Raised when some domains of a per-domain report could not be rated."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report  # the merged report, with placeholders for the missing domains
+
+
+def build_feedback_prompt(patient_name, transcript):
+    """
+    Build the rater prompt for an encounter.
+
+    Args:
+        patient_name (str): The name of the patient
+        transcript (str): The formatted conversation transcript
+
+    Returns:
+        str: The prompt sent to the feedback assistant
+    """
+    return FEEDBACK_PROMPT_TEMPLATE.format(patient_name=patient_name, transcript=transcript)
+
+
+def build_domain_prompt(patient_name, transcript, domain_number):
+    """
+    Build the rater prompt for a single assessment domain.
+
+    Args:
+        patient_name (str): The name of the patient
+        transcript (str): The formatted conversation transcript
+        domain_number (int): 1-based number of the domain to assess
+
+    Returns:
+        str: The prompt sent to the feedback assistant
+    """
+    return DOMAIN_PROMPT_TEMPLATE.format(
+        patient_name=patient_name, transcript=transcript, domain_number=domain_number
+    )
+
+
+def merge_domain_feedback(sections, domain_count=FEEDBACK_DOMAIN_COUNT):
+    """
+    Combine per-domain sections into one report, in domain order.
+
+    Args:
+        sections (dict): Domain number -> markdown section
+        domain_count (int): Number of domains in the framework
+
+    Returns:
+        str: The combined report
+    """
+    parts = []
+    for domain_number in range(1, domain_count + 1):
+        section = sections.get(domain_number)
+        if section is None:
+            section = f"### Domain {domain_number}\n\n_Feedback for this domain could not be generated._"
+        parts.append(section.strip())
+    return "\n\n---\n\n".join(parts)
+
+
+def extract_scores(feedback, domain_count=FEEDBACK_DOMAIN_COUNT):
+    """
+    Split rater output into the feedback shown to the student and its machine-readable scores.
+
+    Every ```json {"scores": {...}} block (one per run, so a merged per-domain report
+    has several) is removed from the text; scores outside 1-5 or for unknown domains are ignored.
+
+    Args:
+        feedback (str): The rater's reply or the merged per-domain report
+        domain_count (int): Number of domains in the framework
+
+    Returns:
+        tuple: (feedback markdown without the score blocks, {domain number: score})
+    """
+    scores = {}
+
+    def collect(match):
+        try:
+            block = json.loads(match.group(1))
+        except ValueError:
+            return match.group(0)  # not ours; leave it in the text
+        if not isinstance(block, dict) or not isinstance(block.get("scores"), dict):
+            return match.group(0)
+        for domain, score in block["scores"].items():
+            try:
+                domain_number, score = int(domain), float(score)
+            except (TypeError, ValueError):
+                continue
+            if 1 <= domain_number <= domain_count and MIN_SCORE <= score <= MAX_SCORE:
+                scores[domain_number] = score
+        return "\n\n"
+
+    text = SCORE_BLOCK_PATTERN.sub(collect, feedback).strip()
+    return text, scores
+
+
+def request_domain_feedback(client, assistant_id, patient_name, transcript, timeout,
+                            schedule=PollSchedule(), on_section=None, domain_count=FEEDBACK_DOMAIN_COUNT,
+                            run_limiter=None, reaper=None):
+    """
+    Rate every domain with its own concurrent run and merge the results.
+
+    Wall-clock time is bounded by the slowest domain rather than the sum of all of them.
+
+    Args:
+        client (openai.OpenAI): The OpenAI client
+        assistant_id (str): The feedback assistant to run
+        patient_name (str): The name of the patient
+        transcript (str): The formatted conversation transcript
+        timeout (float): Maximum time to wait for each domain's run in seconds
+        schedule (PollSchedule): Polling schedule for the runs
+        on_section (callable): Called as on_section(domain_number, text) as each domain finishes
+        domain_count (int): Number of domains in the framework
+        run_limiter: Context manager held while each run is active (caps concurrent runs), or None
+        reaper (ResourceReaper): Run and thread cleanup, see request_feedback
+
+    Returns:
+        str: The combined report (see merge_domain_feedback)
+
+    Raises:
+        FeedbackError: If no domain produced feedback
+        PartialFeedbackError: If some domains did not; the report of the others is attached,
+            but it is not a complete grade and must not be cached or recorded as one
+    """
+    sections = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=domain_count, thread_name_prefix="feedback-domain") as executor:
+        futures = {
+            executor.submit(
+                request_feedback, client, assistant_id,
+                build_domain_prompt(patient_name, transcript, domain_number), timeout, schedule,
+                run_limiter=run_limiter, reaper=reaper,
+            ): domain_number
+            for domain_number in range(1, domain_count + 1)
+        }
+        for future in as_completed(futures):
+            domain_number = futures[future]
+            try:
+                sections[domain_number] = future.result()
+            except Exception as e:
+                errors.append(f"domain {domain_number}: {e}")
+                continue
+            if on_section is not None:
+                on_section(domain_number, sections[domain_number])
+
+    if not sections:
+        raise FeedbackError("Feedback generation failed for every domain (" + "; ".join(errors) + ")")
+    report = merge_domain_feedback(sections, domain_count)
+    if errors:
+        raise PartialFeedbackError(
+            f"Feedback generation failed for {len(errors)} of {domain_count} domains (" + "; ".join(sorted(errors)) + ")",
+            report,
+        )
+    return report
+
+
+def request_feedback(client, assistant_id, prompt, timeout, schedule=PollSchedule(), callbacks=(),
+                     run_limiter=None, reaper=None):
+    """
+    Run a feedback assistant on a prompt and return its reply.
+
+    This does not touch Streamlit, so it can run in a background worker.
+
+    Args:
+        client (openai.OpenAI): The OpenAI client
+        assistant_id (str): The feedback assistant to run
+        prompt (str): The rater prompt (see build_feedback_prompt)
+        timeout (float): Maximum time to wait for the run in seconds
+        schedule (PollSchedule): Polling schedule for the run
+        callbacks (iterable): Progress callbacks passed to RunWaiter
+        run_limiter: Context manager held while the run is active (caps concurrent runs), or None
+        reaper (ResourceReaper): Tracks the run (cancelled if it times out) and deletes the
+            single-use feedback thread afterwards, or None
+
+    Returns:
+        str: The feedback text
+
+    Raises:
+        FeedbackError: If the run fails, times out or returns no feedback
+    """
+    # Create new thread for feedback
+    feedback_thread = client.beta.threads.create()
+    try:
+        return _run_feedback_thread(client, feedback_thread.id, assistant_id, prompt, timeout,
+                                    schedule, callbacks, run_limiter, reaper)
+    finally:
+        if reaper is not None:
+            reaper.retire_thread(feedback_thread.id)
+
+
+def _run_feedback_thread(client, thread_id, assistant_id, prompt, timeout, schedule, callbacks,
+                         run_limiter, reaper):
+    # Send transcript to feedback assistant
+    client.beta.threads.messages.create(
+        thread_id=thread_id,
+        role="user",
+        content=prompt
+    )
+
+    with run_limiter or nullcontext():
+        # Start feedback generation
+        feedback_run = client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+        )
+        if reaper is not None:
+            reaper.run_started(thread_id, feedback_run.id)
+
+        # Wait for feedback completion
+        result = RunWaiter(client, schedule=schedule).wait(
+            thread_id, feedback_run.id, timeout, callbacks=callbacks
+        )
+    if reaper is not None:
+        reaper.release_run(thread_id, feedback_run.id, result.status)
+
+    if result.status == "timeout":
+        raise FeedbackError(f"Feedback generation timed out after {timeout} seconds.")
+    if result.status == "error":
+        raise FeedbackError(f"Error checking feedback generation status: {result.error}")
+    if not result.completed:
+        message = f"Feedback generation failed with status: {result.status}"
+        if result.last_error:
+            message += f" ({result.last_error})"
+        raise FeedbackError(message)
+
+    # Get feedback
+    feedback_messages = client.beta.threads.messages.list(
+        thread_id=thread_id,
+        limit=1
+    )
+    if not feedback_messages.data or feedback_messages.data[0].role != "assistant":
+        raise FeedbackError("No feedback generated. Please try again.")
+
+    return message_text(feedback_messages.data[0])
@@ -0,0 +1,188 @@
+# feedback_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def feedback_cache_key(assistant_id, prompt_template, transcript, patient_name=""):
+    """
+    Content address of a feedback request.
+
+    Args:
+        assistant_id (str): The feedback assistant (rater)
+        prompt_template (str): The rater prompt template
+        transcript (str): The formatted conversation transcript
+        patient_name (str): The patient named in the prompt
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256()
+    for part in (assistant_id, prompt_template, patient_name, transcript):
+        data = part.encode("utf-8")
+        # Length-prefix every part so different splits never hash the same
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class FeedbackCache:
+    """
+    Two-tier cache of generated feedback: an in-memory LRU and an optional directory on disk.
+
+    get_or_compute() also coalesces concurrent requests for the same key, so identical
+    requests that arrive while a run is in flight wait for that run instead of starting another.
+    """
+
+    def __init__(self, max_entries=256, disk_dir=None, disk_max_bytes=50_000_000, disk_max_age=7 * 24 * 3600):
+        """
+        Args:
+            max_entries (int): Entries kept in memory
+            disk_dir (str): Directory for the on-disk tier, or None to keep feedback in memory only
+            disk_max_bytes (int): Size limit for the on-disk tier; oldest entries are evicted first
+            disk_max_age (float): Seconds after which an on-disk entry is evicted
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_max_age = disk_max_age
+        self._memory = OrderedDict()
+        self._in_flight = {}  # key -> threading.Event set when the computing request finishes
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """
+        Look up cached feedback.
+
+        Returns:
+            str: The feedback, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store feedback in both tiers."""
+        self._remember(key, value)
+        self._write_disk(key, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return cached feedback, or compute it once even if several callers ask at the same time.
+
+        Args:
+            key (str): The cache key (see feedback_cache_key)
+            compute (callable): Called without arguments to produce the feedback on a miss
+
+        Returns:
+            str: The feedback
+
+        Raises:
+            Exception: Whatever compute raised; failures are not cached
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            with self._lock:
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    in_flight = self._in_flight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                # Someone else is computing this key; wait, then re-check the cache
+                # (if their request failed, one of the waiters takes over)
+                in_flight.wait()
+                continue
+
+            try:
+                value = compute()
+                self.put(key, value)
+                return value
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                in_flight.set()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_max_age:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["feedback"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"feedback": value, "created_at": time.time()}, f)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop expired entries, then the oldest ones until the directory fits its size limit."""
+        now = time.time()
+        entries = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.disk_max_age:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,124 @@
+# feedback_jobs.py
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class FeedbackJob:
+    """State of one background feedback generation."""
+    job_id: str
+    job_key: str = None
+    status: str = QUEUED
+    result: object = None
+    error: str = None
+    progress: str = ""  # short human-readable progress note, updated by the worker
+    sections: dict = field(default_factory=dict)  # partial results shown while the job runs
+    scores: dict = field(default_factory=dict)  # domain number -> score, once the job is done
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def elapsed(self):
+        """Seconds since the job started running (or was submitted, while queued)."""
+        start = self.started_at or self.submitted_at
+        return (self.finished_at or time.time()) - start
+
+
+class FeedbackJobQueue:
+    """
+    Runs feedback generation on a worker pool that outlives Streamlit reruns.
+
+    Sessions keep only the job ID; status and results live here, so a rerun,
+    an interaction or a dropped socket does not lose work in progress.
+    """
+
+    def __init__(self, max_workers=8, keep_finished=3600):
+        """
+        Args:
+            max_workers (int): Number of feedback runs executed in parallel
+            keep_finished (float): Seconds a finished job's result is kept
+        """
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="feedback")
+        self._jobs = {}
+        self._by_key = {}  # job_key -> job_id of the latest job for that key
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, job_key=None, **kwargs):
+        """
+        Queue a feedback job.
+
+        The function is called as func(job, *args, **kwargs) on a worker thread and
+        may update job.progress; its return value becomes job.result.
+
+        Args:
+            job_key (str): Identifies identical requests; while a job with the same key
+                is pending or done, its ID is returned instead of starting a new job
+
+        Returns:
+            str: The job ID
+        """
+        with self._lock:
+            self._discard_expired()
+            existing = self._jobs.get(self._by_key.get(job_key)) if job_key else None
+            if existing is not None and existing.status != FAILED:
+                return existing.job_id
+
+            job = FeedbackJob(job_id=uuid.uuid4().hex, job_key=job_key)
+            self._jobs[job.job_id] = job
+            if job_key:
+                self._by_key[job_key] = job.job_id
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.job_id
+
+    def get(self, job_id):
+        """
+        Look up a job.
+
+        Returns:
+            FeedbackJob: The job, or None if it is unknown or has expired
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        """Number of jobs that are queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _run(self, job, func, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _discard_expired(self):
+        cutoff = time.time() - self.keep_finished
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.job_key and self._by_key.get(job.job_key) == job_id:
+                del self._by_key[job.job_key]
@@ -0,0 +1,343 @@
+# grade_cohort.py
+"""
+Headless batch grading of a cohort's saved encounters.
+
+Every encounter is rated by its case's feedback assistant (from the case registry)
+with the same five-domain prompt as the app's "Generate Feedback!" button. Encounters
+are graded concurrently on a bounded worker pool whose API calls go through the
+same rate-limit-aware scheduler as the app's background work.
+
+Results are appended to a JSONL file as each encounter finishes. Rerunning with the
+same output file resumes an interrupted run: encounters already graded are skipped
+and failed ones are retried (the latest line for an encounter is its result).
+Per-domain scores are included in each result and, with --score-store, appended to
+the score store the app's analytics page reads.
+
+Input is a JSONL file, a directory of *.json / *.jsonl files, or the app's SQLite
+session store (SESSION_STORE_PATH), which keeps ended encounters for
+SESSION_STORE_RETENTION (30 days) after their last activity. Each encounter is a JSON object:
+    {"id": "...", "case": "Mr. Aiken (Geriatrics 15)", "transcript": "STUDENT: ..."}
+"transcript" may also be a list of [role, content] pairs, or "messages" a list of
+{"role", "content"} dicts; "selected_actor" is accepted for "case". Without an "id",
+encounters are identified by their content.
+
+Usage:
+    python grade_cohort.py cohort.jsonl --output grades.jsonl --workers 16
+    python grade_cohort.py transcripts/ --output grades.jsonl --mode per_domain
+    python grade_cohort.py .vpe_sessions.sqlite3 --output grades.jsonl
+    python grade_cohort.py cohort.jsonl --output grades.jsonl --fake   # dry run against fake_openai.py
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from api_scheduler import BACKGROUND, ApiScheduler
+from app import (
+    API_MAX_ATTEMPTS, API_REQUESTS_PER_MINUTE, API_TOKENS_PER_MINUTE, CASES_DIR,
+    FEEDBACK_POLL_SCHEDULE, FEEDBACK_TIMEOUT, MIN_MESSAGES_FOR_FEEDBACK, SCORE_STORE_DIR, SESSION_STORE_RETENTION,
+)
+from case_registry import CaseRegistry
+from feedback import (
+    DOMAIN_PROMPT_TEMPLATE, FEEDBACK_DOMAIN_COUNT, FEEDBACK_PROMPT_TEMPLATE, PartialFeedbackError,
+    build_feedback_prompt, extract_scores, request_domain_feedback, request_feedback,
+)
+from feedback_cache import feedback_cache_key
+from openai_client import create_client
+from reaper import ResourceReaper
+from score_store import ScoreStore
+from transcript import format_entry
+
+DEFAULT_WORKERS = 16  # encounters graded at once
+CLEANUP_TIMEOUT = 60  # seconds to wait for leftover feedback threads to be deleted at the end
+
+# Encounter outcomes
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"  # not gradable (unknown case, too few questions)
+
+
+def read_encounters(path):
+    """
+    Read saved encounters from a JSONL file, a directory of JSON/JSONL files or a session store.
+
+    Args:
+        path (str): The input
+
+    Returns:
+        list: (source, encounter dict) tuples in input order
+    """
+    if os.path.isdir(path):
+        encounters = []
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if name.endswith(".jsonl"):
+                encounters.extend(read_encounters(file_path))
+            elif name.endswith(".json"):
+                with open(file_path, encoding="utf-8") as f:
+                    encounter = json.load(f)
+                encounter.setdefault("id", os.path.splitext(name)[0])
+                encounters.append((file_path, encounter))
+        return encounters
+
+    if path.endswith((".sqlite3", ".sqlite", ".db")):
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as db:
+            rows = db.execute("SELECT session_id, state FROM sessions ORDER BY updated_at").fetchall()
+        encounters = []
+        for session_id, state in rows:
+            encounter = json.loads(state)
+            # A session's latest encounter (one per case it switched to) is the one stored
+            encounter.update(id=encounter.get("encounter_id") or session_id, session_id=session_id)
+            encounters.append((f"{path}:{session_id}", encounter))
+        return encounters
+
+    encounters = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                encounters.append((f"{path}:{line_number}", json.loads(line)))
+    return encounters
+
+
+def transcript_entries(encounter):
+    """(role, content) turns of an encounter, whichever way they were saved."""
+    transcript = encounter.get("transcript")
+    if isinstance(transcript, list):
+        return [tuple(entry) for entry in transcript]
+    if transcript is None:
+        return [(msg["role"], msg["content"]) for msg in encounter.get("messages", [])]
+    return None  # already formatted text
+
+
+def prepare(encounter, cases, mode, min_questions):
+    """
+    Resolve an encounter's case and rater and render its transcript.
+
+    Returns:
+        dict: The grading job (id, case, patient_name, assistant_id, transcript),
+            or a result with status SKIPPED and the reason
+    """
+    case_key = encounter.get("case") or encounter.get("selected_actor")
+    case = cases.get(case_key)
+    entries = transcript_entries(encounter)
+    if entries is None:
+        transcript = encounter["transcript"]
+        questions = transcript.count("STUDENT:")
+    else:
+        transcript = "".join(format_entry(role, content) for role, content in entries)
+        questions = sum(1 for role, _ in entries if role == "user")
+
+    prompt_template = DOMAIN_PROMPT_TEMPLATE if mode == "per_domain" else FEEDBACK_PROMPT_TEMPLATE
+    job = {
+        "id": encounter.get("id"),
+        "session_id": encounter.get("session_id"),
+        "case": case_key,
+        "patient_name": case.patient_name if case else None,
+        "specialty": case.specialty if case else None,
+        "assistant_id": case.feedback_assistant_id if case else None,
+        "transcript": transcript,
+    }
+    if job["id"] is None:
+        job["id"] = feedback_cache_key(job["assistant_id"] or "", prompt_template, transcript, case_key or "")[:16]
+    if case is None:
+        return dict(job, status=SKIPPED, error=f"unknown case {case_key!r}")
+    if questions < min_questions:
+        return dict(job, status=SKIPPED, error=f"only {questions} student questions")
+    return job
+
+
+def grade(job, client, mode, run_limiter, reaper, score_store=None):
+    """Grade one encounter (on a worker thread), record its scores and return its result record."""
+    started = time.perf_counter()
+    try:
+        if mode == "per_domain":
+            feedback = request_domain_feedback(
+                client, job["assistant_id"], job["patient_name"], job["transcript"],
+                timeout=FEEDBACK_TIMEOUT, schedule=FEEDBACK_POLL_SCHEDULE,
+                run_limiter=run_limiter, reaper=reaper,
+            )
+        else:
+            feedback = request_feedback(
+                client, job["assistant_id"], build_feedback_prompt(job["patient_name"], job["transcript"]),
+                timeout=FEEDBACK_TIMEOUT, schedule=FEEDBACK_POLL_SCHEDULE,
+                run_limiter=run_limiter, reaper=reaper,
+            )
+        feedback, scores = extract_scores(feedback)
+        status, error = OK, None
+    except PartialFeedbackError as e:
+        # Kept for reading, but not scored: a resumed run grades the encounter again
+        feedback, scores, status, error = extract_scores(e.report)[0], {}, FAILED, str(e)
+    except Exception as e:
+        feedback, scores, status, error = None, {}, FAILED, str(e)
+    if score_store is not None and scores:
+        score_store.record(scores, job["session_id"] or job["id"], job["case"], job["specialty"],
+                           job["patient_name"], source="batch", mode=mode, encounter_id=job["id"])
+    return {
+        "id": job["id"],
+        "case": job["case"],
+        "patient_name": job["patient_name"],
+        "status": status,
+        "feedback": feedback,
+        "scores": {str(domain): score for domain, score in sorted(scores.items())},
+        "error": error,
+        "seconds": round(time.perf_counter() - started, 3),
+        "graded_at": time.time(),
+    }
+
+
+def finished_ids(output_path):
+    """IDs of the encounters the output file already holds a successful grade for."""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interruption
+            if result.get("status") == OK:
+                done.add(result["id"])
+    return done
+
+
+def end_partial_line(output_path):
+    """Terminate a last line cut short by an interruption, so appended results start on their own line."""
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return
+    with open(output_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def summarize(results, resumed, wall_seconds, workers):
+    """Counts, throughput and per-encounter latency of a grading run."""
+    graded = [result for result in results if result["status"] in (OK, FAILED)]
+    seconds = np.array([result["seconds"] for result in graded]) if graded else None
+    ok = sum(1 for result in graded if result["status"] == OK)
+    return {
+        "graded": ok,
+        "failed": len(graded) - ok,
+        "skipped": sum(1 for result in results if result["status"] == SKIPPED),
+        "already_done": resumed,
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 2),
+        "encounters_per_minute": round(len(graded) / wall_seconds * 60, 2) if wall_seconds else None,
+        "p50": round(float(np.percentile(seconds, 50)), 2) if graded else None,
+        "p95": round(float(np.percentile(seconds, 95)), 2) if graded else None,
+        "sample_errors": sorted({result["error"] for result in results if result["error"]})[:5],
+    }
+
+
+def print_summary(summary):
+    print(f"\nGraded {summary['graded']}, failed {summary['failed']}, skipped {summary['skipped']}, "
+          f"already done {summary['already_done']}")
+    print(f"{summary['wall_seconds']}s wall time with {summary['workers']} workers: "
+          f"{summary['encounters_per_minute']} encounters/minute")
+    if summary["p50"] is not None:
+        print(f"Per encounter: p50 {summary['p50']}s, p95 {summary['p95']}s")
+    for error in summary["sample_errors"]:
+        print(f"    ! {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a cohort's saved encounters with their case's rater.")
+    parser.add_argument("input", help="JSONL file, directory of JSON/JSONL files, or SQLite session store")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to (and resumed from)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="encounters graded concurrently")
+    parser.add_argument("--mode", choices=("single", "per_domain"), default="single",
+                        help="one run for all five domains, or one concurrent run per domain")
+    parser.add_argument("--min-questions", type=int, default=MIN_MESSAGES_FOR_FEEDBACK,
+                        help="skip encounters with fewer student questions")
+    parser.add_argument("--cases", default=CASES_DIR, help="case definition directory")
+    parser.add_argument("--score-store", default=SCORE_STORE_DIR,
+                        help="also append per-domain scores to this score store directory")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    parser.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL"))
+    parser.add_argument("--requests-per-minute", type=int, default=API_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tokens-per-minute", type=int, default=API_TOKENS_PER_MINUTE)
+    parser.add_argument("--fake", action="store_true", help="grade against an in-process fake API")
+    parser.add_argument("--json", help="write the throughput summary to this file")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_openai import FakeConfig, start_in_background
+        _, args.base_url = start_in_background(FakeConfig())
+        args.api_key = "sk-fake"
+    if not args.api_key:
+        parser.error("no API key: set OPENAI_API_KEY or pass --api-key")
+
+    cases = CaseRegistry(args.cases)
+    done = finished_ids(args.output)
+    jobs, results = [], []
+    encounters = read_encounters(args.input)
+    if not encounters:
+        print(f"No encounters found in {args.input}", file=sys.stderr)
+        if args.input.endswith((".sqlite3", ".sqlite", ".db")):
+            print(f"(the session store keeps encounters for {SESSION_STORE_RETENTION // 86400} days "
+                  "after their last activity)", file=sys.stderr)
+    for source, encounter in encounters:
+        job = prepare(encounter, cases, args.mode, args.min_questions)
+        if job["id"] in done:
+            continue
+        if job.get("status") == SKIPPED:
+            print(f"Skipping {source}: {job['error']}", file=sys.stderr)
+            results.append(job)
+        else:
+            jobs.append(job)
+    resumed = len(done)
+    print(f"{len(jobs)} encounters to grade ({resumed} already done, {len(results)} skipped)")
+
+    # Runs per encounter times workers, so the run cap never leaves a worker idle
+    runs_per_job = FEEDBACK_DOMAIN_COUNT if args.mode == "per_domain" else 1
+    scheduler = ApiScheduler(
+        requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute,
+        background_share=1.0, max_background_runs=args.workers * runs_per_job, max_attempts=API_MAX_ATTEMPTS,
+    )
+    client = create_client(api_key=args.api_key, base_url=args.base_url, max_connections=args.workers * 2 * runs_per_job,
+                           scheduler=scheduler, priority=BACKGROUND)
+    reaper = ResourceReaper(client)
+    score_store = ScoreStore(args.score_store) if args.score_store else None
+
+    started = time.perf_counter()
+    end_partial_line(args.output)
+    with open(args.output, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="grade") as executor:
+        futures = [executor.submit(grade, job, client, args.mode, scheduler.background_runs, reaper, score_store)
+                   for job in jobs]
+        try:
+            for number, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                # One line per finished encounter, flushed at once: the checkpoint for a resume
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                print(f"[{number}/{len(jobs)}] {result['id']} {result['status']} ({result['seconds']}s)")
+        except KeyboardInterrupt:
+            print("Interrupted; rerun with the same --output to resume.", file=sys.stderr)
+            for future in futures:
+                future.cancel()
+            raise
+    wall_seconds = time.perf_counter() - started
+    reaper.drain(CLEANUP_TIMEOUT)
+    if score_store is not None:
+        score_store.flush()
+
+    summary = summarize(results, resumed, wall_seconds, args.workers)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# load_test.py
+"""
+Headless load driver: replays scripted encounters against app.py at N concurrent users.
+
+Each simulated student gets its own Streamlit session (streamlit.testing AppTest),
+so the real app code runs end to end. AppTest keeps process-global state (the
+runtime singleton, st.secrets), so every simulated student runs in its own worker
+process; process-wide resources (client pool, caches, job queues) are therefore
+per student here, while the API side sees the full concurrent load. By default a
+fake API (fake_openai.py) is started in the driver process, so no network access
+or API key is needed.
+
+Usage:
+    python load_test.py --users 20 --turns 8
+    python load_test.py --users 60 --script encounters.json --rate-limit-rate 0.05 --json results.json
+    python load_test.py --base-url http://127.0.0.1:8765/v1   # fake server started separately
+
+A script file is a JSON list of encounters: [{"actor": "Mr. Aiken (Geriatrics 15)", "turns": ["...", ...]}]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from fake_openai import FakeConfig, start_in_background
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+DEFAULT_TURNS = [
+    "Hello, I'm a medical student. What brings you in today?",
+    "When did this start?",
+    "Can you describe what it feels like?",
+    "Does anything make it better or worse?",
+    "Have you had anything like this before?",
+    "What medications are you taking?",
+    "Do you smoke or drink alcohol?",
+    "Does anyone in your family have similar problems?",
+    "Is there anything else you are worried about?",
+    "Thank you, that's all my questions for now.",
+]
+
+
+def default_script(turns):
+    """One generic encounter with the given number of turns."""
+    return [{"actor": None, "turns": (DEFAULT_TURNS * (turns // len(DEFAULT_TURNS) + 1))[:turns]}]
+
+
+def run_user(user_number, encounter, base_url, timeout, feedback):
+    """
+    Drive one simulated student through an encounter (in a worker process).
+
+    Returns:
+        list: One record per page load, turn and feedback request
+    """
+    results = []
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.secrets["OPENAI_API_KEY"] = "sk-load-test"
+    at.secrets["OPENAI_BASE_URL"] = base_url
+
+    def record(kind, started, ok, error=None):
+        results.append({
+            "user": user_number,
+            "kind": kind,
+            "seconds": time.perf_counter() - started,
+            "ok": ok,
+            "error": error,
+        })
+
+    started = time.perf_counter()
+    try:
+        at.run()
+        if encounter.get("actor"):
+            at.selectbox(key="actor_selector").set_value(encounter["actor"]).run()
+        record("page_load", started, not at.exception)
+    except Exception as e:
+        record("page_load", started, False, str(e))
+        return results
+
+    for prompt in encounter["turns"]:
+        started = time.perf_counter()
+        try:
+            at.chat_input[0].set_value(prompt).run()
+        except Exception as e:
+            record("turn", started, False, str(e))
+            continue
+        errors = [element.value for element in at.error]
+        last_is_reply = bool(at.chat_message) and at.chat_message[-1].name == "assistant"
+        ok = not at.exception and not errors and last_is_reply
+        record("turn", started, ok, "; ".join(errors) or (None if ok else "no patient reply"))
+
+    if feedback:
+        buttons = [button for button in at.button if button.label == "Generate Feedback!"]
+        if not buttons:
+            return results
+        started = time.perf_counter()
+        buttons[0].click().run()
+        # Feedback runs in the background; poll the page like a waiting student would
+        while time.perf_counter() - started < timeout:
+            if any("Comprehensive Feedback" in header.value for header in at.subheader):
+                record("feedback", started, True)
+                return results
+            if at.error:
+                record("feedback", started, False, at.error[0].value)
+                return results
+            time.sleep(1)
+            at.run()
+        record("feedback", started, False, "timed out")
+    return results
+
+
+def summarize(results, api_stats, wall_seconds):
+    """Latency percentiles, error rates and API calls per turn for each kind of interaction."""
+    summary = {"wall_seconds": round(wall_seconds, 2), "kinds": {}}
+    for kind in ("page_load", "turn", "feedback"):
+        rows = [row for row in results if row["kind"] == kind]
+        if not rows:
+            continue
+        seconds = np.array([row["seconds"] for row in rows])
+        failures = [row for row in rows if not row["ok"]]
+        summary["kinds"][kind] = {
+            "count": len(rows),
+            "p50": round(float(np.percentile(seconds, 50)), 3),
+            "p95": round(float(np.percentile(seconds, 95)), 3),
+            "p99": round(float(np.percentile(seconds, 99)), 3),
+            "max": round(float(seconds.max()), 3),
+            "error_rate": round(len(failures) / len(rows), 4),
+            "sample_errors": sorted({row["error"] for row in failures if row["error"]})[:5],
+        }
+
+    if api_stats is not None:
+        turns = summary["kinds"].get("turn", {}).get("count", 0)
+        summary["api"] = api_stats
+        if turns:
+            summary["api_calls_per_turn"] = round(api_stats["total_requests"] / turns, 2)
+    return summary
+
+
+def print_summary(summary, users):
+    print(f"\n{users} concurrent users, {summary['wall_seconds']}s wall time")
+    print(f"{'kind':<10} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'errors':>8}")
+    for kind, row in summary["kinds"].items():
+        print(f"{kind:<10} {row['count']:>6} {row['p50']:>8} {row['p95']:>8} {row['p99']:>8} "
+              f"{row['max']:>8} {row['error_rate']:>8.2%}")
+        for error in row["sample_errors"]:
+            print(f"    ! {error}")
+    if "api_calls_per_turn" in summary:
+        print(f"API calls per turn: {summary['api_calls_per_turn']} (all traffic, incl. thread pre-warming)")
+        print(f"API requests by endpoint: {summary['api']['requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted encounters against app.py at N concurrent users.")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated students")
+    parser.add_argument("--turns", type=int, default=8, help="turns per encounter when no script is given")
+    parser.add_argument("--script", help="JSON file with encounters; users cycle through them")
+    parser.add_argument("--feedback", action="store_true", help="also request feedback at the end of each encounter")
+    parser.add_argument("--timeout", type=float, default=300, help="per-interaction timeout in seconds")
+    parser.add_argument("--base-url", help="use an already running (fake) API instead of starting one")
+    parser.add_argument("--json", help="write the summary to this file")
+    # Latency and failure model of the in-process fake API
+    parser.add_argument("--request-latency", type=float, default=FakeConfig.request_latency)
+    parser.add_argument("--generation-seconds", type=float, default=FakeConfig.generation_seconds)
+    parser.add_argument("--failure-rate", type=float, default=FakeConfig.failure_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=FakeConfig.rate_limit_rate)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            encounters = json.load(f)
+    else:
+        encounters = default_script(args.turns)
+
+    base_url = args.base_url
+    if base_url is None:
+        _, base_url = start_in_background(FakeConfig(
+            request_latency=args.request_latency,
+            generation_seconds=args.generation_seconds,
+            failure_rate=args.failure_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            seed=args.seed,
+        ))
+    stats_url = base_url.rsplit("/v1", 1)[0] + "/__stats"
+    try:
+        httpx.post(stats_url + "/reset")
+    except httpx.HTTPError:
+        stats_url = None  # not a fake server: no API call accounting
+
+    results = []
+    started = time.perf_counter()
+    # "spawn" so workers do not inherit the fake server's threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.users, mp_context=context) as executor:
+        futures = [
+            executor.submit(run_user, user_number, encounters[user_number % len(encounters)],
+                            base_url, args.timeout, args.feedback)
+            for user_number in range(args.users)
+        ]
+        for future in futures:
+            results.extend(future.result())
+    wall_seconds = time.perf_counter() - started
+
+    api_stats = httpx.get(stats_url).json() if stats_url else None
+    summary = summarize(results, api_stats, wall_seconds)
+    print_summary(summary, args.users)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
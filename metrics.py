@@ -0,0 +1,234 @@
+# metrics.py
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Histogram buckets (seconds) for span durations: API calls range from ~50 ms to minutes
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+POLL_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation. Attributes (poll counts, run status, ...) can be added while it runs."""
+
+    def __init__(self, name, session_id=None, parent=None, **attrs):
+        self.name = name
+        self.session_id = session_id if session_id is not None else getattr(parent, "session_id", None)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        """Add or update attributes."""
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "session_id": self.session_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """
+    In-process metrics: counters, histograms and recent spans.
+
+    Finished spans feed the vpe_span_seconds histogram, are kept in a ring buffer
+    (for the per-session debug panel) and, if a trace file is configured, are
+    appended to it as JSON lines. prometheus_text() renders everything in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self, trace_path=None, recent_spans=5000):
+        """
+        Args:
+            trace_path (str): JSONL file finished spans are appended to, or None
+            recent_spans (int): Number of finished spans kept in memory
+        """
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._gauges = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> _Histogram
+        self._help = {}
+        self._spans = deque(maxlen=recent_spans)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, help=None, **labels):
+        """Increase a counter."""
+        with self._lock:
+            if help:
+                self._help[name] = help
+            self._counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name, value, help=None, **labels):
+        """Set a gauge to its current value."""
+        with self._lock:
+            if help:
+                self._help[name] = help
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, help=None, **labels):
+        """Record a value in a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            if help:
+                self._help[name] = help
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, session_id=None, **attrs):
+        """
+        Time a block of code.
+
+        Spans opened inside another span (same thread or context) become its children
+        and inherit its session ID. An exception marks the span as "error".
+
+        Yields:
+            Span: The running span, for adding attributes such as poll counts
+        """
+        span = Span(name, session_id=session_id, parent=_current_span.get(), **attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            # Streamlit's st.rerun()/st.stop() raise too; those are not errors
+            if isinstance(e, Exception):
+                span.status = "error"
+                span.set(error=str(e)[:200])
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span._start
+            self._finish(span)
+
+    def current_span(self):
+        """The innermost running span in this context, or None."""
+        return _current_span.get()
+
+    def _finish(self, span):
+        self.observe("vpe_span_seconds", span.duration, help="Duration of instrumented operations",
+                     span=span.name, status=span.attrs.get("run_status", span.status))
+        if "polls" in span.attrs:
+            self.observe("vpe_run_polls", span.attrs["polls"], buckets=POLL_BUCKETS,
+                         help="Status polls needed per run", span=span.name)
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._spans.append(span)
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def session_spans(self, session_id, limit=200):
+        """
+        Recent finished spans of one session, oldest first.
+
+        Returns:
+            list: Span objects
+        """
+        with self._lock:
+            spans = [span for span in self._spans if span.session_id == session_id]
+        return spans[-limit:]
+
+    def prometheus_text(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text
+        """
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            families = defaultdict(list)
+            for (name, labels), value in self._counters.items():
+                families[(name, "counter")].append((labels, value))
+            for (name, labels), value in self._gauges.items():
+                families[(name, "gauge")].append((labels, value))
+            for (name, labels), histogram in self._histograms.items():
+                families[(name, "histogram")].append((labels, histogram))
+
+            for (name, kind), samples in sorted(families.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if kind != "histogram":
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', str(bound))])} {count}")
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {value.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path):
+        """Write the exposition text atomically (e.g. for node_exporter's textfile collector)."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def start_prometheus_file_writer(self, path, interval=15):
+        """Rewrite the Prometheus file every `interval` seconds on a daemon thread."""
+        def write_loop():
+            while True:
+                try:
+                    self.write_prometheus_file(path)
+                except OSError:
+                    pass  # try again next interval
+                time.sleep(interval)
+
+        threading.Thread(target=write_loop, name="metrics-writer", daemon=True).start()
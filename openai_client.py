@@ -0,0 +1,65 @@
+# openai_client.py
+
+import httpx
+import openai
+
+from api_scheduler import ScheduledTransport
+
+# Connection pool shared by every session in the process
+POOL_MAX_CONNECTIONS = 100  # concurrent sockets to the API
+POOL_MAX_KEEPALIVE = 40  # idle sockets kept open for reuse (avoids repeated TLS handshakes)
+POOL_KEEPALIVE_EXPIRY = 60  # seconds an idle socket is kept alive
+
+# Default timeouts for a single HTTP call (seconds); individual calls can override them
+CONNECT_TIMEOUT = 5
+REQUEST_TIMEOUT = 60
+
+# Retries done by the client itself on connection errors, 408/409/429 and 5xx
+# (clients with a scheduler leave retries to the scheduler instead)
+MAX_RETRIES = 2
+
+
+def create_client(api_key, base_url=None, max_connections=POOL_MAX_CONNECTIONS,
+                  max_keepalive=POOL_MAX_KEEPALIVE, keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+                  connect_timeout=CONNECT_TIMEOUT, request_timeout=REQUEST_TIMEOUT,
+                  max_retries=MAX_RETRIES, scheduler=None, priority=None):
+    """
+    Create an OpenAI client with a tuned keep-alive connection pool.
+
+    The client is thread-safe and meant to be created once per process and shared
+    by all sessions (see get_openai_client in app.py).
+
+    Args:
+        api_key (str): The OpenAI API key
+        base_url (str): Alternative API base URL, or None for the default
+        max_connections (int): Maximum number of concurrent connections
+        max_keepalive (int): Maximum number of idle keep-alive connections
+        keepalive_expiry (float): Seconds an idle connection is kept open
+        connect_timeout (float): Timeout for establishing a connection
+        request_timeout (float): Default timeout for a whole request
+        max_retries (int): Number of automatic retries for failed requests
+        scheduler (ApiScheduler): Process-wide scheduler all requests go through, or None
+        priority (int): Priority of this client's requests in the scheduler (INTERACTIVE or BACKGROUND)
+
+    Returns:
+        openai.OpenAI: The configured client
+    """
+    timeout = httpx.Timeout(request_timeout, connect=connect_timeout)
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    if scheduler is None:
+        http_client = openai.DefaultHttpxClient(limits=limits, timeout=timeout)
+    else:
+        transport = ScheduledTransport(httpx.HTTPTransport(limits=limits), scheduler, priority)
+        http_client = openai.DefaultHttpxClient(transport=transport, timeout=timeout)
+        max_retries = 0
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=http_client,
+    )
@@ -0,0 +1,128 @@
+# pages/1_Cohort_Analytics.py
+
+import streamlit as st
+import pandas as pd
+
+from app import SCORE_STORE_DIR
+from score_store import DOMAIN_COLUMNS, read_scores
+
+# Configuration
+ANALYTICS_REFRESH_SECONDS = 60  # how long loaded scores are reused before the store is read again
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+TREND_FREQUENCY = "W"  # pandas offset alias for trend buckets (weekly)
+
+@st.cache_data(ttl=ANALYTICS_REFRESH_SECONDS, show_spinner="Loading scores...")
+def load_scores(directory):
+    """All graded encounters, latest grade per encounter, with an overall score column."""
+    scores = read_scores(directory)
+    # Feedback requested again for the same encounter replaces the earlier grade; a student
+    # who returns to a case in the same session starts a new encounter with its own ID
+    scores = scores.drop_duplicates("encounter_id", keep="last")
+    scores["overall"] = scores[list(DOMAIN_COLUMNS)].mean(axis=1)
+    return scores.reset_index(drop=True)
+
+def percentile_table(scores, by, column):
+    """Count, mean and percentiles of one score column per group, in one vectorized groupby."""
+    grouped = scores.groupby(by, observed=True)[column]
+    table = grouped.agg(["count", "mean", "std"])
+    quantiles = grouped.quantile(list(PERCENTILES)).unstack()
+    quantiles.columns = [f"p{round(q * 100)}" for q in quantiles.columns]
+    return table.join(quantiles).round(2)
+
+def filter_scores(scores):
+    """Sidebar filters, applied as one boolean mask."""
+    st.sidebar.header("Filters")
+    specialties = st.sidebar.multiselect("Specialty", sorted(scores["specialty"].cat.categories))
+    cases = st.sidebar.multiselect("Case", sorted(scores["case"].cat.categories))
+    sources = st.sidebar.multiselect("Source", sorted(scores["source"].cat.categories),
+                                     help="app: students' own feedback requests, batch: grade_cohort.py")
+    first, last = scores["recorded_at"].min().date(), scores["recorded_at"].max().date()
+    dates = st.sidebar.date_input("Graded between", (first, last), min_value=first, max_value=last)
+    
+    mask = pd.Series(True, index=scores.index)
+    if specialties:
+        mask &= scores["specialty"].isin(specialties)
+    if cases:
+        mask &= scores["case"].isin(cases)
+    if sources:
+        mask &= scores["source"].isin(sources)
+    if len(dates) == 2:
+        day = scores["recorded_at"].dt.normalize()
+        mask &= (day >= pd.Timestamp(dates[0])) & (day <= pd.Timestamp(dates[1]))
+    return scores[mask]
+
+def check_instructor_access():
+    """Stop unless the instructor password from the secrets has been entered."""
+    try:
+        password = st.secrets.get("INSTRUCTOR_PASSWORD")
+    except FileNotFoundError:
+        password = None  # no secrets file at all
+    if not password:
+        st.info("Cohort analytics is disabled. Set INSTRUCTOR_PASSWORD in the app secrets to enable it.")
+        st.stop()
+    if st.session_state.get("instructor_authenticated"):
+        return
+    entered = st.text_input("Instructor password", type="password")
+    if entered != password:
+        if entered:
+            st.error("Incorrect password.")
+        st.stop()
+    st.session_state.instructor_authenticated = True
+
+def main():
+    st.title("📊 Cohort Analytics")
+    check_instructor_access()
+    
+    if not SCORE_STORE_DIR:
+        st.info("Feedback scores are not being kept. Set SCORE_STORE_DIR in app.py to collect them.")
+        st.stop()
+    
+    scores = load_scores(SCORE_STORE_DIR)
+    if scores.empty:
+        st.info("No graded encounters yet.")
+        st.stop()
+    
+    selected = filter_scores(scores)
+    if selected.empty:
+        st.warning("No graded encounters match the filters.")
+        st.stop()
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Graded encounters", f"{len(selected):,}")
+    col2.metric("Students", f"{selected['session_id'].nunique():,}")
+    col3.metric("Mean overall score", f"{selected['overall'].mean():.2f} / 5")
+    
+    # Long format (one row per encounter and domain) for the per-domain views
+    domains = selected.melt(
+        id_vars=["case", "recorded_at"], value_vars=list(DOMAIN_COLUMNS), var_name="domain", value_name="score",
+    ).dropna(subset=["score"])
+    domains["domain"] = domains["domain"].str.replace("domain_", "Domain ", regex=False)
+    
+    st.subheader("Per-domain distribution")
+    st.dataframe(percentile_table(domains, "domain", "score"))
+    counts = (
+        domains.assign(score=domains["score"].round().astype(int))
+        .groupby(["score", "domain"]).size().unstack(fill_value=0)
+    )
+    st.bar_chart(counts, x_label="Score", y_label="Encounters")
+    
+    st.subheader("Per-case scores")
+    st.caption("Overall score (mean of the scored domains) per case")
+    st.dataframe(percentile_table(selected, "case", "overall"))
+    st.caption("Mean score per case and domain")
+    by_case = selected.groupby("case", observed=True)[list(DOMAIN_COLUMNS)].mean().round(2)
+    by_case.columns = [f"Domain {number}" for number in range(1, len(DOMAIN_COLUMNS) + 1)]
+    st.dataframe(by_case)
+    
+    st.subheader("Trend")
+    trend = (
+        selected.groupby(pd.Grouper(key="recorded_at", freq=TREND_FREQUENCY))[list(DOMAIN_COLUMNS) + ["overall"]]
+        .mean().dropna(how="all")
+    )
+    trend.columns = [f"Domain {number}" for number in range(1, len(DOMAIN_COLUMNS) + 1)] + ["Overall"]
+    st.line_chart(trend, x_label="Week", y_label="Mean score")
+    
+    st.download_button("Download filtered scores (CSV)", selected.to_csv(index=False),
+                       file_name="cohort_scores.csv", mime="text/csv")
+
+main()
@@ -1,87 +0,0 @@
-# patient_prompts.py
-
-PATIENT_PROMPTS = {
-    "Mr. Aiken": """You are about to begin an interview with Mr. Aiken, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mr. Aiken. If he appears to get stuck, simply ask another question.
-
-Your resident instructs you to conduct a history of present illness, review of appropriate systems, and social history. As you and your resident arrive in the ED, you find Mr. Aiken awake in his ED bed. His smile at your arrival becomes a brief grimace. He massages his abdomen. His son, Ben, is at his bedside.""",
-
-    "Mrs. Kelly": """You are about to begin an interview with Mrs. Kelly, the AI-powered mother of 10-month-old Anna. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mrs. Kelly. If she appears to get stuck, simply ask another question.
-
-Your preceptor instructs you to conduct a history of present illness, review of appropriate systems, family history, and social history. Having determined that Anna's condition does not require urgent intervention, you begin asking her mother questions.""",
-
-    "Albert Smitherman": """You are about to begin an interview with Mr. Smitherman, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mr. Smitherman. If he appears to get stuck, simply ask another question.
-
-Your preceptor instructs you to conduct a focused history of present illness, relevant review of systems, and appropriate social history for this follow-up visit. You enter the clinic exam room where Mr. Smitherman, an active and independent 87-year-old, is seated on the examination table. He greets you with a warm smile but shifts uncomfortably.""",
-
-    "Jessica Morales": """You are about to begin an interview with Ms. Jessica Morales, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Morales. If she appears to get stuck, simply ask another question.
-
-Dr. Gray instructs you to gather a thorough history for this 2-week-old newborn visit, focusing on pregnancy history, birth history, feeding, and any parental concerns. You enter the exam room where Ms. Morales is seated, gently holding 2-week-old Olivia.""",
-
-    "Amanda Waters": """You are about to begin an interview with Ms. Amanda Waters, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Waters. If she appears to get stuck, simply ask another question.
-
-Dr. Hill instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of palpitations. You and Dr. Hill enter the exam room where Ms. Waters, a 30-year-old female, is seated on the examination table. Her partner, Mary Jo Menutti, is seated nearby.""",
-
-    "Barbara Turner": """You are about to begin an interview with Mrs. Barbara Turner, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mrs. Turner. If she appears to get stuck, simply ask another question.
-
-Your senior resident, Dr. Okupa, asks you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of abdominal pain and vomiting. You enter the ED room where Mrs. Turner, a 55-year-old female, is lying on the stretcher, visibly uncomfortable and holding her abdomen.""",
-
-    "Anna Pine": """You are about to begin an interview with Ms. Anna Pine, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Pine. If she appears to get stuck, simply ask another question.
-
-Dr. Long instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of headaches. You enter the exam room where Ms. Pine, a 24-year-old college student, is seated and ready to discuss her concerns.""",
-
-    "Lori Johnson": """You are about to begin an interview with Ms. Lori Johnson, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Johnson. If she appears to get stuck, simply ask another question.
-
-Dr. Small instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of heavy, irregular menses. You enter the exam room where Ms. Johnson, a 42-year-old G2P2 with LMP two weeks ago, is seated and ready to discuss her concerns.""",
-
-    "Dolores Russell": """You are about to begin an interview with Ms. Dolores Russell, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Russell. If she appears to get stuck, simply ask another question.
-
-Ms. Walker instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of pelvic pain. You enter the exam room where Ms. Russell, a 31-year-old new patient, is seated and ready to discuss her concerns.""",
-
-    "Allison Killpatrick": """You are about to begin an interview with Ms. Allison Killpatrick, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Killpatrick. If she appears to get stuck, simply ask another question.
-
-Dr. Williams instructs you to conduct a thorough psychiatric intake interview focusing on her presenting concerns of anxiety and relationship difficulties. You enter the room where Ms. Killpatrick, a 29-year-old seeking help for the first time, sits with her partner, Louisa, looking visibly nervous about this initial psychiatry appointment.""",
-
-    "Erica Patterson": """You are about to begin an interview with Ms. Erica Patterson, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Patterson. If she appears to get stuck, simply ask another question.
-
-Dr. Jennings instructs you to conduct a comprehensive pain assessment for this palliative medicine consultation. You enter the exam room where Ms. Patterson, a 35-year-old with a recent diagnosis of metastatic breast cancer to T6, is seated. She was referred for persistent back pain management.""",
-
-    "Mrs. Miller": """You are about to begin using the teach-back method with Mrs. Miller, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: deploy the teach-back technique. You must have at least five interactions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've finished.
-
-Some responses may take longer than others, so please be patient with Ms. Patterson. If she appears to get stuck, simply ask another question.
-
-You begin doing a pre-discharge teach-back of Mrs. Miller discharge plans. You enter the room where Mrs. Miller, an 80-year-old preparing for discharge awaits with her daughter."""
-}
-
-def get_patient_prompt(patient_name):
-    """
-    Get the intro prompt for a specific patient.
-    
-    Args:
-        patient_name (str): The name of the patient
-        
-    Returns:
-        str: The patient's intro prompt, or None if not found
-    """
-    return PATIENT_PROMPTS.get(patient_name)
\ No newline at end of file
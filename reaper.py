@@ -0,0 +1,259 @@
+# reaper.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from run_waiter import TERMINAL_STATUSES
+
+REAP_INTERVAL = 30  # seconds between background sweeps
+DELETE_BATCH_SIZE = 20  # threads deleted per sweep
+DELETE_CONCURRENCY = 4  # parallel delete calls within a sweep
+SESSION_IDLE_TIMEOUT = 3 * 3600  # seconds without a rerun after which a session counts as ended
+IDLE_POLL_DELAY = 0.25  # seconds between status checks while waiting for a cancelled run
+
+# Terminal statuses after which the thread accepts new runs ("requires_action" still blocks it)
+ENDED_STATUSES = tuple(status for status in TERMINAL_STATUSES if status != "requires_action")
+
+
+class ResourceReaper:
+    """
+    Tracks in-flight runs and the threads sessions use, and cleans up what nobody waits for any more.
+
+    Runs are registered when they start and released when they reach a terminal
+    status. Runs that are abandoned (timeouts, interrupted streams, conversation
+    switches) are cancelled, and threads of ended conversations and sessions are
+    deleted in batches by a background sweep, so orphaned generations stop
+    consuming tokens and concurrency.
+    """
+
+    def __init__(self, client, interval=REAP_INTERVAL, idle_timeout=SESSION_IDLE_TIMEOUT,
+                 batch_size=DELETE_BATCH_SIZE, metrics=None, session_store=None):
+        """
+        Args:
+            client (openai.OpenAI): Client used for cleanup calls (a background-priority client)
+            interval (float): Seconds between sweeps
+            idle_timeout (float): Seconds after a session's last activity before its thread is deleted
+            batch_size (int): Maximum number of threads deleted per sweep
+            metrics (MetricsRegistry): Registry for cancel/delete counters, or None
+            session_store (SessionStore): Shared store whose last-activity times decide when a
+                session has ended, or None to go by this process's own touch() calls
+        """
+        self.client = client
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.session_store = session_store
+        self._lock = threading.Lock()
+        self._active_runs = {}  # thread_id -> set of run IDs
+        self._to_cancel = set()  # (thread_id, run_id)
+        self._to_delete = []  # thread IDs, oldest first
+        self._sessions = {}  # session_id -> (thread_id, last seen)
+        self._wakeup = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY, thread_name_prefix="reaper")
+        self._worker = threading.Thread(target=self._reap_loop, args=(interval,), name="reaper", daemon=True)
+        self._worker.start()
+
+    def run_started(self, thread_id, run_id):
+        """Register a run that was just created."""
+        with self._lock:
+            self._active_runs.setdefault(thread_id, set()).add(run_id)
+
+    def run_finished(self, thread_id, run_id):
+        """Release a run that reached a terminal status."""
+        with self._lock:
+            runs = self._active_runs.get(thread_id)
+            if runs is not None:
+                runs.discard(run_id)
+                if not runs:
+                    del self._active_runs[thread_id]
+            self._to_cancel.discard((thread_id, run_id))
+
+    def release_run(self, thread_id, run_id, status):
+        """Release a run we stopped waiting for: forget it if it ended, cancel it otherwise."""
+        if status in ENDED_STATUSES:
+            self.run_finished(thread_id, run_id)
+        else:
+            self.cancel_run(thread_id, run_id)
+
+    def active_runs(self, thread_id):
+        """IDs of the runs on a thread that have not been seen to finish."""
+        with self._lock:
+            return set(self._active_runs.get(thread_id, ()))
+
+    def cancel_run(self, thread_id, run_id):
+        """Cancel an abandoned run in the background."""
+        with self._lock:
+            if run_id not in self._active_runs.get(thread_id, ()):
+                return
+            self._to_cancel.add((thread_id, run_id))
+        self._wakeup.set()
+
+    def retire_thread(self, thread_id):
+        """Cancel the thread's runs and delete it in the background (the conversation has ended)."""
+        if thread_id is None:
+            return
+        with self._lock:
+            for run_id in self._active_runs.get(thread_id, ()):
+                self._to_cancel.add((thread_id, run_id))
+            if thread_id not in self._to_delete:
+                self._to_delete.append(thread_id)
+        self._wakeup.set()
+
+    def touch(self, session_id, thread_id):
+        """
+        Record that a session is alive and which thread it is on.
+
+        A session that stops calling this (closed tab, lost connection) has its thread
+        retired after idle_timeout seconds. With a session store, the session's last save
+        there counts instead, so a session that moved to another process is left alone.
+        """
+        with self._lock:
+            self._sessions[session_id] = (thread_id, time.monotonic())
+
+    def wait_until_idle(self, thread_id, timeout, client=None):
+        """
+        Cancel any run still active on a thread and wait until the thread accepts new messages.
+
+        Called before posting a message, so a quick resubmit after an interrupted or
+        timed-out turn does not fail with "thread already has an active run".
+
+        Args:
+            thread_id (str): The conversation thread
+            timeout (float): Maximum seconds to wait
+            client (openai.OpenAI): Client to use (the caller's, if a student is waiting), or None
+
+        Returns:
+            bool: True if no run is active any more
+        """
+        client = client or self.client
+        deadline = time.monotonic() + timeout
+        for run_id in self.active_runs(thread_id):
+            cancel_requested = False
+            while True:
+                try:
+                    run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+                except openai.NotFoundError:
+                    self.run_finished(thread_id, run_id)
+                    break
+                except Exception:
+                    return False
+                if run.status in ENDED_STATUSES:
+                    self.run_finished(thread_id, run_id)
+                    break
+                if not cancel_requested and run.status != "cancelling":
+                    self._cancel(thread_id, run_id, client)
+                    cancel_requested = True
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(IDLE_POLL_DELAY)
+        return True
+
+    def drain(self, timeout):
+        """
+        Sweep until every pending cancel and delete is done (e.g. before a batch job exits).
+
+        Args:
+            timeout (float): Maximum seconds to keep sweeping
+
+        Returns:
+            bool: True if nothing is left to clean up
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self._cancel_pending()
+            self._delete_batch()
+            with self._lock:
+                if not self._to_cancel and not self._to_delete:
+                    return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(IDLE_POLL_DELAY)
+
+    def _cancel(self, thread_id, run_id, client=None):
+        try:
+            (client or self.client).beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        except Exception:
+            # Usually the run finished in the meantime; a sweep checks again if not
+            return False
+        if self.metrics is not None:
+            self.metrics.inc("vpe_runs_cancelled_total", help="Abandoned runs cancelled")
+        return True
+
+    def _cancel_pending(self):
+        with self._lock:
+            pending = list(self._to_cancel)
+            self._to_cancel.clear()
+        for thread_id, run_id in pending:
+            try:
+                run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            except openai.NotFoundError:
+                self.run_finished(thread_id, run_id)
+                continue
+            except Exception:
+                run = None
+            if run is not None and run.status in ENDED_STATUSES:
+                self.run_finished(thread_id, run_id)
+                continue
+            if run is None or run.status != "cancelling":
+                self._cancel(thread_id, run_id)
+            # Released once a later sweep (or wait_until_idle) sees it finished
+            with self._lock:
+                if run_id in self._active_runs.get(thread_id, ()):
+                    self._to_cancel.add((thread_id, run_id))
+
+    def _expire_sessions(self):
+        if self.session_store is None:
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._lock:
+                expired = [session_id for session_id, (_, seen) in self._sessions.items() if seen < cutoff]
+        else:
+            # Any process serving the session saves it to the shared store; its last save there is
+            # the session's last activity (an unknown session has expired or was never saved)
+            cutoff = time.time() - self.idle_timeout
+            with self._lock:
+                tracked = list(self._sessions)
+            expired = []
+            for session_id in tracked:
+                last_active = self.session_store.last_active(session_id)
+                if last_active is None or last_active < cutoff:
+                    expired.append(session_id)
+        with self._lock:
+            threads = [self._sessions.pop(session_id)[0] for session_id in expired if session_id in self._sessions]
+        for thread_id in threads:
+            self.retire_thread(thread_id)
+
+    def _delete_batch(self):
+        with self._lock:
+            # Threads whose runs are still being cancelled wait for a later sweep
+            ready = [thread_id for thread_id in self._to_delete if thread_id not in self._active_runs]
+            batch = ready[:self.batch_size]
+            self._to_delete = [thread_id for thread_id in self._to_delete if thread_id not in batch]
+
+        def delete(thread_id):
+            try:
+                self.client.beta.threads.delete(thread_id)
+                return True
+            except Exception:
+                return False
+
+        deleted = sum(self._executor.map(delete, batch))
+        if self.metrics is not None and deleted:
+            self.metrics.inc("vpe_threads_deleted_total", deleted, help="Threads of ended conversations deleted")
+
+    def _reap_loop(self, interval):
+        while True:
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            try:
+                self._expire_sessions()
+                self._cancel_pending()
+                self._delete_batch()
+            except Exception:
+                pass  # never let one bad sweep stop the reaper
+            if self.metrics is not None:
+                with self._lock:
+                    active = sum(len(runs) for runs in self._active_runs.values())
+                self.metrics.set_gauge("vpe_tracked_active_runs", active, help="Runs started and not yet finished")
@@ -0,0 +1,177 @@
+# run_waiter.py
+
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+
+import openai
+
+# Statuses after which a run will not change any more
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete", "requires_action")
+
+
+@dataclass(frozen=True)
+class PollSchedule:
+    """
+    Adaptive polling schedule: a few fast checks, then exponential backoff with jitter.
+
+    Args:
+        fast_delays (tuple): Delays (seconds) used for the first polls, before backoff starts
+        base_delay (float): First backoff delay once the fast checks are used up
+        backoff (float): Multiplier applied to the delay after every further poll
+        max_delay (float): Upper bound for a single delay
+        jitter (float): Fraction of the delay that is randomized (0 disables jitter)
+    """
+    fast_delays: tuple = (0.25, 0.5, 0.75)
+    base_delay: float = 1.0
+    backoff: float = 1.5
+    max_delay: float = 5.0
+    jitter: float = 0.2
+
+    def delay(self, poll_number, rng=random):
+        """
+        Get the delay to sleep after the given poll.
+
+        Args:
+            poll_number (int): 1-based number of the poll that just happened
+            rng: Random source used for jitter
+
+        Returns:
+            float: Delay in seconds
+        """
+        if poll_number <= len(self.fast_delays):
+            return self.fast_delays[poll_number - 1]
+
+        steps = poll_number - len(self.fast_delays) - 1
+        delay = min(self.base_delay * (self.backoff ** steps), self.max_delay)
+        if self.jitter:
+            delay *= 1 + rng.uniform(-self.jitter, self.jitter)
+        return max(delay, 0.0)
+
+
+@dataclass
+class RunWaitResult:
+    """Outcome of waiting on a run."""
+    status: str  # run status, or "timeout" / "error" when waiting itself failed
+    polls: int
+    elapsed: float
+    last_error: object = None
+    error: Exception = None
+
+    @property
+    def completed(self):
+        return self.status == "completed"
+
+
+def get_retry_after(error):
+    """
+    Read the server-requested delay from a rate limit error.
+
+    Args:
+        error (openai.APIStatusError): The error raised by the API call
+
+    Returns:
+        float: Delay in seconds, or None if the response did not include one
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return retry_after_from_headers(response.headers)
+
+
+def retry_after_from_headers(headers):
+    """
+    Read the server-requested delay from response headers (retry-after-ms or retry-after).
+
+    Args:
+        headers (httpx.Headers): Headers of a 429 or 5xx response
+
+    Returns:
+        float: Delay in seconds, or None if the response did not include one
+    """
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None  # neither seconds nor an HTTP date
+    return max(retry_date.timestamp() - time.time(), 0.0)
+
+
+class RunWaiter:
+    """
+    Waits for an Assistants run to reach a terminal status.
+
+    Progress callbacks are called after every poll as callback(status, elapsed, polls),
+    so the UI (spinners, progress text) stays outside of the waiting logic.
+    """
+
+    def __init__(self, client, schedule=PollSchedule(), sleep=time.sleep, clock=time.monotonic):
+        self.client = client
+        self.schedule = schedule
+        self.sleep = sleep
+        self.clock = clock
+
+    def wait(self, thread_id, run_id, timeout, callbacks=()):
+        """
+        Poll a run until it finishes, fails or the timeout expires.
+
+        Args:
+            thread_id (str): The thread the run belongs to
+            run_id (str): The run to wait for
+            timeout (float): Maximum time to wait in seconds
+            callbacks (iterable): Progress callbacks, see class docstring
+
+        Returns:
+            RunWaitResult: Final status, number of polls and elapsed time
+        """
+        start_time = self.clock()
+        polls = 0
+
+        while True:
+            elapsed = self.clock() - start_time
+            if elapsed >= timeout:
+                return RunWaitResult("timeout", polls, elapsed)
+
+            retry_after = None
+            try:
+                polls += 1
+                run_status = self.client.beta.threads.runs.retrieve(
+                    thread_id=thread_id,
+                    run_id=run_id
+                )
+            except openai.RateLimitError as e:
+                retry_after = get_retry_after(e)
+                status = "rate_limited"
+            except Exception as e:
+                return RunWaitResult("error", polls, self.clock() - start_time, error=e)
+            else:
+                status = run_status.status
+
+            elapsed = self.clock() - start_time
+            for callback in callbacks:
+                callback(status, elapsed, polls)
+            if status in TERMINAL_STATUSES:
+                return RunWaitResult(
+                    status, polls, elapsed,
+                    last_error=getattr(run_status, "last_error", None)
+                )
+
+            delay = self.schedule.delay(polls)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            # Never sleep past the deadline
+            self.sleep(max(min(delay, timeout - elapsed), 0.0))
@@ -0,0 +1,206 @@
+# score_store.py
+
+import atexit
+import glob
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+FLUSH_INTERVAL = 30.0  # seconds between write-behind flushes
+FLUSH_BATCH_SIZE = 500  # buffered rows that trigger an early flush
+COMPACT_PARTS = 32  # part files that trigger merging them into one
+COMPACT_MERGED = 8  # compacted files that are merged again, together with the parts
+STALE_LOCK_SECONDS = 600  # a compaction lock older than this is assumed abandoned
+DOMAIN_COLUMNS = tuple(f"domain_{number}" for number in range(1, 6))
+KEY_COLUMNS = ("encounter_id", "session_id", "case", "specialty", "patient_name", "source", "mode")
+
+
+class ScoreStore:
+    """
+    Append-only columnar store of per-domain feedback scores, as Parquet files in one directory.
+
+    record() buffers a row; a background thread writes buffered rows as a new part
+    file, so grading never waits for the disk and several processes can write to the
+    same directory without coordination. Once there are COMPACT_PARTS part files, the
+    flushing process merges them into one (guarded by a lock file); once there are
+    COMPACT_MERGED compacted files, they are merged in as well. That keeps reads of
+    tens of thousands of encounters to a handful of files.
+    """
+
+    def __init__(self, directory, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE,
+                 compact_parts=COMPACT_PARTS, compact_merged=COMPACT_MERGED):
+        """
+        Args:
+            directory (str): Directory for the Parquet files
+            flush_interval (float): Seconds between background flushes
+            batch_size (int): Buffered rows that trigger a flush before the interval is up
+            compact_parts (int): Part files that trigger a compaction
+            compact_merged (int): Compacted files that are merged again by the next compaction
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.compact_parts = compact_parts
+        self.compact_merged = compact_merged
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._flush_loop, args=(flush_interval,), name="score-store", daemon=True).start()
+        atexit.register(self.flush)
+
+    def record(self, scores, session_id, case, specialty, patient_name, source="app", mode="single",
+               encounter_id=None):
+        """
+        Buffer the scores of one graded encounter.
+
+        Args:
+            scores (dict): Domain number -> score (see feedback.extract_scores)
+            session_id (str): The student's session (or the batch input's encounter ID)
+            case (str): Case key
+            specialty (str): Case specialty
+            patient_name (str): The name of the patient
+            source (str): "app" or "batch"
+            mode (str): Feedback mode ("single" or "per_domain")
+            encounter_id (str): The graded conversation; a later grade of the same encounter
+                replaces this one in the analytics (a new ID if None)
+        """
+        values = [scores.get(number, np.nan) for number in range(1, len(DOMAIN_COLUMNS) + 1)]
+        row = {
+            "encounter_id": encounter_id or uuid.uuid4().hex,
+            "recorded_at": time.time(),
+            "session_id": session_id,
+            "case": case,
+            "specialty": specialty,
+            "patient_name": patient_name,
+            "source": source,
+            "mode": mode,
+            **dict(zip(DOMAIN_COLUMNS, values)),
+        }
+        with self._lock:
+            self._rows.append(row)
+            backlog = len(self._rows)
+        if backlog >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write buffered rows as a new part file (and compact if there are many)."""
+        with self._lock:
+            rows = self._rows
+            self._rows = []
+        with self._flush_lock:
+            if rows:
+                self._write(frame_from_rows(rows), "part")
+            if (len(self._files("part-*.parquet")) >= self.compact_parts
+                    or len(self._files("compacted-*.parquet")) >= self.compact_merged):
+                self.compact()
+
+    def load(self):
+        """
+        Read every stored score, including rows still buffered in this process.
+
+        Returns:
+            pandas.DataFrame: One row per graded encounter (see frame_from_rows)
+        """
+        with self._lock:
+            buffered = list(self._rows)
+        return read_scores(self.directory, buffered)
+
+    def compact(self):
+        """
+        Merge all part files (and the compacted files, once there are enough) into one file.
+
+        Returns:
+            bool: True if files were merged; False if there was too little to merge or
+                another process is compacting
+        """
+        lock_path = os.path.join(self.directory, "_compact.lock")
+        try:
+            if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        try:
+            inputs = self._files("part-*.parquet")
+            compacted = self._files("compacted-*.parquet")
+            if len(compacted) >= self.compact_merged:
+                inputs += compacted
+            if len(inputs) < 2:
+                return False
+            merged = pd.concat([pd.read_parquet(path) for path in inputs], ignore_index=True)
+            self._write(merged, "compacted")
+            # Until the inputs are gone a reader may see rows twice; read_scores drops duplicates
+            for path in inputs:
+                os.remove(path)
+            return True
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+    def _files(self, pattern):
+        return sorted(glob.glob(os.path.join(self.directory, pattern)))
+
+    def _write(self, frame, prefix):
+        name = f"{prefix}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        # Hidden while being written: Parquet dataset readers skip names starting with "."
+        temp_path = os.path.join(self.directory, f".{name}.tmp")
+        frame.to_parquet(temp_path, index=False)
+        os.replace(temp_path, os.path.join(self.directory, name))
+
+    def _flush_loop(self, interval):
+        while True:
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except OSError:
+                pass  # retried next interval
+
+
+def frame_from_rows(rows):
+    """Build the store's column layout (categorical keys, float32 scores) from row dicts."""
+    frame = pd.DataFrame(rows, columns=["encounter_id", "recorded_at", *KEY_COLUMNS[1:], *DOMAIN_COLUMNS])
+    frame["recorded_at"] = pd.to_datetime(frame["recorded_at"], unit="s")
+    for column in KEY_COLUMNS[2:]:
+        frame[column] = frame[column].astype("category")
+    frame[list(DOMAIN_COLUMNS)] = frame[list(DOMAIN_COLUMNS)].astype("float32")
+    return frame
+
+
+def read_scores(directory, buffered=()):
+    """
+    Read a score store directory (from any process).
+
+    Args:
+        directory (str): The store's directory
+        buffered (list): Row dicts not yet written, to include
+
+    Returns:
+        pandas.DataFrame: One row per graded encounter, oldest first
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    frames = []
+    for path in paths:
+        try:
+            frames.append(pd.read_parquet(path))
+        except (OSError, ValueError):
+            continue  # removed by a concurrent compaction; its rows are in the compacted file
+    if buffered:
+        frames.append(frame_from_rows(buffered))
+    if not frames:
+        return frame_from_rows([])
+    scores = pd.concat(frames, ignore_index=True)
+    # A row copied by a concurrent compaction is an exact duplicate; a regrade of the same
+    # encounter has a later recorded_at and is kept
+    scores = scores.drop_duplicates(["encounter_id", "recorded_at"]).sort_values("recorded_at", ignore_index=True)
+    for column in KEY_COLUMNS[2:]:
+        scores[column] = scores[column].astype("category")
+    return scores
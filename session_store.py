@@ -0,0 +1,190 @@
+# session_store.py
+
+import abc
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes
+FLUSH_BATCH_SIZE = 200  # pending sessions that trigger an early flush
+SESSION_MAX_AGE = 3 * 3600  # seconds after its last save that a session can no longer be resumed
+SESSION_RETENTION = 30 * 24 * 3600  # seconds after its last save that an ended session is removed
+
+_DELETED = object()  # pending-write marker for a deleted session
+
+
+class SessionStore(abc.ABC):
+    """
+    Storage for encounter state outside the Streamlit process.
+
+    A session's state is a JSON-serializable dict. Implementations for a shared
+    backend (e.g. Redis or Postgres) let several app workers serve the same
+    sessions; save() should return quickly and may write in the background.
+    """
+
+    @abc.abstractmethod
+    def load(self, session_id):
+        """
+        Look up a session's state.
+
+        Returns:
+            dict: The latest saved state, or None if the session is unknown or has expired
+        """
+
+    @abc.abstractmethod
+    def last_active(self, session_id):
+        """
+        When a session was last saved (by any process sharing the store).
+
+        Returns:
+            float: time.time() of the latest save, or None if the session is unknown or has expired
+        """
+
+    @abc.abstractmethod
+    def save(self, session_id, state):
+        """Record a session's state, replacing what was saved before."""
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        """Forget a session."""
+
+    def flush(self):
+        """Write out anything saved but not yet stored."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a local SQLite database, with write-behind batching.
+
+    save() only records the latest state of a session in memory; a background
+    thread writes all pending sessions in one transaction every `flush_interval`
+    seconds, so the chat path never waits for the disk. load() sees pending
+    writes immediately. Several app processes on one host can share the file.
+
+    A session that has not been saved for `max_age` seconds has ended: it can no
+    longer be loaded, but its row stays in the database for `retention` seconds so
+    the cohort's encounters can still be graded afterwards (see grade_cohort.py).
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE,
+                 max_age=SESSION_MAX_AGE, retention=SESSION_RETENTION, metrics=None):
+        """
+        Args:
+            path (str): Database file
+            flush_interval (float): Seconds between background flushes
+            batch_size (int): Pending sessions that trigger a flush before the interval is up
+            max_age (float): Seconds after its last save that a session expires
+            retention (float): Seconds after its last save that an expired session is removed
+                from the database (at least max_age)
+            metrics (MetricsRegistry): Registry for flush timings, or None
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.retention = max(retention, max_age)
+        self.metrics = metrics
+        self._pending = {}  # session_id -> (JSON text, saved at) or _DELETED
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._db_lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        self._worker = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                        name="session-store", daemon=True)
+        self._worker.start()
+        atexit.register(self.flush)
+
+    def load(self, session_id):
+        with self._pending_lock:
+            pending = self._pending.get(session_id)
+        if pending is _DELETED:
+            return None
+        if pending is not None:
+            return json.loads(pending[0])
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state FROM sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.max_age),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def last_active(self, session_id):
+        with self._pending_lock:
+            pending = self._pending.get(session_id)
+        if pending is _DELETED:
+            return None
+        if pending is not None:
+            return pending[1]
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT updated_at FROM sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.max_age),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, session_id, state):
+        # Serialized now: the caller may keep changing its objects after this returns
+        text = json.dumps(state)
+        with self._pending_lock:
+            self._pending[session_id] = (text, time.time())
+            backlog = len(self._pending)
+        if backlog >= self.batch_size:
+            self._wakeup.set()
+
+    def delete(self, session_id):
+        with self._pending_lock:
+            self._pending[session_id] = _DELETED
+
+    def flush(self):
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = {}
+        if not pending:
+            return
+        started = time.perf_counter()
+        saved = [(session_id, write[0], write[1]) for session_id, write in pending.items() if write is not _DELETED]
+        deleted = [(session_id,) for session_id, write in pending.items() if write is _DELETED]
+        try:
+            with self._db_lock, self._db:
+                self._db.executemany(
+                    "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                    saved,
+                )
+                self._db.executemany("DELETE FROM sessions WHERE session_id = ?", deleted)
+        except sqlite3.Error:
+            # Keep the writes for the next flush unless newer ones replaced them meanwhile
+            with self._pending_lock:
+                for session_id, write in pending.items():
+                    self._pending.setdefault(session_id, write)
+            raise
+        if self.metrics is not None:
+            self.metrics.observe("vpe_session_store_flush_seconds", time.perf_counter() - started,
+                                 help="Time to write a batch of sessions to the session store")
+            self.metrics.inc("vpe_session_store_writes_total", len(pending), help="Session states written")
+
+    def _expire(self):
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.retention,))
+
+    def _flush_loop(self, interval):
+        last_expiry = time.monotonic()
+        while True:
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if time.monotonic() - last_expiry > 600:
+                    self._expire()
+                    last_expiry = time.monotonic()
+            except sqlite3.Error:
+                pass  # e.g. the database is locked by another process; retried next interval
@@ -0,0 +1,357 @@
+# speech.py
+
+import abc
+import hashlib
+import io
+import re
+import threading
+import time
+import uuid
+import wave
+from collections import OrderedDict
+from concurrent import futures
+
+import numpy as np
+
+from audio_pipeline import encode_wav
+
+SPEECH_MODEL = "gpt-4o-mini-tts"
+DEFAULT_VOICE = "alloy"
+STUB_SAMPLE_RATE = 24000  # the rate of the API's WAV output
+MIN_CHUNK_CHARS = 20  # shorter sentences are spoken together with the next one
+CACHE_MAX_BYTES = 100_000_000  # synthesized audio kept in memory
+
+# A sentence ends at . ! or ? (plus closing quotes/brackets) followed by whitespace,
+# but not after common abbreviations ("Dr. Smith") or inside numbers ("7.5")
+_SENTENCE_END = re.compile(r"""(?<!\b(?:Mr|Ms|Dr|St|vs|Jr|Sr))(?<!\bMrs)(?<!\be\.g)(?<!\bi\.e)[.!?]+["')\]]*\s+""")
+
+
+def speech_cache_key(voice, text):
+    """
+    Content address of a synthesized utterance.
+
+    Args:
+        voice (str): The voice
+        text (str): The spoken text (whitespace is normalized)
+
+    Returns:
+        str: Hex digest identifying the audio
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (voice, " ".join(text.split())):
+        data = part.encode("utf-8")
+        # Length-prefix every part so different splits never hash the same
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def join_wavs(clips):
+    """
+    Concatenate WAV clips with the same format into one clip.
+
+    Args:
+        clips (list): WAV file contents
+
+    Returns:
+        bytes: One WAV file
+    """
+    if len(clips) == 1:
+        return clips[0]
+    frames = []
+    params = None
+    for clip in clips:
+        with wave.open(io.BytesIO(clip), "rb") as wav:
+            params = params or wav.getparams()
+            frames.append(wav.readframes(wav.getnframes()))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setparams(params)
+        wav.writeframes(b"".join(frames))
+    return buffer.getvalue()
+
+
+class SentenceSplitter:
+    """Cuts streamed text into speakable chunks as soon as each sentence is complete."""
+
+    def __init__(self, min_chars=MIN_CHUNK_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._start = 0  # buffer offset of the chunk being collected
+
+    def feed(self, text):
+        """
+        Add streamed text.
+
+        Returns:
+            list: Chunks completed by this text
+        """
+        self._buffer += text
+        chunks = []
+        position = self._start
+        for match in _SENTENCE_END.finditer(self._buffer, self._start):
+            position = match.end()
+            if position - self._start >= self.min_chars:
+                chunks.append(self._buffer[self._start:position].strip())
+                self._start = position
+        # Keep only the unfinished part
+        self._buffer = self._buffer[self._start:]
+        self._start = 0
+        return chunks
+
+    def flush(self):
+        """
+        End of the text.
+
+        Returns:
+            list: The last chunk, if there is any text left
+        """
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+class SpeechBackend(abc.ABC):
+    """
+    Text-to-speech engine.
+
+    Implementations turn one chunk of text into a WAV clip; they are called from
+    worker threads and must be thread-safe.
+    """
+
+    @abc.abstractmethod
+    def synthesize(self, text, voice):
+        """
+        Speak a chunk of text.
+
+        Returns:
+            bytes: WAV file contents
+        """
+
+
+class OpenAISpeechBackend(SpeechBackend):
+    """Speech from the OpenAI audio.speech endpoint."""
+
+    def __init__(self, client, model=SPEECH_MODEL, timeout=30):
+        """
+        Args:
+            client (openai.OpenAI): The client
+            model (str): The speech model
+            timeout (float): Per-request timeout in seconds
+        """
+        self.client = client
+        self.model = model
+        self.timeout = timeout
+
+    def synthesize(self, text, voice):
+        response = self.client.audio.speech.create(
+            model=self.model,
+            voice=voice,
+            input=text,
+            response_format="wav",
+            timeout=self.timeout,
+        )
+        return response.content
+
+
+class StubSpeechBackend(SpeechBackend):
+    """Local stand-in: a quiet tone as long as the text would take to say. No network access."""
+
+    def __init__(self, seconds_per_word=0.35, latency=0.0, sample_rate=STUB_SAMPLE_RATE):
+        """
+        Args:
+            seconds_per_word (float): Length of the clip per word of text
+            latency (float): Seconds to wait before returning, to imitate a remote engine
+            sample_rate (int): Sample rate of the clips
+        """
+        self.seconds_per_word = seconds_per_word
+        self.latency = latency
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text, voice):
+        if self.latency:
+            time.sleep(self.latency)
+        seconds = max(len(text.split()), 1) * self.seconds_per_word
+        t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+        # A different pitch per voice, so stubbed voices are told apart by ear
+        pitch = 180 + int(hashlib.blake2b(voice.encode("utf-8"), digest_size=1).hexdigest(), 16)
+        return encode_wav(0.1 * np.sin(2 * np.pi * pitch * t), self.sample_rate)
+
+
+class SpeechCache:
+    """In-memory LRU of synthesized clips, bounded by their total size."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        """
+        Args:
+            max_bytes (int): Total size of the clips kept
+        """
+        self.max_bytes = max_bytes
+        self._clips = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a clip.
+
+        Returns:
+            bytes: The clip, or None on a miss
+        """
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is not None:
+                self._clips.move_to_end(key)
+            return clip
+
+    def put(self, key, clip):
+        """Store a clip, evicting the least recently used ones beyond the size limit."""
+        if len(clip) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._clips.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._clips[key] = clip
+            self._bytes += len(clip)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+class SpeechSynthesizer:
+    """
+    Synthesizes chunks concurrently on a worker pool, through the cache.
+
+    Requests for a chunk that is already being synthesized (the same stock phrase
+    from several sessions at once) share the one request in flight.
+    """
+
+    def __init__(self, backend, cache, executor, metrics=None):
+        """
+        Args:
+            backend (SpeechBackend): The speech engine
+            cache (SpeechCache): Cache of synthesized clips
+            executor (concurrent.futures.Executor): Pool the synthesis requests run on
+            metrics (MetricsRegistry): Registry for synthesis spans, or None
+        """
+        self.backend = backend
+        self.cache = cache
+        self.executor = executor
+        self.metrics = metrics
+        self._in_flight = {}  # cache key -> Future
+        self._lock = threading.Lock()
+
+    def submit(self, text, voice, session_id=None):
+        """
+        Start synthesizing a chunk.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the WAV clip
+        """
+        key = speech_cache_key(voice, text)
+        clip = self.cache.get(key)
+        if clip is not None:
+            if self.metrics is not None:
+                self.metrics.inc("vpe_speech_cache_hits_total", help="Spoken chunks served from the speech cache")
+            future = futures.Future()
+            future.set_result(clip)
+            return future
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = self.executor.submit(self._synthesize, key, text, voice, session_id)
+        return future
+
+    def _synthesize(self, key, text, voice, session_id):
+        try:
+            if self.metrics is None:
+                clip = self.backend.synthesize(text, voice)
+            else:
+                with self.metrics.span("speech.synthesize", session_id=session_id, chars=len(text)):
+                    clip = self.backend.synthesize(text, voice)
+            self.cache.put(key, clip)
+            return clip
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+
+class SpokenReply:
+    """
+    The spoken version of one streamed reply: text goes in as it arrives, clips come out in order.
+
+    Chunks are synthesized concurrently; next_clip() hands out the next clip as soon as
+    it is ready, so playback can start with the first sentence while later ones are still
+    being written and synthesized. Clips are handed out without waiting for the previous
+    one to finish: the player queues them and plays them back to back.
+    """
+
+    def __init__(self, synthesizer, voice, session_id=None, splitter=None):
+        """
+        Args:
+            synthesizer (SpeechSynthesizer): Where chunks are synthesized
+            voice (str): The voice
+            session_id (str): Session for the synthesis spans, or None
+            splitter (SentenceSplitter): How the text is cut into chunks (a new SentenceSplitter by default)
+        """
+        self.synthesizer = synthesizer
+        self.voice = voice
+        self.session_id = session_id
+        self.splitter = splitter or SentenceSplitter()
+        self.reply_id = uuid.uuid4().hex  # tells the player which queued clips belong together
+        self.clips = []  # one Future per chunk, in reply order
+        self.played = 0  # clips handed out for playback
+
+    def feed(self, text):
+        """Add streamed reply text; every completed sentence starts synthesizing right away."""
+        for chunk in self.splitter.feed(text):
+            self.clips.append(self.synthesizer.submit(chunk, self.voice, self.session_id))
+
+    def finish(self):
+        """The reply is complete; synthesize what is left of it."""
+        for chunk in self.splitter.flush():
+            self.clips.append(self.synthesizer.submit(chunk, self.voice, self.session_id))
+
+    def next_clip(self, timeout=0):
+        """
+        The next clip in reply order, if it is synthesized.
+
+        Args:
+            timeout (float): Seconds to wait for the clip's synthesis (0 does not wait)
+
+        Returns:
+            bytes: The clip to queue for playback, or None
+        """
+        while self.played < len(self.clips):
+            try:
+                clip = self.clips[self.played].result(timeout=timeout)
+            except futures.TimeoutError:
+                return None
+            except Exception:
+                self.played += 1
+                continue  # a failed chunk is skipped; the text is still on screen
+            self.played += 1
+            return clip
+        return None
+
+    def rest(self, timeout):
+        """
+        Wait for every clip not yet handed out, and join them into one clip.
+
+        Args:
+            timeout (float): Maximum seconds to wait for synthesis
+
+        Returns:
+            bytes: The joined WAV clip, or None if there is nothing left to play
+        """
+        deadline = time.monotonic() + timeout
+        clips = []
+        for future in self.clips[self.played:]:
+            try:
+                clips.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+            except Exception:
+                continue  # failed or too slow: skipped
+        self.played = len(self.clips)
+        return join_wavs(clips) if clips else None
@@ -0,0 +1,85 @@
+# thread_reserve.py
+
+import threading
+import time
+from collections import deque
+
+REFILL_RETRY_DELAY = 5  # seconds to wait after a failed threads.create before trying again
+
+
+class ThreadReserve:
+    """
+    Small pool of pre-created OpenAI threads, refilled in the background.
+
+    take() never blocks: it hands out a ready thread ID, or None when the pool is
+    empty so the caller can fall back to creating one itself. Threads that expire
+    unused are deleted by the background worker.
+    """
+
+    def __init__(self, client, size, max_age=3600):
+        """
+        Args:
+            client (openai.OpenAI): Client used to create threads
+            size (int): Number of threads to keep ready (0 disables the reserve)
+            max_age (float): Seconds after which an unused thread is not handed out any more
+        """
+        self.client = client
+        self.size = size
+        self.max_age = max_age
+        self._threads = deque()  # (thread_id, created_at)
+        self._expired = []  # thread IDs that expired unused, waiting to be deleted
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        if size > 0:
+            self._worker = threading.Thread(target=self._refill_loop, name="thread-reserve", daemon=True)
+            self._worker.start()
+
+    def take(self):
+        """
+        Take a pre-created thread out of the reserve.
+
+        Returns:
+            str: A thread ID, or None if no fresh thread is available
+        """
+        now = time.monotonic()
+        thread_id = None
+        with self._lock:
+            while self._threads:
+                candidate, created_at = self._threads.popleft()
+                if now - created_at < self.max_age:
+                    thread_id = candidate
+                    break
+                self._expired.append(candidate)
+        self._wakeup.set()
+        return thread_id
+
+    def available(self):
+        """Number of threads currently ready to be handed out."""
+        with self._lock:
+            return len(self._threads)
+
+    def _discard_expired(self):
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._threads and self._threads[0][1] <= cutoff:
+                self._expired.append(self._threads.popleft()[0])
+            expired, self._expired = self._expired, []
+        for thread_id in expired:
+            try:
+                self.client.beta.threads.delete(thread_id)
+            except Exception:
+                pass  # never used, so nothing is lost if it lingers
+
+    def _refill_loop(self):
+        while True:
+            self._wakeup.clear()
+            self._discard_expired()
+            while self.available() < self.size:
+                try:
+                    thread = self.client.beta.threads.create()
+                except Exception:
+                    time.sleep(REFILL_RETRY_DELAY)
+                    continue
+                with self._lock:
+                    self._threads.append((thread.id, time.monotonic()))
+            self._wakeup.wait(timeout=self.max_age / 2)
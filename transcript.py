@@ -0,0 +1,104 @@
+# transcript.py
+
+ROLE_LABELS = {"user": "STUDENT", "assistant": "PATIENT"}
+
+
+def format_entry(role, content):
+    """Format one conversation turn the way the feedback raters expect it."""
+    return f"{ROLE_LABELS.get(role, 'PATIENT')}: {content}\n\n"
+
+
+def message_text(message):
+    """Join all text parts of an Assistants API message (not just content[0])."""
+    return "".join(part.text.value for part in message.content if part.type == "text")
+
+
+def list_thread_messages(client, thread_id, page_size=100):
+    """
+    Fetch every message of a thread, oldest first, following the list cursor.
+
+    Args:
+        client (openai.OpenAI): The OpenAI client
+        thread_id (str): The thread to read
+        page_size (int): Messages requested per page (API maximum is 100)
+
+    Returns:
+        list: (role, text) tuples in chronological order
+    """
+    messages = []
+    after = None
+    while True:
+        params = {"thread_id": thread_id, "order": "asc", "limit": page_size}
+        if after:
+            params["after"] = after
+        page = client.beta.threads.messages.list(**params)
+        messages.extend((msg.role, message_text(msg)) for msg in page.data)
+        if not page.has_more or not page.data:
+            return messages
+        after = page.data[-1].id
+
+
+class Transcript:
+    """
+    Conversation transcript maintained incrementally as turns happen.
+
+    Each turn is formatted once when it is appended, so rendering the whole
+    transcript for feedback needs no API calls and no repeated string building.
+    """
+
+    def __init__(self):
+        self.entries = []  # (role, content) tuples
+        self._lines = []  # formatted entries, kept in step with self.entries
+        self._text = ""
+        self._rendered_upto = 0
+        # Set when the remote thread may hold turns we never recorded (e.g. a run
+        # that timed out locally but finished on the server)
+        self.needs_verification = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, role, content):
+        """Record a new turn."""
+        self.entries.append((role, content))
+        self._lines.append(format_entry(role, content))
+
+    def mark_unverified(self):
+        """Flag that the remote thread could differ from the local transcript."""
+        self.needs_verification = True
+
+    def render(self):
+        """
+        Get the transcript text.
+
+        Returns:
+            str: All turns formatted as "STUDENT: ..." / "PATIENT: ..." blocks
+        """
+        if self._rendered_upto < len(self._lines):
+            self._text += "".join(self._lines[self._rendered_upto:])
+            self._rendered_upto = len(self._lines)
+        return self._text
+
+    def reconcile(self, client, thread_id, page_size=100):
+        """
+        Compare the local transcript with the remote thread and adopt the remote one if they differ.
+
+        Args:
+            client (openai.OpenAI): The OpenAI client
+            thread_id (str): The conversation thread
+            page_size (int): Messages requested per page
+
+        Returns:
+            bool: True if the local transcript already matched the thread
+        """
+        remote = list_thread_messages(client, thread_id, page_size=page_size)
+        matched = remote == self.entries
+        if not matched:
+            self.entries = []
+            self._lines = []
+            self._text = ""
+            self._rendered_upto = 0
+            for role, content in remote:
+                self.append(role, content)
+        self.needs_verification = False
+        return matched